@@ -0,0 +1,249 @@
+"""
+Control de admisión de consultas KPI.
+
+  - Carriles: cada endpoint va al carril "caros" (ADMISION_CAROS) o "baratos". Cada
+    carril tiene su límite de consultas a la vez y una cola acotada; si la cola está
+    llena, o la espera pasa de ADMISION_ESPERA_S, la consulta se rechaza (503 con
+    Retry-After) en vez de acumular conexiones tomadas. Así una ola de
+    /cedula_322_detalle no deja sin turno a /meta/programas.
+  - Presupuesto: cada consulta de un endpoint tiene un tiempo máximo
+    (ADMISION_PRESUPUESTO_MS, con excepciones en ADMISION_PRESUPUESTOS); al vencer se
+    manda KILL QUERY a MySQL (la consulta deja de correr en el servidor) y la petición
+    responde 504.
+  - Desconexión: si el cliente se va antes de recibir la respuesta se cancela el
+    handler (CancelarAlDesconectar) y la consulta en curso recibe el mismo KILL QUERY.
+
+Aplica a DB.aq/aqt y a DB.stream (stream=ndjson|array y /api/export, que además tiene
+su propio presupuesto, mayor: ADMISION_PRESUPUESTO_EXPORT_MS). En DB.stream el
+presupuesto cubre también el envío: un cliente lento no retiene la conexión sin límite.
+Los refrescos y los scripts no pasan por aquí.
+"""
+import asyncio
+import contextlib
+import os
+
+CAROS = {
+    e.strip()
+    for e in os.getenv(
+        "ADMISION_CAROS",
+        "indice_reprobacion,reprobacion_detalle,desercion_escolar,seguimiento_cohorte_resumen,"
+        "cedula_322_detalle,dashboard,export",
+    ).split(",")
+    if e.strip()
+}
+ESPERA_S = float(os.getenv("ADMISION_ESPERA_S", "10"))
+PRESUPUESTO_MS = float(os.getenv("ADMISION_PRESUPUESTO_MS", "60000"))   # 0 = sin límite
+# "endpoint=ms,endpoint=ms"
+PRESUPUESTOS = {
+    "export": float(os.getenv("ADMISION_PRESUPUESTO_EXPORT_MS", "900000")),
+    **{
+        k.strip(): float(v)
+        for k, _, v in (p.partition("=") for p in os.getenv("ADMISION_PRESUPUESTOS", "").split(","))
+        if k.strip() and v.strip()
+    },
+}
+SIN_ENDPOINT = ("sin_endpoint",)
+
+# Event loop del proceso (lo fija instalar() en el lifespan): por él piden turno los hilos
+# que leen con DB.stream (threadpool de Starlette, trabajos de exportación).
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def instalar() -> None:
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+class Rechazada(Exception):
+    """No hubo turno en el carril (cola llena o espera agotada) → 503."""
+
+    def __init__(self, carril: str, motivo: str):
+        super().__init__(f"servidor ocupado ({carril}: {motivo}); reintente en unos segundos")
+        self.carril = carril
+
+
+class TiempoAgotado(Exception):
+    """La consulta pasó su presupuesto y se canceló en MySQL → 504."""
+
+    def __init__(self, endpoint: str, ms: float):
+        super().__init__(f"{endpoint}: la consulta pasó el límite de {ms:.0f} ms y se canceló")
+        self.endpoint = endpoint
+
+
+class Carril:
+    def __init__(self, nombre: str, concurrencia: int, cola: int):
+        self.nombre = nombre
+        self.concurrencia = concurrencia
+        self.cola = cola
+        self._sem = asyncio.Semaphore(concurrencia)
+        self.activas = 0
+        self.esperando = 0
+        self.atendidas = 0
+        self.rechazadas = 0
+
+    @contextlib.asynccontextmanager
+    async def turno(self):
+        await self._entrar()
+        try:
+            yield
+        finally:
+            self._salir()
+
+    @contextlib.contextmanager
+    def turno_hilo(self):
+        """turno() desde un hilo fuera del event loop; bloquea el hilo mientras espera."""
+        loop = _loop
+        if loop is None:   # sin servidor (scripts, bench): no hay carriles que respetar
+            yield
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass   # en un hilo sin loop, como debe ser
+        else:
+            raise RuntimeError("turno_hilo() bloquearía el event loop; usar turno()")
+        asyncio.run_coroutine_threadsafe(self._entrar(), loop).result()
+        try:
+            yield
+        finally:
+            loop.call_soon_threadsafe(self._salir)
+
+    async def _entrar(self):
+        if self._sem.locked() and self.esperando >= self.cola:
+            self.rechazadas += 1
+            raise Rechazada(self.nombre, "cola llena")
+        self.esperando += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), ESPERA_S)
+        except asyncio.TimeoutError:
+            self.rechazadas += 1
+            raise Rechazada(self.nombre, "espera agotada") from None
+        finally:
+            self.esperando -= 1
+        self.activas += 1
+        self.atendidas += 1
+
+    def _salir(self):
+        self.activas -= 1
+        self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrencia": self.concurrencia,
+            "cola": self.cola,
+            "activas": self.activas,
+            "esperando": self.esperando,
+            "atendidas": self.atendidas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+CARRILES = {
+    "caros": Carril(
+        "caros",
+        int(os.getenv("ADMISION_CAROS_CONCURRENCIA", "4")),
+        int(os.getenv("ADMISION_CAROS_COLA", "32")),
+    ),
+    "baratos": Carril(
+        "baratos",
+        int(os.getenv("ADMISION_BARATOS_CONCURRENCIA", "16")),
+        int(os.getenv("ADMISION_BARATOS_COLA", "128")),
+    ),
+}
+
+canceladas = {"tiempo": 0, "desconexion": 0, "kill_query": 0}
+
+
+def carril(endpoint: str) -> Carril:
+    return CARRILES["caros" if endpoint in CAROS else "baratos"]
+
+
+def turno(endpoint: str):
+    """Turno en el carril del endpoint (sin límite para consultas internas)."""
+    if endpoint in SIN_ENDPOINT:
+        return contextlib.nullcontext()
+    return carril(endpoint).turno()
+
+
+def turno_hilo(endpoint: str):
+    """turno() para código síncrono que corre en otro hilo (DB.stream)."""
+    if endpoint in SIN_ENDPOINT:
+        return contextlib.nullcontext()
+    return carril(endpoint).turno_hilo()
+
+
+def presupuesto_ms(endpoint: str) -> float:
+    if endpoint in SIN_ENDPOINT:
+        return 0.0
+    return PRESUPUESTOS.get(endpoint, PRESUPUESTO_MS)
+
+
+async def con_presupuesto(endpoint: str, aw):
+    """Espera `aw` hasta el presupuesto del endpoint; al vencer lanza TiempoAgotado."""
+    ms = presupuesto_ms(endpoint)
+    if ms <= 0:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, ms / 1000)
+    except asyncio.TimeoutError:
+        canceladas["tiempo"] += 1
+        raise TiempoAgotado(endpoint, ms) from None
+
+
+def estado() -> dict:
+    return {
+        "carriles": {n: c.stats() for n, c in CARRILES.items()},
+        "caros": sorted(CAROS),
+        "presupuesto_ms": PRESUPUESTO_MS,
+        "presupuestos": PRESUPUESTOS,
+        "canceladas": dict(canceladas),
+    }
+
+
+class CancelarAlDesconectar:
+    """
+    Middleware ASGI: si llega http.disconnect antes de que empiece la respuesta, cancela
+    el handler (la cancelación llega a DB.aq, que manda KILL QUERY). Una vez que empezó
+    la respuesta (streaming) Starlette ya atiende la desconexión por su cuenta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        mensajes: asyncio.Queue = asyncio.Queue()
+        respondio = desconectado = False
+
+        async def enviar(message):
+            nonlocal respondio
+            if message["type"] == "http.response.start":
+                respondio = True
+            await send(message)
+
+        tarea = asyncio.ensure_future(self.app(scope, mensajes.get, enviar))
+
+        async def vigilar():
+            # reenvía los mensajes del servidor al handler y mira si el cliente se fue
+            nonlocal desconectado
+            while True:
+                message = await receive()
+                await mensajes.put(message)
+                if message["type"] == "http.disconnect":
+                    if not respondio and not tarea.done():
+                        desconectado = True
+                        canceladas["desconexion"] += 1
+                        tarea.cancel()
+                    return
+
+        vigia = asyncio.ensure_future(vigilar())
+        try:
+            await tarea
+        except asyncio.CancelledError:
+            if not desconectado:
+                raise
+        finally:
+            vigia.cancel()
@@ -0,0 +1,393 @@
+"""
+Caché en proceso para los resultados de los endpoints KPI.
+
+Los datos de origen sólo cambian al re-importar dumps, así que cada resultado se
+guarda por (endpoint, parámetros normalizados) con:
+  - tamaño acotado y expulsión LRU   (CACHE_MAX_ENTRIES, default 256)
+  - vigencia máxima                  (CACHE_TTL_SECONDS, default 600; 0 = sin caché)
+  - contadores de aciertos/fallos    (expuestos en /api/health)
+  - invalidación explícita           (POST /api/admin/cache/invalidate y tras refrescar hechos)
+
+Además, las llamadas concurrentes con los mismos parámetros normalizados que no
+encuentran el resultado en caché comparten una sola ejecución (`vuelos`,
+single-flight): la primera lanza la consulta y las demás esperan su resultado. Sólo
+se comparten ejecuciones en curso, nunca resultados viejos: tras una invalidación las
+llamadas nuevas lanzan otra ejecución, y la que empezó antes no se guarda en caché.
+
+Con COMPARTIDO_DIR (varios workers, ver app/compartido.py) la caché es un SQLite que
+comparten todos los procesos (CacheCompartida); el single-flight sigue siendo por proceso.
+"""
+import asyncio
+import contextlib
+import functools
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.responses import Response
+
+from . import compartido
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version = None
+
+    def get(self, key):
+        """Devuelve (True, valor) si hay entrada vigente; (False, None) en otro caso."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expira, valor = item
+                if expira > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, valor
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, valor, generacion: int | None = None) -> None:
+        """Con `generacion`, no guarda si hubo una invalidación desde entonces."""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            if generacion is not None and generacion != self.invalidations:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, valor)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, endpoint: str | None = None) -> int:
+        """Elimina todo (o sólo las entradas de un endpoint). Devuelve cuántas se quitaron."""
+        with self._lock:
+            if endpoint is None:
+                n = len(self._data)
+                self._data.clear()
+            else:
+                keys = [k for k in self._data if k[0] == endpoint]
+                for k in keys:
+                    del self._data[k]
+                n = len(keys)
+            self.invalidations += 1
+            return n
+
+    def nueva_version(self, numero: int) -> None:
+        """Versión de los datos leída por app/version.py; si cambió, vacía la caché."""
+        if self.version is not None and self.version != numero:
+            self.invalidate()
+        self.version = numero
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class CacheCompartida:
+    """
+    La misma caché, en un SQLite (modo WAL) que comparten todos los workers del
+    servidor (COMPARTIDO_DIR, ver app/compartido.py): cada resultado se calcula y se
+    guarda una vez, y no hay una copia por proceso. Los valores van con pickle; la
+    expiración es por reloj de pared y al pasar de `max_entries` se expulsan los más
+    viejos. El contador de invalidaciones también vive en el archivo, así que una
+    invalidación en un worker impide que otro guarde un resultado calculado antes.
+    Aciertos y fallos son de este proceso.
+    """
+
+    PODAR_CADA = 64   # escrituras entre podas
+
+    DDL = [
+        """
+        CREATE TABLE IF NOT EXISTS resultados (
+          llave     TEXT PRIMARY KEY,
+          endpoint  TEXT NOT NULL,
+          expira    REAL NOT NULL,
+          valor     BLOB NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_resultados_expira ON resultados (expira)",
+        """
+        CREATE TABLE IF NOT EXISTS generacion (
+          id       INTEGER PRIMARY KEY CHECK (id = 1),
+          n        INTEGER NOT NULL,
+          version  INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO generacion (id, n, version) VALUES (1, 0, 0)",
+    ]
+
+    def __init__(self, ruta, max_entries: int = 256, ttl: float = 600.0):
+        self.ruta = str(ruta)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._escrituras = 0
+        with self._transaccion() as c:
+            for sql in self.DDL:
+                c.execute(sql)
+
+    def _conn(self) -> sqlite3.Connection:
+        # una conexión por hilo y por proceso (un fork no hereda la del padre)
+        c = getattr(self._local, "conn", None)
+        if c is None or self._local.pid != os.getpid():
+            c = sqlite3.connect(self.ruta, timeout=5.0, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    @contextlib.contextmanager
+    def _transaccion(self):
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            yield c
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        c.execute("COMMIT")
+
+    @staticmethod
+    def _llave(key) -> str:
+        return repr(key)   # (endpoint, ((param, valor), ...)): sólo str/números/None/tuplas
+
+    @property
+    def invalidations(self) -> int:
+        return self._conn().execute("SELECT n FROM generacion WHERE id = 1").fetchone()[0]
+
+    def get(self, key):
+        fila = self._conn().execute(
+            "SELECT valor FROM resultados WHERE llave = ? AND expira > ?", (self._llave(key), time.time())
+        ).fetchone()
+        if fila is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, pickle.loads(fila[0])
+
+    def set(self, key, valor, generacion: int | None = None) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        try:
+            datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        # la comparación con la generación va en la misma sentencia (atómica)
+        self._conn().execute(
+            """
+            INSERT OR REPLACE INTO resultados (llave, endpoint, expira, valor)
+            SELECT ?, ?, ?, ? WHERE ? IS NULL OR (SELECT n FROM generacion WHERE id = 1) = ?
+            """,
+            (self._llave(key), key[0], time.time() + self.ttl, datos, generacion, generacion),
+        )
+        self._escrituras += 1
+        if self._escrituras % self.PODAR_CADA == 0:
+            self._podar()
+
+    def _podar(self) -> None:
+        with self._transaccion() as c:
+            c.execute("DELETE FROM resultados WHERE expira <= ?", (time.time(),))
+            (n,) = c.execute("SELECT COUNT(*) FROM resultados").fetchone()
+            if n > self.max_entries:
+                c.execute(
+                    "DELETE FROM resultados WHERE llave IN "
+                    "(SELECT llave FROM resultados ORDER BY expira LIMIT ?)",
+                    (n - self.max_entries,),
+                )
+                self.evictions += n - self.max_entries
+
+    def invalidate(self, endpoint: str | None = None) -> int:
+        with self._transaccion() as c:
+            if endpoint is None:
+                n = c.execute("DELETE FROM resultados").rowcount
+            else:
+                n = c.execute("DELETE FROM resultados WHERE endpoint = ?", (endpoint,)).rowcount
+            c.execute("UPDATE generacion SET n = n + 1 WHERE id = 1")
+        return n
+
+    def nueva_version(self, numero: int) -> None:
+        # todos los workers ven el cambio; sólo el primero vacía la caché (los demás
+        # borrarían lo que ya se recalculó con los datos nuevos). También vale al
+        # arrancar: el archivo puede traer resultados de otra versión de los datos.
+        with self._transaccion() as c:
+            if c.execute(
+                "UPDATE generacion SET n = n + 1, version = ? WHERE id = 1 AND version <> ?", (numero, numero)
+            ).rowcount:
+                c.execute("DELETE FROM resultados")
+
+    def stats(self) -> dict:
+        c = self._conn()
+        (entries,) = c.execute("SELECT COUNT(*) FROM resultados WHERE expira > ?", (time.time(),)).fetchone()
+        n, version = c.execute("SELECT n, version FROM generacion WHERE id = 1").fetchone()
+        (paginas,) = c.execute("PRAGMA page_count").fetchone()
+        (tam,) = c.execute("PRAGMA page_size").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "evictions": self.evictions,
+            "invalidations": n,
+            "compartida": {"archivo": self.ruta, "bytes": paginas * tam, "version_datos": version},
+        }
+
+
+def _resultados():
+    max_entries = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+    ttl = float(os.getenv("CACHE_TTL_SECONDS", "600"))
+    if compartido.activo():
+        return CacheCompartida(compartido.ruta("resultados.sqlite"), max_entries, ttl)
+    return TTLCache(max_entries, ttl)
+
+
+resultados = _resultados()
+
+
+class Vuelos:
+    """
+    Ejecuciones en curso por llave (corre en el event loop del proceso). La consulta va
+    en una tarea propia: si se cancela una de las peticiones que la esperan (cliente que
+    se desconecta) las demás siguen; si se cancelan todas, se cancela la tarea.
+    """
+
+    def __init__(self):
+        self._vuelos: dict = {}   # llave -> [tarea, peticiones esperando]
+        self.ejecuciones = 0
+        self.coalescidas = 0
+        self.por_endpoint: dict = {}
+
+    async def ejecutar(self, key, fabrica) -> tuple:
+        """(valor, compartido): compartido=True si se reutilizó una ejecución en curso."""
+        vuelo = self._vuelos.get(key)
+        compartido = vuelo is not None
+        if compartido:
+            self.coalescidas += 1
+            endpoint = key[1][0]
+            self.por_endpoint[endpoint] = self.por_endpoint.get(endpoint, 0) + 1
+        else:
+            vuelo = self._vuelos[key] = [asyncio.ensure_future(fabrica()), 0]
+            self.ejecuciones += 1
+
+            def _aterrizar(_tarea, key=key, vuelo=vuelo):
+                if self._vuelos.get(key) is vuelo:
+                    del self._vuelos[key]
+
+            vuelo[0].add_done_callback(_aterrizar)
+        vuelo[1] += 1
+        try:
+            return await asyncio.shield(vuelo[0]), compartido
+        finally:
+            vuelo[1] -= 1
+            if vuelo[1] == 0 and not vuelo[0].done():
+                vuelo[0].cancel()
+
+    def stats(self) -> dict:
+        total = self.ejecuciones + self.coalescidas
+        return {
+            "en_vuelo": len(self._vuelos),
+            "ejecuciones": self.ejecuciones,
+            "coalescidas": self.coalescidas,
+            "ratio": round(self.coalescidas / total, 4) if total else None,
+            "por_endpoint": dict(self.por_endpoint),
+        }
+
+
+vuelos = Vuelos()
+
+
+def _normaliza(nombre: str, valor):
+    if isinstance(valor, (list, tuple)):   # parámetros repetidos (?cohorte=a&cohorte=b)
+        return tuple(_normaliza(nombre, v) for v in valor)
+    # programa_like y los patrones de estatus se usan siempre en UPPER()
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if nombre in ("programa_like", "programas_") or nombre.startswith("re_"):
+            valor = valor.upper()
+    return valor
+
+
+def clave(endpoint: str, params: dict) -> tuple:
+    return (endpoint, tuple(sorted((k, _normaliza(k, v)) for k, v in params.items())))
+
+
+def cacheado(func):
+    """
+    Decorador para handlers de FastAPI: conserva la firma (FastAPI la lee vía
+    __wrapped__) y guarda el resultado por (nombre de la función, parámetros).
+    """
+    firma = inspect.signature(func)
+
+    def _clave(args, kwargs):
+        bound = firma.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return clave(func.__name__, bound.arguments)
+
+    def _guardar(k, valor, generacion=None):
+        if not isinstance(valor, Response):   # p.ej. StreamingResponse: se consume una sola vez
+            resultados.set(k, valor, generacion)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def awrapper(*args, **kwargs):
+            k = _clave(args, kwargs)
+            encontrado, valor = resultados.get(k)
+            if encontrado:
+                return valor
+            # el contador de invalidaciones separa las ejecuciones de antes y después
+            # de una invalidación: nunca se comparte ni se guarda un resultado viejo
+            generacion = resultados.invalidations
+
+            async def calcular():
+                valor = await func(*args, **kwargs)
+                _guardar(k, valor, generacion)
+                return valor
+
+            valor, compartido = await vuelos.ejecutar((generacion, k), calcular)
+            if compartido and isinstance(valor, Response):
+                # una respuesta en streaming no se puede enviar dos veces
+                valor = await func(*args, **kwargs)
+            return valor
+
+        return awrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        k = _clave(args, kwargs)
+        encontrado, valor = resultados.get(k)
+        if encontrado:
+            return valor
+        valor = func(*args, **kwargs)
+        _guardar(k, valor)
+        return valor
+
+    return wrapper
@@ -0,0 +1,100 @@
+"""
+Ciclos escolares: orden y rangos.
+
+Cada ciclo (p. ej. "2022-SEM-AGO/DIC") tiene un ordinal entero
+    año * 10 + (1 si termina en ENE/JUN, 2 en otro caso)
+que es el `ciclo_key` de la tabla de hechos y de la dimensión `cacei.ciclos`
+(hechos.sql_ciclo_key lo calcula igual en SQL). Las consultas ordenan y filtran por ese
+entero en lugar de evaluar CAST(SUBSTRING_INDEX(ciclo,'-',1) AS UNSIGNED) por fila.
+"""
+import re
+from dataclasses import dataclass, field
+
+_ANIO = re.compile(r"^([0-9]+)")
+# Extremos de rango abreviados: "2019", "2019-A" / "2019-B", "2019-1" / "2019-2"
+_LIMITE = re.compile(r"^([0-9]{4})(?:\s*-\s*([AB12]))?$", re.IGNORECASE)
+
+MAX_ORDINAL = 2**32 - 1   # INT UNSIGNED
+
+
+def ordinal(ciclo: str | None) -> int:
+    """Mismo valor que la columna ciclo_key (un ciclo NULL o sin año queda con año 0)."""
+    texto = ciclo or ""
+    m = _ANIO.match(texto)
+    anio = int(m.group(1)) if m else 0
+    return anio * 10 + (1 if texto.upper().endswith("ENE/JUN") else 2)
+
+
+def clave_orden(ciclo: str | None) -> tuple:
+    """Llave de ordenamiento equivalente a ORDER BY ciclo_key, ciclo; los NULL van primero."""
+    if ciclo is None:
+        return (-1, "")
+    return (ordinal(ciclo), ciclo.upper())
+
+
+@dataclass(frozen=True, order=True)
+class Ciclo:
+    """Ciclo escolar comparable: primero por ordinal y luego por texto."""
+
+    clave: int
+    orden: str = field(repr=False)
+    texto: str = field(compare=False)
+
+    @classmethod
+    def de(cls, texto: str) -> "Ciclo":
+        return cls(ordinal(texto), texto.upper(), texto)
+
+    @property
+    def anio(self) -> int:
+        return self.clave // 10
+
+    @property
+    def periodo(self) -> int:
+        """1 = ENE/JUN, 2 = AGO/DIC (o cualquier otro)."""
+        return self.clave % 10
+
+    def __str__(self) -> str:
+        return self.texto
+
+
+def limite(texto: str, final: bool = False) -> int:
+    """
+    Ordinal de un extremo de rango. Acepta "2019-A" / "2019-B" (A = ENE/JUN,
+    B = AGO/DIC), "2019-1" / "2019-2", el año solo (todo el año) o un ciclo completo
+    como "2019-SEM-AGO/DIC". Lanza ValueError si no empieza con un año.
+    """
+    t = texto.strip()
+    m = _LIMITE.match(t)
+    if m:
+        anio, periodo = int(m.group(1)), (m.group(2) or "").upper()
+        if not periodo:
+            return anio * 10 + (2 if final else 1)
+        return anio * 10 + (1 if periodo in ("A", "1") else 2)
+    if not _ANIO.match(t):
+        raise ValueError(f"Ciclo no válido: {texto!r} (use p. ej. 2019-A, 2019-B o 2019-SEM-AGO/DIC)")
+    return ordinal(t)
+
+
+@dataclass(frozen=True)
+class Rango:
+    """Rango cerrado [desde, hasta] de ordinales de ciclo."""
+
+    desde: int = 0
+    hasta: int = MAX_ORDINAL
+
+    @classmethod
+    def de(cls, desde: str | None, hasta: str | None) -> "Rango | None":
+        """Rango de los parámetros `desde`/`hasta`; None si no viene ninguno."""
+        desde, hasta = (desde or "").strip(), (hasta or "").strip()
+        if not desde and not hasta:
+            return None
+        r = cls(
+            limite(desde) if desde else 0,
+            limite(hasta, final=True) if hasta else MAX_ORDINAL,
+        )
+        if r.desde > r.hasta:
+            raise ValueError(f"Rango de ciclos vacío: desde={desde!r} es posterior a hasta={hasta!r}")
+        return r
+
+    def contiene(self, ciclo: str | None) -> bool:
+        return ciclo is not None and self.desde <= ordinal(ciclo) <= self.hasta
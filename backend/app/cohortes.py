@@ -0,0 +1,144 @@
+"""
+Cubo de retención cohorte × ciclo × semestre, materializado junto a la tabla de hechos.
+
+  - cohortes_cubo    : alumnos activos (con boletas) por (programa_id, cohorte, ciclo, semestre).
+                       Cada alumno cuenta una vez por ciclo, en su menor semestre de ese ciclo,
+                       así que sumar sobre semestres da alumnos distintos por (cohorte, ciclo).
+  - cohortes_ingreso : alumnos por (programa_id, cohorte) en ingenieria.alumnos.
+
+programa_id es el programa del alumno (misma dimensión que `programa_like`).
+Una celda depende de las boletas de su ciclo y de los alumnos de su cohorte
+(ciclo_ingreso y programa). hechos.refrescar() pasa los ciclos que recalculó; además
+se guarda una firma de alumnos por cohorte en `cohortes_estado` (filas + SUM y BIT_XOR
+de CRC32, como hechos_estado) y se recalculan también las cohortes cuya firma cambió: un
+cambio sólo en alumnos (re-importación, programa reasignado, otra cohorte) no deja el
+cubo viejo. El ingreso (sólo alumnos, barato) se recalcula completo cada vez.
+"""
+from sqlalchemy import bindparam, text
+
+from .hechos import HECHOS, PROGRAMAS, SCHEMA, SQL_PROGRAMA_ALUMNO, _bin, sql_firma
+
+CUBO = f"{SCHEMA}.cohortes_cubo"
+INGRESO = f"{SCHEMA}.cohortes_ingreso"
+ESTADO = f"{SCHEMA}.cohortes_estado"
+
+DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {CUBO} (
+      programa_id INT UNSIGNED      NOT NULL,
+      cohorte     VARCHAR(64)       NOT NULL,
+      ciclo       VARCHAR(64)       NOT NULL,
+      ciclo_key   INT UNSIGNED      NOT NULL,
+      semestre    SMALLINT UNSIGNED NOT NULL,
+      activos     INT UNSIGNED      NOT NULL,
+      PRIMARY KEY (programa_id, cohorte, ciclo, semestre),
+      KEY ix_ciclo (ciclo)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {INGRESO} (
+      programa_id INT UNSIGNED NOT NULL,
+      cohorte     VARCHAR(64)  NOT NULL,
+      ingreso     INT UNSIGNED NOT NULL,
+      PRIMARY KEY (programa_id, cohorte)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {ESTADO} (
+      cohorte  VARCHAR(64)     NOT NULL PRIMARY KEY,
+      filas    BIGINT UNSIGNED NOT NULL,
+      firma    BIGINT UNSIGNED NOT NULL
+    )
+    """,
+]
+
+# Firma por cohorte de las columnas de alumnos que usa el cubo
+SQL_FIRMAS = f"""
+SELECT TRIM(a.ciclo_ingreso) AS cohorte,
+       COUNT(*) AS filas,
+       {sql_firma("a.matricula", "a.ciclo_ingreso", "a.desc_programa")} AS firma
+FROM ingenieria.alumnos a
+WHERE COALESCE(TRIM(a.ciclo_ingreso), '') <> ''
+GROUP BY TRIM(a.ciclo_ingreso)
+"""
+
+# Una pasada sobre hechos ⨝ alumnos: primero (alumno, ciclo) con su menor semestre,
+# luego el conteo por celda.
+SQL_CUBO = f"""
+INSERT INTO {CUBO} (programa_id, cohorte, ciclo, ciclo_key, semestre, activos)
+SELECT t.programa_id, t.cohorte, t.ciclo, t.ciclo_key, t.semestre, COUNT(*)
+FROM (
+  SELECT p.id AS programa_id,
+         TRIM(a.ciclo_ingreso) AS cohorte,
+         COALESCE(h.ciclo, '') AS ciclo,
+         h.ciclo_key,
+         h.matricula,
+         COALESCE(MIN(h.semestre_n), 0) AS semestre
+  FROM {HECHOS} h
+  JOIN ingenieria.alumnos a ON a.matricula = h.matricula
+  JOIN {PROGRAMAS} p ON p.programa = {_bin(SQL_PROGRAMA_ALUMNO)}
+  WHERE COALESCE(TRIM(a.ciclo_ingreso), '') <> ''
+    {{filtro}}
+  GROUP BY p.id, TRIM(a.ciclo_ingreso), h.ciclo_key, COALESCE(h.ciclo, ''), h.matricula
+) t
+GROUP BY t.programa_id, t.cohorte, t.ciclo_key, t.ciclo, t.semestre
+"""
+
+SQL_INGRESO = f"""
+INSERT INTO {INGRESO} (programa_id, cohorte, ingreso)
+SELECT p.id, TRIM(a.ciclo_ingreso), COUNT(DISTINCT a.matricula)
+FROM ingenieria.alumnos a
+JOIN {PROGRAMAS} p ON p.programa = {_bin(SQL_PROGRAMA_ALUMNO)}
+WHERE COALESCE(TRIM(a.ciclo_ingreso), '') <> ''
+GROUP BY p.id, TRIM(a.ciclo_ingreso)
+"""
+
+
+def _recalcular(conn, columna: str, filtro: str, valores: list) -> None:
+    # borra y vuelve a insertar las celdas con `columna` IN valores
+    conn.execute(
+        text(f"DELETE FROM {CUBO} WHERE {columna} IN :valores")
+        .bindparams(bindparam("valores", expanding=True)),
+        {"valores": valores},
+    )
+    conn.execute(
+        text(SQL_CUBO.format(filtro=filtro)).bindparams(bindparam("valores", expanding=True)),
+        {"valores": valores},
+    )
+
+
+def refrescar(conn, ciclos: list, completo: bool = False) -> dict:
+    """
+    Actualiza el cubo dentro de la transacción del refresco de hechos.
+    `ciclos` son los ciclos recalculados o eliminados ('' = ciclo NULL); las cohortes
+    cuya firma de alumnos cambió se recalculan completas.
+    """
+    if not completo and conn.execute(text(f"SELECT 1 FROM {CUBO} LIMIT 1")).first() is None:
+        completo = True   # cubo recién creado: se llena completo una vez
+    fuente = {r.cohorte: (r.filas, r.firma) for r in conn.execute(text(SQL_FIRMAS))}
+    previo = {r.cohorte: (r.filas, r.firma) for r in conn.execute(text(f"SELECT cohorte, filas, firma FROM {ESTADO}"))}
+    cohortes = sorted({c for c, f in fuente.items() if previo.get(c) != f} | (set(previo) - set(fuente)))
+    if completo:
+        conn.execute(text(f"DELETE FROM {CUBO}"))
+        conn.execute(text(SQL_CUBO.format(filtro="")))
+    else:
+        if ciclos:
+            _recalcular(conn, "ciclo", "AND COALESCE(h.ciclo, '') IN :valores", ciclos)
+        if cohortes:
+            _recalcular(conn, "cohorte", "AND TRIM(a.ciclo_ingreso) IN :valores", cohortes)
+    if cohortes:
+        conn.execute(
+            text(f"DELETE FROM {ESTADO} WHERE cohorte IN :cohortes")
+            .bindparams(bindparam("cohortes", expanding=True)),
+            {"cohortes": cohortes},
+        )
+        nuevas = [{"cohorte": c, "filas": fuente[c][0], "firma": fuente[c][1]} for c in cohortes if c in fuente]
+        if nuevas:
+            conn.execute(text(f"INSERT INTO {ESTADO} (cohorte, filas, firma) VALUES (:cohorte, :filas, :firma)"), nuevas)
+    conn.execute(text(f"DELETE FROM {INGRESO}"))
+    conn.execute(text(SQL_INGRESO))
+    return {
+        "completo": completo,
+        "ciclos": [] if completo else ciclos,
+        "cohortes": [] if completo else cohortes,
+    }
@@ -0,0 +1,67 @@
+"""
+Estado compartido entre los workers de un mismo servidor (modo producción, ver
+gunicorn.conf.py).
+
+Con COMPARTIDO_DIR definido (p.ej. /tmp/cacei) los procesos usan ese directorio para:
+  - la caché de resultados: un SQLite en modo WAL (cache.CacheCompartida) en vez de un
+    dict por proceso; un resultado calculado por un worker lo leen todos
+  - la instantánea del motor en memoria: arreglos .npy abiertos con mmap
+    (memoria.py); las páginas las comparte el sistema operativo, así que la memoria
+    no crece con el número de workers
+  - los candados: sólo un worker construye la instantánea y sólo uno corre el
+    precálculo (precalculo.py)
+
+Sin COMPARTIDO_DIR todo queda en el proceso, como en desarrollo (uvicorn --reload).
+"""
+import contextlib
+import fcntl
+import os
+from pathlib import Path
+
+DIR = Path(os.environ["COMPARTIDO_DIR"]) if os.getenv("COMPARTIDO_DIR") else None
+
+_lideres: dict = {}   # nombre -> descriptor del candado que este proceso conserva
+
+
+def activo() -> bool:
+    return DIR is not None
+
+
+def ruta(nombre: str) -> Path:
+    DIR.mkdir(parents=True, exist_ok=True)
+    return DIR / nombre
+
+
+@contextlib.contextmanager
+def candado(nombre: str):
+    """Candado exclusivo entre procesos (flock); espera a que se libere."""
+    with open(ruta(f"{nombre}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def lider(nombre: str) -> bool:
+    """
+    True si este proceso es (o acaba de volverse) el único dueño de `nombre`. El
+    candado se conserva mientras el proceso viva; si el dueño muere, el siguiente que
+    pregunte lo toma.
+    """
+    if not activo():
+        return True
+    if nombre in _lideres:
+        return True
+    f = open(ruta(f"{nombre}.lock"), "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return False
+    _lideres[nombre] = f
+    return True
+
+
+def estado() -> dict:
+    return {"dir": str(DIR) if DIR else None, "pid": os.getpid(), "lider_de": sorted(_lideres)}
@@ -0,0 +1,133 @@
+"""
+Compresión negociada de respuestas (middleware ASGI): brotli si el cliente lo acepta y
+el paquete `brotli` está instalado, si no gzip.
+
+  - sólo tipos de texto (JSON, NDJSON, CSV, ...); XLSX/Parquet ya vienen comprimidos
+  - respuestas de un solo bloque menores a COMPRESION_MIN_BYTES (default 1024) salen igual
+  - las respuestas en streaming se comprimen por bloque con flush, así siguen llegando
+    al cliente a medida que se generan
+  - niveles: GZIP_NIVEL (default 6) y BROTLI_CALIDAD (default 5; 11 es demasiado lento
+    para respuestas generadas en cada petición)
+"""
+import functools
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+MINIMO = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+GZIP_NIVEL = int(os.getenv("GZIP_NIVEL", "6"))
+BROTLI_CALIDAD = int(os.getenv("BROTLI_CALIDAD", "5"))
+
+COMPRIMIBLES = ("text/", "application/json", "application/x-ndjson", "application/xml", "application/javascript")
+
+
+@functools.cache   # sin el paquete, no reintentar el import en cada petición
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def disponibles() -> list:
+    return (["br"] if _brotli() else []) + ["gzip"]
+
+
+def negociar(accept_encoding: str) -> str | None:
+    """Codificación a usar según Accept-Encoding (None = sin comprimir)."""
+    aceptadas = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, resto = parte.strip().partition(";")
+        q = 1.0
+        if resto.strip().startswith("q="):
+            try:
+                q = float(resto.strip()[2:])
+            except ValueError:
+                q = 0.0
+        aceptadas[nombre.strip().lower()] = q
+    candidatas = [c for c in disponibles() if aceptadas.get(c, aceptadas.get("*", 0.0)) > 0]
+    # a igual q se prefiere brotli (el orden de disponibles())
+    return max(candidatas, key=lambda c: aceptadas.get(c, aceptadas.get("*", 0.0)), default=None)
+
+
+class _Gzip:
+    def __init__(self):
+        self.z = zlib.compressobj(GZIP_NIVEL, zlib.DEFLATED, 31)   # 31 = formato gzip
+
+    def bloque(self, datos: bytes) -> bytes:
+        return self.z.compress(datos) + self.z.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self, datos: bytes) -> bytes:
+        return self.z.compress(datos) + self.z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self.c = _brotli().Compressor(quality=BROTLI_CALIDAD)
+
+    def bloque(self, datos: bytes) -> bytes:
+        return self.c.process(datos) + self.c.flush()
+
+    def terminar(self, datos: bytes) -> bytes:
+        return self.c.process(datos) + self.c.finish()
+
+
+COMPRESORES = {"gzip": _Gzip, "br": _Brotli}
+
+
+def _comprimible(headers: Headers) -> bool:
+    return "content-encoding" not in headers and headers.get("content-type", "").startswith(COMPRIMIBLES)
+
+
+class Compresion:
+    def __init__(self, app, minimo: int = MINIMO):
+        self.app = app
+        self.minimo = minimo
+
+    async def __call__(self, scope, receive, send):
+        codificacion = None
+        if scope["type"] == "http":
+            codificacion = negociar(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None       # http.response.start retenido hasta ver el primer bloque
+        compresor = None
+        pasar = False
+
+        async def enviar(message):
+            nonlocal inicio, compresor, pasar
+            if message["type"] == "http.response.start":
+                inicio = message
+                return
+            if message["type"] != "http.response.body" or pasar:
+                await send(message)
+                return
+            cuerpo, mas = message.get("body", b""), message.get("more_body", False)
+            if compresor is None:
+                headers = MutableHeaders(scope=inicio)
+                headers.add_vary_header("Accept-Encoding")
+                if not _comprimible(headers) or (not mas and len(cuerpo) < self.minimo):
+                    pasar = True
+                    await send(inicio)
+                    await send(message)
+                    return
+                compresor = COMPRESORES[codificacion]()
+                headers["Content-Encoding"] = codificacion
+                if mas:
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                    datos = compresor.bloque(cuerpo)
+                else:
+                    datos = compresor.terminar(cuerpo)
+                    headers["Content-Length"] = str(len(datos))
+                await send(inicio)
+                await send({"type": "http.response.body", "body": datos, "more_body": mas})
+                return
+            datos = compresor.bloque(cuerpo) if mas else compresor.terminar(cuerpo)
+            await send({"type": "http.response.body", "body": datos, "more_body": mas})
+
+        await self.app(scope, receive, enviar)
@@ -0,0 +1,93 @@
+"""
+Peticiones condicionales para los endpoints KPI (middleware ASGI).
+
+El resultado de un endpoint KPI sólo depende de sus parámetros y de los datos, así que
+el ETag se arma con (versión de los datos, ruta, parámetros) sin generar la respuesta:
+
+  - toda respuesta 200 lleva ETag débil (W/"v<versión>-<hash>"; débil porque la
+    compresión cambia los bytes), Last-Modified (fecha del último refresco) y
+    Cache-Control (HTTP_CACHE_MAX_AGE, default 0 = el navegador revalida siempre)
+  - If-None-Match que coincide (o If-Modified-Since no anterior al último refresco)
+    responde 304 antes de llegar al handler: no consulta MySQL (salvo releer la versión,
+    una vez cada DATA_VERSION_TTL segundos por proceso)
+
+Sólo aplica a GET sobre las rutas indicadas (las de handlers con @cacheado).
+"""
+import hashlib
+import os
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from . import version
+from .db import get_db
+
+MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+CACHE_CONTROL = f"private, max-age={MAX_AGE}, must-revalidate" if MAX_AGE > 0 else "no-cache"
+
+
+def rutas_cacheadas(router, prefijo: str = "") -> set:
+    """Rutas GET del router cuyos handlers pasan por @cacheado."""
+    return {
+        prefijo + r.path
+        for r in router.routes
+        if "GET" in getattr(r, "methods", ()) and hasattr(r.endpoint, "__wrapped__")
+    }
+
+
+def etiqueta(v: version.Version, ruta: str, query: bytes) -> str:
+    # los parámetros se ordenan: ?a=1&b=2 y ?b=2&a=1 comparten ETag
+    params = sorted(parse_qsl(query.decode("latin-1"), keep_blank_values=True))
+    h = hashlib.blake2b(repr((ruta, params)).encode(), digest_size=12).hexdigest()
+    return f'W/"v{v.numero}-{h}"'
+
+
+def _coincide(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # comparación débil: se ignora el prefijo W/
+    return etag[2:] in {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+
+
+def _no_modificado(if_modified_since: str, v: version.Version) -> bool:
+    try:
+        fecha = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # Last-Modified va con resolución de segundos
+    return fecha.tzinfo is not None and fecha >= v.actualizado.replace(microsecond=0)
+
+
+class Condicional:
+    def __init__(self, app, rutas: set):
+        self.app = app
+        self.rutas = frozenset(rutas)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in self.rutas:
+            await self.app(scope, receive, send)
+            return
+
+        v = await version.aactual(get_db())
+        cabeceras = [
+            (b"etag", etiqueta(v, scope["path"], scope.get("query_string", b"")).encode()),
+            (b"last-modified", format_datetime(v.actualizado.replace(microsecond=0), usegmt=True).encode()),
+            (b"cache-control", CACHE_CONTROL.encode()),
+        ]
+        pedidas = Headers(scope=scope)
+        inm, ims = pedidas.get("if-none-match"), pedidas.get("if-modified-since")
+        if (inm and _coincide(inm, cabeceras[0][1].decode())) or (not inm and ims and _no_modificado(ims, v)):
+            await send({"type": "http.response.start", "status": 304, "headers": cabeceras})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def enviar(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                for k, val in cabeceras:
+                    if k.decode() not in headers:
+                        headers.append(k.decode(), val.decode())
+            await send(message)
+
+        await self.app(scope, receive, enviar)
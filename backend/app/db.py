@@ -1,5 +1,139 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
 import os
-from sqlalchemy import create_engine, text
+import re
+import threading
+import time
+from collections.abc import Sequence
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from . import admision, metricas
+
+STREAM_CHUNK = int(os.getenv("DB_STREAM_CHUNK", "1000"))
+
+# Consultas más lentas que esto (ejecución + lectura) se registran en el log
+# "app.db.lentas" con SQL y parámetros; con DB_SLOW_EXPLAIN=1 también su EXPLAIN.
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "1000"))
+SLOW_EXPLAIN = os.getenv("DB_SLOW_EXPLAIN", "0") == "1"
+log_lentas = logging.getLogger("app.db.lentas")
+
+# Nombre estable de la consulta en curso: lo fija el router con el nombre del
+# endpoint (ver routers/stats.py) y se usa como etiqueta de las métricas.
+consulta_actual: contextvars.ContextVar = contextvars.ContextVar("consulta_actual", default="sin_endpoint")
+
+
+def pool_options() -> dict:
+    """
+    Parámetros del pool tomados del entorno (junto a DB_HOST/DB_PORT):
+      DB_POOL_SIZE (5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT (30 s),
+      DB_POOL_RECYCLE (3600 s), DB_POOL_PRE_PING (1 = ping en cada checkout).
+    Con DB_POOL_PRE_PING=0 se ahorra un round-trip por consulta y se confía en
+    DB_POOL_RECYCLE (menor que wait_timeout de MySQL) para descartar conexiones viejas.
+    """
+    return dict(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "3600")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    )
+
+
+# Modo captura: en vez de ejecutar, q()/aq()/stream() anotan (sql, params) y devuelven
+# un resultado vacío. Lo usa el asesor de índices para obtener el SQL de cada endpoint.
+_captura: contextvars.ContextVar = contextvars.ContextVar("captura", default=None)
+
+
+@contextlib.contextmanager
+def capturar():
+    consultas: list = []
+    token = _captura.set(consultas)
+    try:
+        yield consultas
+    finally:
+        _captura.reset(token)
+
+
+@contextlib.contextmanager
+def sin_captura():
+    """Dentro de capturar(): ejecuta de verdad (p.ej. para resolver un filtro del SQL capturado)."""
+    token = _captura.set(None)
+    try:
+        yield
+    finally:
+        _captura.reset(token)
+
+
+def _texto(sql: str, params: dict):
+    """
+    text(sql) marcando como `expanding` los parámetros lista/tupla, para poder
+    escribir `col IN :ids` con una lista de Python.
+    """
+    stmt = text(sql)
+    listas = [
+        bindparam(k, expanding=True)
+        for k, v in params.items()
+        if isinstance(v, (list, tuple)) and re.search(rf":{k}\b", sql)
+    ]
+    return stmt.bindparams(*listas) if listas else stmt
+
+
+class _Espera:
+    """Acumula el tiempo que tardan los checkouts del pool (incluye pre-ping)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def registrar(self, t0: float) -> None:
+        dt = time.perf_counter() - t0
+        with self._lock:
+            self.checkouts += 1
+            self.total += dt
+            self.max = max(self.max, dt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(1000 * self.total / self.checkouts, 3) if self.checkouts else None,
+                "wait_max_ms": round(1000 * self.max, 3),
+            }
+
+
+def _dicts(columnas: list, filas) -> list:
+    return [dict(zip(columnas, row)) for row in filas]
+
+
+class Tabla(Sequence):
+    """
+    Resultado de qt()/aqt(): nombres de columna + una tupla por fila, tal como salen del
+    cursor. Se recorre como la lista de dicts de q() (cada acceso arma el dict), así
+    que quien ya consumía dicts no cambia; app/respuestas.py la serializa sin armarlos.
+    """
+    __slots__ = ("columnas", "filas")
+
+    def __init__(self, columnas, filas):
+        self.columnas = tuple(columnas)
+        self.filas = [tuple(f) for f in filas]
+
+    def __len__(self) -> int:
+        return len(self.filas)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return _dicts(self.columnas, self.filas[i])
+        return dict(zip(self.columnas, self.filas[i]))
+
+    def __iter__(self):
+        cols = self.columnas
+        return (dict(zip(cols, f)) for f in self.filas)
+
 
 class DB:
     def __init__(self):
@@ -7,13 +141,239 @@ class DB:
         port = int(os.getenv("DB_PORT","13306"))
         user = os.getenv("DB_USER","root")
         pw   = os.getenv("DB_PASS","rootpass")
+        opts = pool_options()
         # We won't bind to a single schema; we will reference schema.table in queries
         uri = f"mysql+pymysql://{user}:{pw}@{host}:{port}/"
-        self.engine = create_engine(uri, pool_pre_ping=True, pool_recycle=3600)
+        self.engine = create_engine(uri, **opts)
+        self._espera = _Espera()
+        # Motor async (aiomysql) para los handlers `async def`; con DB_ASYNC=0 aq()
+        # delega en q() dentro de un hilo, útil si el driver async no está disponible.
+        self.async_engine = None
+        self._espera_async = _Espera()
+        if os.getenv("DB_ASYNC", "1") == "1":
+            self.async_engine = create_async_engine(
+                f"mysql+aiomysql://{user}:{pw}@{host}:{port}/",
+                **opts,
+            )
 
     def q(self, sql: str, **params):
+        return self._q(sql, params, _dicts)
+
+    def qt(self, sql: str, **params) -> "Tabla":
+        """Como q() pero sin armar un dict por fila: columnas + tuplas del cursor."""
+        return self._q(sql, params, Tabla)
+
+    def _q(self, sql: str, params: dict, armar, hilo: dict | None = None):
+        if (cap := _captura.get()) is not None:
+            cap.append((sql, params))
+            return armar([], [])
+        t0 = time.perf_counter()
         with self.engine.connect() as conn:
-            res = conn.execute(text(sql), params)
-            cols = res.keys()
-            data = [dict(zip(cols, row)) for row in res.fetchall()]
+            self._espera.registrar(t0)
+            if hilo is not None:   # para KILL QUERY si se cancela desde _aq
+                hilo["id"] = conn.connection.driver_connection.thread_id()
+                # después de anotar el id: si _aq se rindió mientras se esperaba el
+                # checkout (pool agotado) ya liberó el turno y la consulta no debe correr
+                if hilo.get("cancelada"):
+                    hilo.pop("id", None)
+                    nombre = consulta_actual.get()
+                    raise admision.TiempoAgotado(nombre, admision.presupuesto_ms(nombre))
+            t1 = time.perf_counter()
+            res = conn.execute(_texto(sql, params), params)
+            t2 = time.perf_counter()
+            filas = res.fetchall()
+            if hilo is not None:
+                hilo.pop("id", None)   # terminó: un KILL tardío ya no debe tocar la conexión
+            t3 = time.perf_counter()
+            data = armar(list(res.keys()), filas)
+            t4 = time.perf_counter()
+            if self._medir(sql, params, t2 - t1, t3 - t2, t4 - t3, len(data)) and SLOW_EXPLAIN:
+                self._log_explain(conn.execute(_texto("EXPLAIN " + sql, params), params).fetchall())
+        return data
+
+    async def aq(self, sql: str, **params):
+        """
+        Contraparte async de q(): misma entrada y mismo resultado (lista de dicts).
+        Varias llamadas independientes pueden correr a la vez con asyncio.gather().
+        """
+        return await self._aq(sql, params, _dicts)
+
+    async def aqt(self, sql: str, **params) -> "Tabla":
+        """Contraparte async de qt()."""
+        return await self._aq(sql, params, Tabla)
+
+    async def _aq(self, sql: str, params: dict, armar):
+        """
+        Pasa por el control de admisión (app/admision.py): turno en el carril del
+        endpoint y presupuesto de tiempo. Si la consulta vence o se cancela (cliente
+        desconectado) se le manda KILL QUERY para que deje de correr en MySQL.
+        """
+        if (cap := _captura.get()) is not None:
+            cap.append((sql, params))
+            return armar([], [])
+        nombre = consulta_actual.get()
+        async with admision.turno(nombre):
+            if self.async_engine is None:
+                hilo: dict = {}
+                try:
+                    return await admision.con_presupuesto(
+                        nombre, asyncio.to_thread(self._q, sql, params, armar, hilo)
+                    )
+                except (asyncio.CancelledError, admision.TiempoAgotado):
+                    hilo["cancelada"] = True   # si aún espera conexión, _q no ejecuta
+                    if "id" in hilo:
+                        await asyncio.shield(asyncio.to_thread(self._matar, hilo["id"]))
+                    raise
+            return await self._aq_async(sql, params, armar, nombre)
+
+    async def _aq_async(self, sql: str, params: dict, armar, nombre: str):
+        t0 = time.perf_counter()
+        async with self.async_engine.connect() as conn:
+            self._espera_async.registrar(t0)
+            hilo = (await conn.get_raw_connection()).driver_connection.thread_id()
+            t1 = time.perf_counter()
+            try:
+                res = await admision.con_presupuesto(nombre, conn.execute(_texto(sql, params), params))
+            except (asyncio.CancelledError, admision.TiempoAgotado):
+                # primero se detiene la consulta en el servidor (cerrar el socket no basta:
+                # MySQL la seguiría ejecutando); la conexión queda a medio leer y se descarta
+                await asyncio.shield(asyncio.to_thread(self._matar, hilo))
+                await conn.invalidate()
+                raise
+            t2 = time.perf_counter()
+            filas = res.fetchall()
+            t3 = time.perf_counter()
+            data = armar(list(res.keys()), filas)
+            t4 = time.perf_counter()
+            if self._medir(sql, params, t2 - t1, t3 - t2, t4 - t3, len(data)) and SLOW_EXPLAIN:
+                expl = await conn.execute(_texto("EXPLAIN " + sql, params), params)
+                self._log_explain(expl.fetchall())
         return data
+
+    def stream(self, sql: str, descripcion: list | None = None, **params):
+        """
+        Igual que q() pero perezoso: usa un cursor del lado del servidor (SSCursor de
+        PyMySQL vía yield_per) y entrega las filas de STREAM_CHUNK en STREAM_CHUNK,
+        así la memoria no crece con el tamaño del resultado.
+        La conexión queda tomada hasta que el generador se agota o se cierra.
+        Si se pasa `descripcion`, se llena con cursor.description (nombre, tipo, ...,
+        escala) en cuanto corre la consulta, aunque no devuelva filas.
+        Si el generador se cierra antes de agotarse (cliente desconectado, error al
+        serializar) la consulta recibe KILL QUERY y la conexión se descarta.
+        Como aq(), pasa por el control de admisión: turno en el carril del endpoint
+        mientras la conexión esté tomada y presupuesto de tiempo para todo el recorrido
+        (al vencer, KILL QUERY y TiempoAgotado).
+        """
+        if (cap := _captura.get()) is not None:
+            cap.append((sql, params))
+            return
+        nombre = consulta_actual.get()
+        with admision.turno_hilo(nombre):
+            yield from self._stream(sql, params, descripcion, nombre)
+
+    def _stream(self, sql: str, params: dict, descripcion: list | None, nombre: str):
+        t0 = time.perf_counter()
+        with self.engine.connect().execution_options(yield_per=STREAM_CHUNK) as conn:
+            self._espera.registrar(t0)
+            # como en _q: quien saque el id (fin normal, reloj o aborto) es el único que
+            # puede mandar KILL QUERY
+            hilo = {"id": conn.connection.driver_connection.thread_id()}
+            ms = admision.presupuesto_ms(nombre)
+            reloj = None
+            if ms > 0:
+                reloj = threading.Timer(ms / 1000, self._vencer, (hilo,))
+                reloj.daemon = True
+                reloj.start()
+            t1 = t2 = time.perf_counter()
+            n = 0
+            try:
+                res = conn.execute(_texto(sql, params), params)
+                t2 = time.perf_counter()
+                cols = list(res.keys())
+                if descripcion is not None:
+                    descripcion[:] = res.cursor.description or []
+                for row in res:
+                    n += 1
+                    yield dict(zip(cols, row))
+                if hilo.pop("id", None) is None:
+                    conn.invalidate()   # el reloj ganó por poco: el KILL pudo quedar pendiente
+            except BaseException as e:
+                # Al cerrar el SSCursor PyMySQL leería (y MySQL seguiría enviando) el resto
+                # del resultado: primero se detiene la consulta y la conexión a medio leer
+                # no vuelve al pool.
+                if (h := hilo.pop("id", None)) is not None:
+                    if isinstance(e, GeneratorExit):
+                        admision.canceladas["desconexion"] += 1
+                    self._matar(h)
+                conn.invalidate()
+                if hilo.get("vencida") and not isinstance(e, GeneratorExit):
+                    raise admision.TiempoAgotado(nombre, ms) from e
+                raise
+            finally:
+                if reloj is not None:
+                    reloj.cancel()
+                # En streaming lectura y conversión van intercaladas con el envío al cliente;
+                # un stream interrumpido también se registra (con las filas que alcanzó)
+                self._medir(sql, params, t2 - t1, time.perf_counter() - t2, 0.0, n, nombre)
+
+    def _vencer(self, hilo: dict) -> None:
+        """Presupuesto de un stream vencido (corre en el hilo del Timer)."""
+        if (h := hilo.pop("id", None)) is not None:
+            hilo["vencida"] = True
+            admision.canceladas["tiempo"] += 1
+            self._matar(h)
+
+    def _matar(self, hilo: int) -> None:
+        """KILL QUERY desde otra conexión del pool síncrono (el mismo usuario puede)."""
+        try:
+            with self.engine.connect() as conn:
+                conn.exec_driver_sql(f"KILL QUERY {int(hilo)}")
+            admision.canceladas["kill_query"] += 1
+        except Exception:   # noqa: BLE001 — p.ej. la consulta ya había terminado
+            log_lentas.warning("KILL QUERY %s falló", hilo, exc_info=True)
+
+    def _medir(self, sql, params, ejecucion, lectura, conversion, filas, nombre: str | None = None) -> bool:
+        """Registra métricas; devuelve True si la consulta fue lenta (ya registrada en log)."""
+        nombre = nombre or consulta_actual.get()
+        metricas.registrar_consulta(nombre, ejecucion, lectura, conversion, filas)
+        ms = 1000 * (ejecucion + lectura)
+        if ms < SLOW_QUERY_MS:
+            return False
+        log_lentas.warning(
+            "consulta lenta %s: %.1f ms (ejecución %.1f, lectura %.1f, conversión %.1f), %d filas\n%s\nparams=%r",
+            nombre, ms, 1000 * ejecucion, 1000 * lectura, 1000 * conversion, filas, sql.strip(), params,
+        )
+        return True
+
+    def _log_explain(self, filas) -> None:
+        log_lentas.warning("EXPLAIN %s:\n%s", consulta_actual.get(), "\n".join(str(tuple(f)) for f in filas))
+
+    def pool_stats(self) -> dict:
+        """Ocupación de los pools (para dimensionarlos según el número de workers)."""
+        def _pool(engine, espera):
+            p = engine.pool
+            return {
+                "size": p.size(),
+                "checked_out": p.checkedout(),
+                "checked_in": p.checkedin(),
+                "overflow": p.overflow(),
+                **espera.stats(),
+            }
+        stats = {"sync": _pool(self.engine, self._espera)}
+        if self.async_engine is not None:
+            stats["async"] = _pool(self.async_engine.sync_engine, self._espera_async)
+        return stats
+
+    async def dispose(self) -> None:
+        self.engine.dispose()
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+
+
+@functools.lru_cache(maxsize=1)
+def get_db() -> DB:
+    """
+    Instancia única por proceso: todos los routers (y Depends(get_db)) comparten
+    los mismos motores y pools. main.py la libera en el shutdown del lifespan.
+    """
+    return DB()
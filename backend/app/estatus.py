@@ -0,0 +1,147 @@
+"""
+Clasificación de estatus de alumnos resuelta una sola vez por valor distinto.
+
+Los KPI de deserción y egreso evaluaban varios REGEXP sobre `a.estatus` en cada fila de
+ingenieria.alumnos y en cada llamada. Aquí cada valor distinto de
+UPPER(COALESCE(a.estatus,'')) se clasifica en Python y se guarda en `cacei.estatus`
+(id, estatus, mascara; unas decenas de filas) con un bit por categoría. Las consultas
+se unen a esa tabla y agregan sobre la máscara.
+
+La tabla se actualiza en hechos.refrescar() (que corre después de cada importación):
+agrega los estatus nuevos y corrige la máscara si cambian las categorías. Los patrones
+que manda el cliente (`re_pasantes`, ...) se evalúan con REGEXP de MySQL contra el
+diccionario (acotados por regexp_time_limit y por el presupuesto del endpoint: un patrón
+con backtracking catastrófico no puede congelar el event loop) y la consulta filtra con
+`e.id IN (...)`.
+"""
+import re
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from .db import sin_captura
+from .hechos import SCHEMA, _bin
+
+ESTATUS = f"{SCHEMA}.estatus"
+
+# Mismas expresiones que usaban las consultas (REGEXP de MySQL sobre el estatus en
+# mayúsculas, con collation *_ci: sin distinguir mayúsculas).
+CATEGORIAS = {
+    "DESERTOR": r"BAJA|INACT",
+    # BD: BAJA DEFINITIVA o ' BD ' literal
+    "BD": r"(^|[^A-Z0-9])BD($|[^A-Z0-9])|BAJA[ ]+DEFINITIVA",
+    # BCPED: BAJA POR CAMBIO DE PROGRAMA
+    "BCPED": r"BCPED|CAMBIO[ ]+DE[ ]+PROGRAMA",
+    # BCPES: BAJA POR CAMBIO DE PLAN
+    "BCPES": r"BCPES|CAMBIO[ ]+DE[ ]+PLAN",
+    # BCM: BAJA POR CAMBIO DE MODALIDAD
+    "BCM": r"(^|[^A-Z0-9])BCM($|[^A-Z0-9])|CAMBIO[ ]+DE[ ]+MODALIDAD",
+    # BT: BAJA TEMPORAL
+    "BT": r"(^|[^A-Z0-9])BT($|[^A-Z0-9])|BAJA[ ]+TEMPORAL",
+    # RI: REINGRESO INSCRITO
+    "RI": r"(^|[^A-Z0-9])RI($|[^A-Z0-9])|REINGRESO[ ]+INSCRITO",
+}
+BITS = {nombre: 1 << i for i, nombre in enumerate(CATEGORIAS)}
+_REGEX = {nombre: re.compile(p, re.IGNORECASE) for nombre, p in CATEGORIAS.items()}
+
+
+def _estatus(alumno: str) -> str:
+    # misma expresión que usaban los REGEXP sobre ingenieria.alumnos
+    return f"UPPER(COALESCE({alumno}.estatus,''))"
+
+
+DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {ESTATUS} (
+      id       INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      estatus  VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+      mascara  INT UNSIGNED NOT NULL,
+      UNIQUE KEY ux_estatus (estatus)
+    )
+    """,
+]
+
+SQL_DISTINTOS = f"SELECT DISTINCT {_bin(_estatus('a'))} AS estatus FROM ingenieria.alumnos a"
+
+_lock = threading.Lock()
+_resueltos: dict = {}
+
+# ER_REGEXP_* de MySQL (3685-3700): patrón inválido, demasiado grande o que pasó
+# regexp_time_limit
+_ERRORES_REGEXP = range(3685, 3701)
+
+SQL_RESOLVER = f"""
+SELECT id FROM {ESTATUS}
+WHERE estatus COLLATE utf8mb4_0900_ai_ci REGEXP :patron
+ORDER BY id
+"""
+
+
+def clasificar(estatus: str) -> int:
+    """Máscara de categorías de un estatus (ya en mayúsculas)."""
+    return sum(bit for nombre, bit in BITS.items() if _REGEX[nombre].search(estatus))
+
+
+def join(alias: str = "e", alumno: str = "a") -> str:
+    """LEFT JOIN de ingenieria.alumnos `alumno` con su clasificación."""
+    return f"LEFT JOIN {ESTATUS} {alias} ON {alias}.estatus = {_bin(_estatus(alumno))}"
+
+
+def es(categoria: str, alias: str = "e") -> str:
+    """Condición SQL: el estatus cae en la categoría (un estatus sin clasificar no cae)."""
+    return f"({alias}.mascara & {BITS[categoria]}) <> 0"
+
+
+def refrescar(conn) -> dict:
+    """Agrega los estatus nuevos y corrige las máscaras que cambiaron (dentro del refresco de hechos)."""
+    previo = {
+        r.estatus: (r.id, r.mascara)
+        for r in conn.execute(text(f"SELECT id, estatus, mascara FROM {ESTATUS}"))
+    }
+    nuevos, cambiados = [], []
+    for r in conn.execute(text(SQL_DISTINTOS)):
+        m = clasificar(r.estatus)
+        if r.estatus not in previo:
+            nuevos.append({"estatus": r.estatus, "mascara": m})
+        elif previo[r.estatus][1] != m:
+            cambiados.append({"id": previo[r.estatus][0], "mascara": m})
+    if nuevos:
+        conn.execute(text(f"INSERT IGNORE INTO {ESTATUS} (estatus, mascara) VALUES (:estatus, :mascara)"), nuevos)
+    if cambiados:
+        conn.execute(text(f"UPDATE {ESTATUS} SET mascara = :mascara WHERE id = :id"), cambiados)
+    return {"nuevos": len(nuevos), "reclasificados": len(cambiados)}
+
+
+def invalidar() -> None:
+    """Se llama al refrescar la tabla de hechos (pueden aparecer estatus nuevos)."""
+    with _lock:
+        _resueltos.clear()
+
+
+def _guardar(k: str, ids: list) -> list:
+    with _lock:
+        if len(_resueltos) >= 1024:   # patrones arbitrarios del cliente: acotar memoria
+            _resueltos.clear()
+        _resueltos[k] = ids
+    return ids
+
+
+async def aresolver(db, patron: str) -> list:
+    """
+    Ids de los estatus que cumplen el REGEXP `patron` (en mayúsculas, sin distinguir
+    mayúsculas, como `UPPER(estatus) REGEXP :patron`). ValueError si el patrón no es válido.
+    Corre en MySQL aunque se esté capturando el SQL del endpoint (exportación, índices).
+    """
+    k = patron.upper()
+    ids = _resueltos.get(k)
+    if ids is None:
+        try:
+            with sin_captura():
+                filas = await db.aqt(SQL_RESOLVER, patron=k)
+        except DBAPIError as e:
+            if (getattr(e.orig, "args", None) or [None])[0] not in _ERRORES_REGEXP:
+                raise
+            raise ValueError(f"Expresión regular no válida {patron!r}: {e.orig.args[-1]}") from None
+        ids = _guardar(k, [r["id"] for r in filas])
+    return ids
@@ -0,0 +1,466 @@
+"""
+Exportación de los KPI a CSV, Parquet o XLSX (una hoja por reporte, como el Excel
+`Estadisticas CACEI Aeroespacial.xlsx`).
+
+Cada reporte es un endpoint de routers/stats.py. Su SQL se obtiene ejecutándolo en
+modo captura (db.capturar, igual que el asesor de índices) y luego se re-ejecuta con
+cursor de servidor (db.stream): las filas se escriben conforme salen del cursor, en
+lotes, así que la memoria no depende del tamaño del reporte. Los endpoints que
+post-procesan en Python (cursor=False) se ejecutan normal; son resultados chicos.
+
+  - csv     : un reporte -> .csv (UTF-8 con BOM, para Excel); varios -> .zip de CSVs
+  - parquet : un reporte -> .parquet (un row group por lote); varios -> .zip  (requiere pyarrow)
+  - xlsx    : un libro con una hoja por reporte (xlsxwriter en modo constant_memory)
+
+Las exportaciones grandes (varios programas) corren como trabajo en segundo plano
+(EXPORT_WORKERS hilos) y dejan el archivo en EXPORT_DIR para descargarlo después.
+"""
+import asyncio
+import csv
+import inspect
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import typing
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from .db import capturar, consulta_actual
+from .streaming import _default
+
+LOTE = 1000
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", Path(tempfile.gettempdir()) / "cacei-export"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_MAX_JOBS = int(os.getenv("EXPORT_MAX_JOBS", "50"))
+
+FORMATOS = {
+    "csv": ("csv", "text/csv; charset=utf-8"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+ZIP = ("zip", "application/zip")
+
+
+@dataclass(frozen=True)
+class Reporte:
+    nombre: str           # handler en routers/stats.py
+    hoja: str
+    cursor: bool = True   # un solo SELECT cuyo resultado se devuelve tal cual
+    en_libro: bool = True # se incluye cuando no se piden reportes explícitos
+
+
+REPORTES = {r.nombre: r for r in [
+    Reporte("inscritos_por_ciclo", "Inscritos por Ciclo"),
+    Reporte("indice_reprobacion", "Índice de Reprobación"),
+    Reporte("reprobacion_detalle", "Reprobación por Materia"),
+    Reporte("desercion", "Deserción"),
+    Reporte("desercion_escolar", "Deserción Escolar"),
+    Reporte("seguimiento_cohorte_resumen", "Seguimiento de Cohortes"),
+    Reporte("cohortes_matriz", "Matriz de Cohortes", cursor=False),
+    Reporte("cedula_322", "Cédula 322"),
+    Reporte("cedula_322_detalle", "Cédula 322 Detalle"),
+    Reporte("seguimiento_cohorte", "Cohorte", en_libro=False),   # requiere ciclo_ingreso
+    Reporte("meta_cohortes", "Cohortes", en_libro=False),
+    Reporte("meta_programas", "Programas", en_libro=False),
+]}
+
+
+@dataclass
+class Fuente:
+    """Origen de las filas de una hoja: SQL a re-ejecutar con cursor o filas ya calculadas."""
+    hoja: str
+    sql: str | None = None
+    params: dict = field(default_factory=dict)
+    filas: list | None = None
+
+    def abrir(self, db) -> tuple:
+        """
+        (columnas, lotes). La consulta ya corrió al volver, así que las columnas
+        —(nombre, type_code de PyMySQL, escala)— se conocen aunque no haya filas. Las
+        filas ya calculadas no traen tipos: type_code None.
+        """
+        if self.filas is not None:
+            columnas = [(k, None, None) for k in (self.filas[0] if self.filas else [])]
+            return columnas, (self.filas[i:i + LOTE] for i in range(0, len(self.filas), LOTE))
+        descripcion = []
+        lotes = self._lotes(db, descripcion)
+        primero = next(lotes, None)
+        columnas = [(d[0], d[1], d[5]) for d in descripcion]
+        return columnas, itertools.chain([primero] if primero else [], lotes)
+
+    def _lotes(self, db, descripcion: list):
+        lote = []
+        for row in db.stream(self.sql, descripcion, **self.params):
+            lote.append(row)
+            if len(lote) >= LOTE:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+
+# --- Preparación -----------------------------------------------------------------
+def _convertir(anotacion, valores: list):
+    tipos = [t for t in typing.get_args(anotacion) if t is not type(None)] or [anotacion]
+    t = tipos[0]
+    if typing.get_origin(t) is list:
+        return list(valores)
+    v = valores[-1]
+    if t is bool:
+        return v.strip().lower() in ("1", "true", "yes", "on", "si", "sí")
+    if t in (int, float):
+        return t(v)
+    return v
+
+
+def _argumentos(handler, consulta: dict, programa_like: str | None) -> dict:
+    """kwargs del handler a partir de los query params (listas de strings) de la exportación."""
+    kwargs = {}
+    for nombre, p in inspect.signature(handler).parameters.items():
+        if nombre == "programa_like" and programa_like is not None:
+            kwargs[nombre] = programa_like
+        elif nombre in ("stream", "limite", "cursor"):   # la exportación va completa
+            kwargs[nombre] = None
+        elif nombre == "motor":
+            kwargs[nombre] = "sql"
+        elif (getattr(p.default, "alias", None) or nombre) in consulta:
+            kwargs[nombre] = _convertir(p.annotation, consulta[getattr(p.default, "alias", None) or nombre])
+        elif p.default is inspect.Parameter.empty:
+            raise ValueError(f"{handler.__name__} requiere el parámetro '{nombre}'")
+        elif hasattr(p.default, "default"):   # Query(...)
+            kwargs[nombre] = p.default.default
+    return kwargs
+
+
+def _nombre_hoja(texto: str, usados: set, largo: int) -> str:
+    # Excel: máx. 31 caracteres, sin []:*?/\ y únicos en el libro (también sirve de nombre en el zip)
+    base = re.sub(r"[\[\]:*?/\\]", "-", texto).strip()[:largo] or "Hoja"
+    nombre, i = base, 2
+    while nombre.lower() in usados:
+        sufijo = f" ({i})"
+        nombre, i = base[:largo - len(sufijo)] + sufijo, i + 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+async def preparar(db, reportes: list, programas_like: list, consulta: dict, formato: str) -> list:
+    """
+    Resuelve cada (programa, reporte) a una Fuente. Corre en el event loop: los
+    handlers se ejecutan en modo captura (sin tocar la BD) salvo los cursor=False.
+    """
+    from . import hechos, programas
+    from .routers import stats
+
+    desconocidos = [r for r in reportes if r not in REPORTES]
+    if desconocidos:
+        raise ValueError(f"reportes desconocidos: {desconocidos}; disponibles: {list(REPORTES)}")
+    elegidos = [REPORTES[r] for r in reportes] or [r for r in REPORTES.values() if r.en_libro]
+
+    await hechos.aasegurar(db)                   # fuera del modo captura
+    await asyncio.to_thread(programas.cargar, db)
+    fuentes, usados = [], set()
+    for prog in programas_like or [None]:
+        for rep in elegidos:
+            handler = getattr(stats, rep.nombre)
+            handler = getattr(handler, "__wrapped__", handler)   # sin pasar por la caché
+            kwargs = _argumentos(handler, consulta, prog)
+            titulo = rep.hoja if len(programas_like or []) <= 1 else f"{rep.hoja} - {prog}"
+            hoja = _nombre_hoja(titulo, usados, 31 if formato == "xlsx" else 120)
+            if rep.cursor:
+                with capturar() as consultas:
+                    await handler(**kwargs)
+                if len(consultas) == 1:
+                    sql, params = consultas[0]
+                    fuentes.append(Fuente(hoja, sql=sql, params=params))
+                    continue
+            fuentes.append(Fuente(hoja, filas=list(await handler(**kwargs))))
+    return fuentes
+
+
+# --- Escritura -------------------------------------------------------------------
+class _Salida:
+    """Archivo de sólo escritura que acumula bytes hasta que el generador los drena."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        self._buf += b
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self) -> bytes:
+        b = bytes(self._buf)
+        self._buf.clear()
+        return b
+
+
+def _celda(v):
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    try:
+        return _default(v)   # Decimal -> int/float, fechas -> ISO, como en la respuesta JSON
+    except TypeError:
+        return str(v)
+
+
+def _csv(fuente: Fuente, db):
+    """Bytes de un CSV, lote por lote; la cabecera va aunque el reporte venga vacío."""
+    texto = io.StringIO()
+    w = csv.writer(texto)
+    columnas, lotes = fuente.abrir(db)
+    w.writerow([c[0] for c in columnas])
+    yield ("\ufeff" + texto.getvalue()).encode()
+    texto.seek(0)
+    texto.truncate()
+    for lote in lotes:
+        for row in lote:
+            w.writerow([_celda(v) for v in row.values()])
+        yield texto.getvalue().encode()
+        texto.seek(0)
+        texto.truncate()
+
+
+def _tipo_arrow(pa, type_code, escala, valores):
+    """Tipo Arrow de una columna: del cursor si hay type_code; si no, de todos sus valores."""
+    from pymysql.constants import FIELD_TYPE as F
+
+    if type_code in (F.TINY, F.SHORT, F.LONG, F.LONGLONG, F.INT24, F.YEAR):
+        return pa.int64()
+    if type_code in (F.DECIMAL, F.NEWDECIMAL):
+        return pa.int64() if escala == 0 else pa.float64()   # como _celda: Decimal entero -> int
+    if type_code in (F.FLOAT, F.DOUBLE):
+        return pa.float64()
+    if type_code is not None:
+        return pa.string()
+    tipos = {type(v) for v in valores if v is not None}
+    if tipos == {bool}:
+        return pa.bool_()
+    if tipos and tipos <= {int, bool}:
+        return pa.int64()
+    if tipos and tipos <= {int, bool, float}:
+        return pa.float64()
+    return pa.string()
+
+
+def _parquet(fuente: Fuente, db, sink):
+    """
+    Escribe un Parquet en `sink` (un row group por lote); cede después de cada lote.
+    El esquema sale de los metadatos de la consulta, así que un reporte vacío sigue
+    siendo un Parquet válido con sus columnas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columnas, lotes = fuente.abrir(db)
+    filas = fuente.filas or []
+    schema = pa.schema([
+        (nombre, _tipo_arrow(pa, tipo, escala, [_celda(r[nombre]) for r in filas] if tipo is None else ()))
+        for nombre, tipo, escala in columnas
+    ])
+    conv = {pa.bool_(): bool, pa.int64(): int, pa.float64(): float, pa.string(): str}
+    with pq.ParquetWriter(sink, schema) as writer:
+        for lote in lotes:
+            arrays = [
+                pa.array([None if v is None else conv[f.type](v) for v in (_celda(r[f.name]) for r in lote)],
+                         type=f.type)
+                for f in schema
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield
+
+
+def _xlsx(fuentes: list, db, ruta: str):
+    import xlsxwriter
+
+    libro = xlsxwriter.Workbook(ruta, {"constant_memory": True, "strings_to_numbers": False})
+    negrita = libro.add_format({"bold": True})
+    try:
+        for fuente in fuentes:
+            hoja = libro.add_worksheet(fuente.hoja)
+            columnas, lotes = fuente.abrir(db)
+            hoja.write_row(0, 0, [c[0] for c in columnas], negrita)
+            fila = 1
+            for lote in lotes:
+                for row in lote:
+                    hoja.write_row(fila, 0, [_celda(v) for v in row.values()])
+                    fila += 1
+                yield
+    finally:
+        libro.close()
+
+
+def _archivo(ruta: str):
+    with open(ruta, "rb") as f:
+        yield from iter(lambda: f.read(1 << 16), b"")
+
+
+def verificar(formato: str) -> None:
+    """ValueError si el formato no existe o falta su dependencia opcional."""
+    if formato not in FORMATOS:
+        raise ValueError(f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    modulo = {"parquet": "pyarrow", "xlsx": "xlsxwriter"}.get(formato)
+    if modulo:
+        try:
+            __import__(modulo)
+        except ImportError:
+            raise ValueError(f"el formato '{formato}' requiere {modulo}")
+
+
+def tipo_archivo(formato: str, fuentes: list) -> tuple:
+    """(extensión, media type) del resultado."""
+    if formato != "xlsx" and len(fuentes) > 1:
+        return ZIP
+    return FORMATOS[formato]
+
+
+def generar(db, fuentes: list, formato: str):
+    """Generador de bytes del archivo final; pensado para StreamingResponse o para un trabajo."""
+    if formato == "xlsx":
+        fd, ruta = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            for _ in _xlsx(fuentes, db, ruta):
+                pass
+            yield from _archivo(ruta)
+        finally:
+            os.unlink(ruta)
+        return
+
+    if len(fuentes) == 1:
+        if formato == "csv":
+            yield from _csv(fuentes[0], db)
+        else:
+            sink = _Salida()
+            for _ in _parquet(fuentes[0], db, sink):
+                yield sink.drenar()
+            yield sink.drenar()
+        return
+
+    # Varios reportes: un .zip (escrito sin seek, con data descriptors) con un archivo por hoja
+    sink = _Salida()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for fuente in fuentes:
+            with zf.open(f"{fuente.hoja}.{formato}", "w", force_zip64=True) as f:
+                if formato == "csv":
+                    for b in _csv(fuente, db):
+                        f.write(b)
+                        yield sink.drenar()
+                else:
+                    # pyarrow necesita tell(): el Parquet va a un temporal y luego al zip
+                    with tempfile.SpooledTemporaryFile(max_size=8 << 20) as tmp:
+                        for _ in _parquet(fuente, db, tmp):
+                            pass
+                        tmp.seek(0)
+                        shutil.copyfileobj(tmp, f, 1 << 16)
+                    yield sink.drenar()
+    yield sink.drenar()
+
+
+# --- Trabajos en segundo plano ---------------------------------------------------
+@dataclass
+class Trabajo:
+    id: str
+    formato: str
+    hojas: list
+    estado: str = "pendiente"   # pendiente | generando | listo | error
+    creado: float = field(default_factory=time.time)
+    terminado: float | None = None
+    bytes: int = 0
+    archivo: str | None = None
+    media_type: str = ""
+    error: str = ""
+
+    def resumen(self) -> dict:
+        return {
+            k: getattr(self, k)
+            for k in ("id", "formato", "hojas", "estado", "creado", "terminado", "bytes", "error")
+        } | {"descarga": f"/api/export/jobs/{self.id}/archivo" if self.estado == "listo" else None}
+
+
+_pool = ThreadPoolExecutor(max_workers=max(1, EXPORT_WORKERS), thread_name_prefix="export")
+_lock = threading.Lock()
+_trabajos: dict = {}
+
+
+def _anotar(t: Trabajo) -> None:
+    # el estado también va a EXPORT_DIR/{id}.json: con varios workers, la consulta del
+    # avance o la descarga pueden llegar a otro proceso
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    temporal = EXPORT_DIR / f"{t.id}.json.tmp"
+    temporal.write_text(json.dumps(asdict(t)))
+    os.replace(temporal, EXPORT_DIR / f"{t.id}.json")
+
+
+def _ejecutar(db, t: Trabajo, fuentes: list) -> None:
+    consulta_actual.set("export")
+    t.estado = "generando"
+    _anotar(t)
+    ruta = EXPORT_DIR / t.archivo
+    try:
+        with open(ruta, "wb") as f:
+            for b in generar(db, fuentes, t.formato):
+                f.write(b)
+                t.bytes += len(b)
+        t.estado = "listo"
+    except Exception as e:   # se reporta en el estado del trabajo
+        t.estado = "error"
+        t.error = str(e)
+        ruta.unlink(missing_ok=True)
+    finally:
+        t.terminado = time.time()
+        _anotar(t)
+
+
+def _purgar() -> None:
+    # Conserva los EXPORT_MAX_JOBS trabajos más recientes (y sus archivos)
+    viejos = sorted(_trabajos.values(), key=lambda t: t.creado)[:-EXPORT_MAX_JOBS or None]
+    for t in viejos:
+        if t.estado in ("listo", "error"):
+            (EXPORT_DIR / t.archivo).unlink(missing_ok=True)
+            (EXPORT_DIR / f"{t.id}.json").unlink(missing_ok=True)
+            del _trabajos[t.id]
+
+
+def lanzar(db, fuentes: list, formato: str) -> Trabajo:
+    ext, media = tipo_archivo(formato, fuentes)
+    t = Trabajo(
+        id=uuid.uuid4().hex, formato=formato, hojas=[f.hoja for f in fuentes], media_type=media,
+    )
+    t.archivo = f"{t.id}.{ext}"
+    with _lock:
+        _purgar()
+        _trabajos[t.id] = t
+    _anotar(t)
+    _pool.submit(_ejecutar, db, t, fuentes)
+    return t
+
+
+def trabajo(id_: str) -> Trabajo | None:
+    t = _trabajos.get(id_)
+    if t is None and re.fullmatch(r"[0-9a-f]{32}", id_):   # lanzado por otro worker
+        try:
+            t = Trabajo(**json.loads((EXPORT_DIR / f"{id_}.json").read_text()))
+        except FileNotFoundError:
+            return None
+    return t
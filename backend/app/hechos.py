@@ -0,0 +1,387 @@
+"""
+Tabla de hechos materializada sobre estadistica.boletas.
+
+Cada fila de boletas se guarda ya normalizada (una sola vez, al refrescar):
+  - programa_id: id en `programas` de UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), ''))
+  - carrera_id : id en `programas` de UPPER(TRIM(b.carrera)) ('' si no viene)
+  - calif_num  : calificación numérica (NULL si no es número)
+  - semestre_n : número inicial de b.grado (NULL si no empieza con dígitos)
+  - ciclo_key  : año*10 + (1 si ENE/JUN, 2 en otro caso), ordenable (ver app/ciclos.py)
+
+La dimensión `ciclos` asigna ese mismo ordinal a cada ciclo que aparece en boletas o en
+alumnos (ciclo_ingreso, ultimo_ciclo_kardex): las consultas sobre alumnos ordenan y
+filtran por rango de ciclos uniéndose a ella. La clasificación de estatus
+(app/estatus.py) también se actualiza aquí, y cada refresco incrementa la versión de
+los datos (app/version.py).
+
+El refresco es incremental por ciclo: se guarda una firma (filas + SUM y BIT_XOR de CRC32,
+con el programa de alumnos cuando la boleta no trae carrera) por ciclo en
+`hechos_estado` y sólo se recalculan los ciclos cuya firma cambió. El cubo
+de cohortes (app/cohortes.py) se actualiza en la misma transacción, por los mismos
+ciclos y por las cohortes cuyos alumnos cambiaron.
+
+Uso desde consola (después de importar dumps):
+    python -m app.hechos            # incremental
+    python -m app.hechos --completo # reconstruye todo
+"""
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import bindparam, text
+
+from . import programas
+
+SCHEMA = os.getenv("DB_DERIVED_SCHEMA", "cacei")
+HECHOS = f"{SCHEMA}.boletas_hechos"
+ESTADO = f"{SCHEMA}.hechos_estado"
+PROGRAMAS = f"{SCHEMA}.programas"
+CICLOS = f"{SCHEMA}.ciclos"
+
+_lock = threading.Lock()
+_listo = False
+# Entre procesos (workers de gunicorn, importador) el refresco se serializa con GET_LOCK
+# de MySQL: _lock sólo cubre los hilos de un proceso y el DDL de _crear() hace commit
+# implícito, así que dos refrescos a la vez se intercalarían.
+CANDADO = f"{SCHEMA}.hechos"
+CANDADO_ESPERA_S = int(os.getenv("HECHOS_CANDADO_S", "3600"))
+
+# --- Expresiones de normalización ---------------------------------------------
+# Todas van protegidas por REGEXP para que el CAST nunca emita warnings
+# (en modo estricto un warning dentro de INSERT ... SELECT aborta la sentencia).
+def sql_ciclo_key(col: str) -> str:
+    """Ordinal del ciclo (mismo valor que ciclos.ordinal en Python)."""
+    return f"""
+  (CASE WHEN {col} REGEXP '^[0-9]+'
+        THEN CAST(REGEXP_SUBSTR({col}, '^[0-9]+') AS UNSIGNED)
+        ELSE 0 END) * 10
+  + CASE WHEN {col} LIKE '%ENE/JUN' THEN 1 ELSE 2 END
+"""
+
+
+SQL_CICLO_KEY = sql_ciclo_key("b.ciclo")
+
+SQL_CALIF_NUM = r"""
+  CASE WHEN b.calificacion REGEXP '^[0-9]+(\\.[0-9]+)?$'
+       THEN CAST(b.calificacion AS DECIMAL(10,2))
+       ELSE NULL END
+"""
+
+SQL_SEMESTRE_N = r"""
+  CASE WHEN TRIM(b.grado) REGEXP '^[0-9]+'
+       THEN CAST(REGEXP_SUBSTR(TRIM(b.grado), '^[0-9]+') AS UNSIGNED)
+       ELSE NULL END
+"""
+
+SQL_PROGRAMA = "UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), ''))"
+SQL_CARRERA = "UPPER(COALESCE(TRIM(b.carrera), ''))"
+# Misma expresión que la columna generada alumnos.programa_norm (app/indices.py): así
+# `SQL_PROGRAMA_ALUMNO IN (...)` puede usar su índice cuando la migración está aplicada.
+SQL_PROGRAMA_ALUMNO = "UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), ''))"
+
+
+def _bin(expr: str) -> str:
+    # La dimensión es utf8mb4_bin; se convierte explícito para no mezclar collations.
+    return f"(CONVERT({expr} USING utf8mb4) COLLATE utf8mb4_bin)"
+
+
+# Columnas e índices que debe tener la tabla de hechos; si una versión anterior no
+# los tiene se descarta y se reconstruye completa.
+COLUMNAS = {
+    "matricula", "clave", "ciclo", "ciclo_key", "programa_id", "carrera_id",
+    "calif_num", "semestre_n",
+}
+INDICES = {"ix_kpi", "ix_carrera", "ix_ciclo", "ix_matricula_sem"}
+# Columnas de versiones anteriores que ya no se usan; se eliminan sin reconstruir.
+OBSOLETAS = {"calif_es_numerica"}
+# Tablas que crea _crear(); si falta alguna (versión anterior) asegurar() refresca.
+TABLAS = (
+    "programas", "ciclos", "estatus", "boletas_hechos", "hechos_estado", "cohortes_cubo", "cohortes_ingreso",
+    "cohortes_estado", "version_datos",
+)
+
+DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {PROGRAMAS} (
+      id        INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      programa  VARCHAR(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+      UNIQUE KEY ux_programa (programa)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {CICLOS} (
+      ciclo      VARCHAR(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL PRIMARY KEY,
+      ciclo_key  INT UNSIGNED NOT NULL,
+      KEY ix_orden (ciclo_key, ciclo)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {HECHOS} (
+      id          BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      matricula   VARCHAR(32)   NULL,
+      clave       VARCHAR(32)   NULL,
+      ciclo       VARCHAR(64)   NULL,
+      ciclo_key   INT UNSIGNED  NOT NULL,
+      programa_id INT UNSIGNED  NOT NULL,
+      carrera_id  INT UNSIGNED  NOT NULL,
+      calif_num   DECIMAL(10,2) NULL,
+      semestre_n  SMALLINT UNSIGNED NULL,
+      -- Cubre las consultas KPI por programa: se resuelven sólo con el índice
+      KEY ix_kpi (programa_id, ciclo_key, ciclo, matricula, clave, calif_num, semestre_n),
+      KEY ix_carrera (carrera_id, matricula),
+      KEY ix_ciclo (ciclo),
+      -- joins por alumno (cohortes, sem_map del resumen) con el semestre ya en el índice
+      KEY ix_matricula_sem (matricula, semestre_n, ciclo_key)
+    )
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {ESTADO} (
+      ciclo        VARCHAR(64) NOT NULL PRIMARY KEY,
+      filas        BIGINT UNSIGNED NOT NULL,
+      firma        BIGINT UNSIGNED NOT NULL,
+      actualizado  DATETIME NOT NULL
+    )
+    """,
+]
+
+def sql_firma(*campos: str) -> str:
+    """
+    Firma de un grupo de filas: SUM (módulo 2^32) y BIT_XOR del CRC32 de cada fila, en
+    los 32 bits altos y bajos. Con sólo BIT_XOR dos filas idénticas se cancelan; cada
+    campo va con COALESCE porque CONCAT_WS se salta los NULL (un valor que pasa de una
+    columna nula a otra daría la misma cadena).
+    """
+    fila = "CRC32(CONCAT_WS('|', " + ", ".join(f"COALESCE({c}, '\\0')" for c in campos) + "))"
+    return f"(((SUM({fila}) % 4294967296) << 32) | BIT_XOR({fila}))"
+
+
+# La firma incluye alumnos.desc_programa cuando la boleta no trae carrera (es de donde
+# sale programa_id): re-importar alumnos o reasignar un programa cambia la firma de los
+# ciclos donde aparece ese alumno, aunque boletas no haya cambiado.
+SQL_FIRMAS = f"""
+SELECT COALESCE(b.ciclo,'') AS ciclo,
+       COUNT(*) AS filas,
+       {sql_firma("b.matricula", "b.clave", "b.calificacion", "b.grado", "b.carrera",
+                  "IF(NULLIF(TRIM(b.carrera),'') IS NULL, a.desc_programa, NULL)")} AS firma
+FROM estadistica.boletas b
+LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
+GROUP BY COALESCE(b.ciclo,'')
+"""
+
+# Dimensión de programas: cada escritura normalizada (de boletas y de alumnos) recibe
+# un id estable; INSERT IGNORE sólo agrega las nuevas.
+SQL_PROGRAMAS = f"""
+INSERT IGNORE INTO {PROGRAMAS} (programa)
+SELECT DISTINCT {_bin("t.programa")} FROM (
+  SELECT {SQL_PROGRAMA} AS programa
+  FROM estadistica.boletas b
+  LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
+  UNION
+  SELECT {SQL_CARRERA} FROM estadistica.boletas b
+  UNION
+  SELECT {SQL_PROGRAMA_ALUMNO} FROM ingenieria.alumnos a
+) t
+"""
+
+# Dimensión de ciclos: el ordinal se calcula sobre la columna original (su collation
+# decide el LIKE '%ENE/JUN', igual que en SQL_INSERT) y la llave es la cadena exacta.
+SQL_CICLOS = f"""
+INSERT IGNORE INTO {CICLOS} (ciclo, ciclo_key)
+SELECT {_bin("b.ciclo")}, {sql_ciclo_key("b.ciclo")}
+FROM estadistica.boletas b WHERE b.ciclo IS NOT NULL
+UNION
+SELECT {_bin("a.ciclo_ingreso")}, {sql_ciclo_key("a.ciclo_ingreso")}
+FROM ingenieria.alumnos a WHERE a.ciclo_ingreso IS NOT NULL
+UNION
+SELECT {_bin("a.ultimo_ciclo_kardex")}, {sql_ciclo_key("a.ultimo_ciclo_kardex")}
+FROM ingenieria.alumnos a WHERE a.ultimo_ciclo_kardex IS NOT NULL
+"""
+
+SQL_INSERT = f"""
+INSERT INTO {HECHOS}
+  (matricula, clave, ciclo, ciclo_key, programa_id, carrera_id, calif_num, semestre_n)
+SELECT
+  b.matricula,
+  b.clave,
+  b.ciclo,
+  {SQL_CICLO_KEY},
+  p.id,
+  pc.id,
+  {SQL_CALIF_NUM},
+  {SQL_SEMESTRE_N}
+FROM estadistica.boletas b
+LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
+JOIN {PROGRAMAS} p  ON p.programa  = {_bin(SQL_PROGRAMA)}
+JOIN {PROGRAMAS} pc ON pc.programa = {_bin(SQL_CARRERA)}
+"""
+
+
+def _esquema(conn) -> tuple:
+    """(columnas, índices) actuales de boletas_hechos, en minúsculas; vacíos si no existe."""
+    existentes = {
+        r.c.lower() for r in conn.execute(text("""
+            SELECT COLUMN_NAME AS c FROM information_schema.columns
+            WHERE table_schema = :s AND table_name = 'boletas_hechos'
+        """), {"s": SCHEMA})
+    }
+    indices = {
+        r.i.lower() for r in conn.execute(text("""
+            SELECT DISTINCT INDEX_NAME AS i FROM information_schema.statistics
+            WHERE table_schema = :s AND table_name = 'boletas_hechos'
+        """), {"s": SCHEMA})
+    }
+    return existentes, indices
+
+
+def _crear(conn):
+    conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {SCHEMA}"))
+    existentes, indices = _esquema(conn)
+    if existentes and not (COLUMNAS <= existentes and INDICES <= indices):
+        conn.execute(text(f"DROP TABLE {HECHOS}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {ESTADO}"))
+    elif existentes & OBSOLETAS:
+        columnas = ", ".join(f"DROP COLUMN {c}" for c in sorted(existentes & OBSOLETAS))
+        conn.execute(text(f"ALTER TABLE {HECHOS} {columnas}"))
+    from . import cohortes, estatus, version   # import tardío: importan este módulo
+    for ddl in DDL + cohortes.DDL + estatus.DDL + version.DDL:
+        conn.execute(text(ddl))
+
+
+@contextlib.contextmanager
+def _candado(db):
+    """_lock del proceso + GET_LOCK en una conexión aparte, tomada mientras dura el refresco."""
+    with _lock, db.engine.connect() as conn:
+        if not conn.execute(text("SELECT GET_LOCK(:n, :t)"), {"n": CANDADO, "t": CANDADO_ESPERA_S}).scalar():
+            raise TimeoutError(f"otro proceso lleva más de {CANDADO_ESPERA_S} s refrescando {HECHOS}")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": CANDADO})
+
+
+def refrescar(db, completo: bool = False) -> dict:
+    """
+    Sincroniza la tabla de hechos con estadistica.boletas.
+    Devuelve un resumen con los ciclos recalculados/eliminados y el tiempo total.
+    """
+    global _listo
+    t0 = time.perf_counter()
+    with _candado(db), db.engine.begin() as conn:
+        _crear(conn)
+        conn.execute(text(SQL_PROGRAMAS))
+        conn.execute(text(SQL_CICLOS))
+        from . import estatus
+        clases = estatus.refrescar(conn)
+        fuente = {r.ciclo: (r.filas, r.firma) for r in conn.execute(text(SQL_FIRMAS))}
+        previo = {
+            r.ciclo: (r.filas, r.firma)
+            for r in conn.execute(text(f"SELECT ciclo, filas, firma FROM {ESTADO}"))
+        }
+
+        if completo or not previo:
+            cambiados = sorted(fuente)
+            eliminados = sorted(previo)
+            # DELETE (no TRUNCATE) para no forzar un commit implícito a mitad del refresco
+            conn.execute(text(f"DELETE FROM {HECHOS}"))
+            conn.execute(text(f"DELETE FROM {ESTADO}"))
+            if fuente:
+                conn.execute(text(SQL_INSERT))
+        else:
+            cambiados = sorted(c for c, f in fuente.items() if previo.get(c) != f)
+            eliminados = sorted(c for c in previo if c not in fuente)
+            afectados = cambiados + eliminados
+            if afectados:
+                conn.execute(
+                    text(f"DELETE FROM {HECHOS} WHERE COALESCE(ciclo,'') IN :ciclos")
+                    .bindparams(bindparam("ciclos", expanding=True)),
+                    {"ciclos": afectados},
+                )
+                conn.execute(
+                    text(f"DELETE FROM {ESTADO} WHERE ciclo IN :ciclos")
+                    .bindparams(bindparam("ciclos", expanding=True)),
+                    {"ciclos": afectados},
+                )
+            if cambiados:
+                conn.execute(
+                    text(SQL_INSERT + " WHERE COALESCE(b.ciclo,'') IN :ciclos")
+                    .bindparams(bindparam("ciclos", expanding=True)),
+                    {"ciclos": cambiados},
+                )
+
+        if cambiados:
+            conn.execute(
+                text(f"""
+                    INSERT INTO {ESTADO} (ciclo, filas, firma, actualizado)
+                    VALUES (:ciclo, :filas, :firma, NOW())
+                """),
+                [{"ciclo": c, "filas": fuente[c][0], "firma": fuente[c][1]} for c in cambiados],
+            )
+        from . import cohortes
+        cubo = cohortes.refrescar(conn, cambiados + eliminados, completo=completo or not previo)
+        from . import version
+        version.incrementar(conn)
+        _listo = True
+    programas.invalidar()
+    estatus.invalidar()
+    from . import memoria   # import tardío: memoria importa este módulo
+    memoria.invalidar()
+    version.releer()
+
+    return {
+        "completo": completo or not previo,
+        "ciclos_recalculados": cambiados,
+        "ciclos_eliminados": eliminados,
+        "cubo_cohortes": cubo,
+        "estatus": clases,
+        "segundos": round(time.perf_counter() - t0, 3),
+    }
+
+
+def asegurar(db) -> None:
+    """
+    Garantiza que la tabla de hechos (y sus tablas derivadas) exista y tenga datos;
+    si no, la construye. También la reconstruye si le faltan columnas o índices (tabla de
+    una versión anterior). Sólo consulta information_schema la primera vez por proceso.
+    """
+    global _listo
+    if _listo:
+        return
+    rows = db.q(
+        """
+        SELECT COUNT(*) AS n FROM information_schema.tables
+        WHERE table_schema = :s AND table_name IN :tablas
+        """,
+        s=SCHEMA,
+        tablas=list(TABLAS),
+    )
+    if rows and rows[0]["n"] == len(TABLAS) and db.q(f"SELECT 1 FROM {ESTADO} LIMIT 1"):
+        with db.engine.connect() as conn:
+            existentes, indices = _esquema(conn)
+        if COLUMNAS <= existentes and INDICES <= indices:
+            _listo = True
+            return
+    refrescar(db)   # _crear() descarta la tabla de una versión anterior y se reconstruye
+
+
+async def aasegurar(db) -> None:
+    """Versión para handlers async: la construcción (si hace falta) corre en un hilo."""
+    if not _listo:
+        await asyncio.to_thread(asegurar, db)
+
+
+def estado(db) -> dict:
+    """Resumen del estado de la tabla de hechos (para /api/health y /api/admin)."""
+    rows = db.q(f"""
+        SELECT COUNT(*) AS ciclos, COALESCE(SUM(filas),0) AS filas, MAX(actualizado) AS actualizado
+        FROM {ESTADO}
+    """)
+    return rows[0] if rows else {}
+
+
+if __name__ == "__main__":
+    from .db import get_db
+
+    print(refrescar(get_db(), completo="--completo" in sys.argv[1:]))
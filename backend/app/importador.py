@@ -0,0 +1,276 @@
+"""
+Importador paralelo y reanudable de dumps .sql.
+
+  - Cada archivo se envía al cliente `mysql` (respeta DELIMITER, comentarios /*!...*/, etc.)
+    con unique_checks/foreign_key_checks desactivados y un solo COMMIT al final.
+  - Los dumps de esquemas distintos corren en paralelo (IMPORT_WORKERS, default 4);
+    los de un mismo esquema van en orden.
+  - Se guarda el SHA-256 de cada archivo importado con éxito en la tabla
+    cacei.importaciones de la misma base; al re-ejecutar se omiten los que no cambiaron
+    (y cuyo esquema sigue existiendo), así una corrida interrumpida sólo repite lo
+    pendiente y un volumen de MySQL vacío se vuelve a importar completo.
+  - Reporta bytes/s y sentencias/s mientras avanza.
+  - Al terminar aplica las migraciones de índices, refresca la tabla de hechos y
+    vacía la caché de resultados.
+
+Uso:
+    python -m app.importador [--dir DUMPS] [--workers N] [--force] [--sin-refresco]
+docker-compose.yml lo corre al levantar (servicio `importador`) y también
+docker/mysql/import-dumps.sh. Los archivos que empiezan con '_' se ignoran (p.ej. _omit-dump-sys.sql).
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import text
+
+BLOQUE = 1 << 20   # 1 MiB
+
+PREAMBULO = b"SET SESSION unique_checks=0; SET SESSION foreign_key_checks=0; SET autocommit=0;\n"
+EPILOGO = b"\nCOMMIT; SET SESSION unique_checks=1; SET SESSION foreign_key_checks=1;\n"
+
+_RE_DB_CABECERA = re.compile(rb"^--.*Database:\s*(\w+)", re.M)
+_RE_DB_NOMBRE = re.compile(r"^dump-(\w+?)-\d+\.sql$")
+
+
+@dataclass
+class Archivo:
+    ruta: Path
+    schema: str
+    tamano: int
+    sha256: str = ""
+    bytes_enviados: int = 0
+    sentencias: int = 0
+    estado: str = "pendiente"   # pendiente | importando | ok | omitido | error
+    error: str = ""
+    segundos: float = 0.0
+    _t0: float = field(default=0.0, repr=False)
+
+
+def _sha256(ruta: Path) -> str:
+    h = hashlib.sha256()
+    with ruta.open("rb") as f:
+        for bloque in iter(lambda: f.read(BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _schema(ruta: Path) -> str:
+    with ruta.open("rb") as f:
+        m = _RE_DB_CABECERA.search(f.read(4096))
+    if m:
+        return m.group(1).decode()
+    m = _RE_DB_NOMBRE.match(ruta.name)
+    return m.group(1) if m else ruta.stem
+
+
+def _cliente(*args: str) -> list:
+    return [
+        os.getenv("MYSQL_CLIENT", "mysql"),
+        f"-h{os.getenv('DB_HOST', 'localhost')}",
+        f"-P{os.getenv('DB_PORT', '13306')}",
+        f"-u{os.getenv('DB_USER', 'root')}",
+        "--default-character-set=utf8mb4",
+        *args,
+    ]
+
+
+# La contraseña va por entorno (no en la línea de comandos, visible en `ps`)
+_ENV = {**os.environ, "MYSQL_PWD": os.getenv("DB_PASS", "rootpass")}
+
+
+def _crear_schema(schema: str) -> None:
+    subprocess.run(
+        _cliente("-e", f"CREATE DATABASE IF NOT EXISTS `{schema}`"),
+        check=True, capture_output=True, env=_ENV,
+    )
+
+
+def _importar(a: Archivo) -> None:
+    a.estado = "importando"
+    a._t0 = time.perf_counter()
+    try:
+        _crear_schema(a.schema)
+        # stderr a archivo temporal: un PIPE lleno podría bloquear al cliente
+        errores = tempfile.TemporaryFile()
+        proc = subprocess.Popen(
+            _cliente(a.schema), stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL, stderr=errores, env=_ENV,
+        )
+        try:
+            proc.stdin.write(PREAMBULO)
+            with a.ruta.open("rb") as f:
+                for bloque in iter(lambda: f.read(BLOQUE), b""):
+                    proc.stdin.write(bloque)
+                    a.bytes_enviados += len(bloque)
+                    a.sentencias += bloque.count(b";\n")
+            proc.stdin.write(EPILOGO)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass   # el cliente terminó antes (error de SQL); se reporta abajo
+        if proc.wait() != 0:
+            errores.seek(0)
+            err = errores.read().decode(errors="replace").strip()
+            raise RuntimeError(err or f"mysql salió con código {proc.returncode}")
+        a.estado = "ok"
+    except Exception as e:   # se registra por archivo; los demás siguen
+        a.estado = "error"
+        a.error = str(e)
+    finally:
+        a.segundos = round(time.perf_counter() - a._t0, 3)
+
+
+class _Progreso(threading.Thread):
+    def __init__(self, archivos: list, intervalo: float = 2.0, salida=sys.stderr):
+        super().__init__(daemon=True)
+        self.archivos = archivos
+        self.intervalo = intervalo
+        self.salida = salida
+        self._fin = threading.Event()
+        self._t0 = time.perf_counter()
+
+    def linea(self) -> str:
+        dt = max(time.perf_counter() - self._t0, 1e-9)
+        total = sum(a.tamano for a in self.archivos if a.estado != "omitido")
+        enviados = sum(a.bytes_enviados for a in self.archivos)
+        sentencias = sum(a.sentencias for a in self.archivos)
+        activos = [a.ruta.name for a in self.archivos if a.estado == "importando"]
+        pct = 100.0 * enviados / total if total else 100.0
+        return (
+            f"{pct:5.1f}%  {enviados / dt / 1e6:7.2f} MB/s  {sentencias / dt:8.1f} sent/s"
+            f"  activos: {', '.join(activos) or '-'}"
+        )
+
+    def run(self):
+        while not self._fin.wait(self.intervalo):
+            print(self.linea(), file=self.salida, flush=True)
+
+    def detener(self):
+        self._fin.set()
+
+
+def _tabla() -> str:
+    from .hechos import SCHEMA   # import tardío: el importador no necesita el resto al arrancar
+
+    return f"{SCHEMA}.importaciones"
+
+
+def _cargar_estado(db) -> tuple:
+    """
+    ({archivo: sha256} de los dumps ya importados, esquemas existentes). El estado vive
+    en la misma base que los datos: si se borra el volumen de MySQL se borra con ellos.
+    """
+    from .hechos import SCHEMA
+
+    with db.engine.begin() as conn:
+        conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {SCHEMA}"))
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {_tabla()} (
+              archivo     VARCHAR(255) NOT NULL PRIMARY KEY,
+              sha256      CHAR(64)     NOT NULL,
+              schema_     VARCHAR(64)  NOT NULL,
+              segundos    DOUBLE       NOT NULL,
+              importado   DATETIME(6)  NOT NULL
+            )
+        """))
+        estado = {r.archivo: r.sha256 for r in conn.execute(text(f"SELECT archivo, sha256 FROM {_tabla()}"))}
+        schemas = {
+            r.s.lower() for r in conn.execute(text("SELECT SCHEMA_NAME AS s FROM information_schema.schemata"))
+        }
+    return estado, schemas
+
+
+def _anotar(db, a: Archivo) -> None:
+    with db.engine.begin() as conn:
+        conn.execute(text(f"""
+            INSERT INTO {_tabla()} (archivo, sha256, schema_, segundos, importado)
+            VALUES (:archivo, :sha256, :schema, :segundos, UTC_TIMESTAMP(6))
+            ON DUPLICATE KEY UPDATE sha256 = VALUES(sha256), schema_ = VALUES(schema_),
+              segundos = VALUES(segundos), importado = VALUES(importado)
+        """), {"archivo": a.ruta.name, "sha256": a.sha256, "schema": a.schema, "segundos": a.segundos})
+
+
+def importar(directorio: str, workers: int = 4, forzar: bool = False, refrescar: bool = True) -> dict:
+    from .db import get_db
+
+    base = Path(directorio)
+    db = get_db()
+    estado, schemas = _cargar_estado(db)
+
+    archivos = [
+        Archivo(ruta=p, schema=_schema(p), tamano=p.stat().st_size)
+        for p in sorted(base.glob("*.sql"))
+        if not p.name.startswith("_")
+    ]
+    for a in archivos:
+        a.sha256 = _sha256(a.ruta)
+        if not forzar and estado.get(a.ruta.name) == a.sha256 and a.schema.lower() in schemas:
+            a.estado = "omitido"
+
+    por_schema: dict = {}
+    for a in archivos:
+        if a.estado == "pendiente":
+            por_schema.setdefault(a.schema, []).append(a)
+
+    def _tarea(lista):
+        for a in lista:
+            _importar(a)
+            if a.estado == "ok":
+                _anotar(db, a)   # se persiste en cuanto termina cada archivo (reanudable)
+
+    progreso = _Progreso(archivos)
+    progreso.start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(_tarea, por_schema.values()))
+    progreso.detener()
+
+    resumen = {
+        "segundos": round(time.perf_counter() - t0, 3),
+        "progreso": progreso.linea(),
+        "archivos": [
+            {k: getattr(a, k) for k in ("schema", "estado", "tamano", "sentencias", "segundos", "error")}
+            | {"archivo": a.ruta.name}
+            for a in archivos
+        ],
+    }
+    importados = any(a.estado == "ok" for a in archivos)
+    if refrescar and importados:
+        resumen["derivados"] = refrescar_derivados()
+    return resumen
+
+
+def refrescar_derivados() -> dict:
+    """Índices -> tabla de hechos -> caché, en ese orden (los índices aceleran el refresco)."""
+    from . import hechos, indices
+    from .cache import resultados
+    from .db import get_db
+
+    db = get_db()
+    return {
+        "indices": indices.aplicar(db),
+        "hechos": hechos.refrescar(db),
+        "cache_invalidated": resultados.invalidate(),
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Importa dumps .sql en paralelo")
+    ap.add_argument("--dir", default=os.getenv("DUMPS_DIR", "../docker/mysql/dumps"))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("IMPORT_WORKERS", "4")))
+    ap.add_argument("--force", action="store_true", help="reimporta aunque el checksum no cambie")
+    ap.add_argument("--sin-refresco", action="store_true", help="no refresca índices/hechos al terminar")
+    args = ap.parse_args()
+    r = importar(args.dir, workers=args.workers, forzar=args.force, refrescar=not args.sin_refresco)
+    print(json.dumps(r, indent=2, ensure_ascii=False, default=str))
+    sys.exit(1 if any(a["estado"] == "error" for a in r["archivos"]) else 0)
@@ -0,0 +1,237 @@
+"""
+Asesor de índices y migraciones DDL para las tablas que consultan los KPI.
+
+  - explicar(): ejecuta cada endpoint registrado en modo captura (db.capturar) para
+    obtener su SQL real, corre EXPLAIN FORMAT=JSON y reporta full scans
+    (access_type=ALL), filesorts y tablas temporales.
+  - aplicar(): aplica en orden las MIGRACIONES versionadas. Cada paso revisa
+    information_schema antes de actuar, así que es idempotente y puede correrse
+    después de cada importación (los dumps recrean las tablas sin estos índices).
+
+Uso desde consola:
+    python -m app.indices --aplicar
+    python -m app.indices --explain [PROGRAMA]
+"""
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from .db import capturar
+from .hechos import SCHEMA
+
+MIGRACIONES_TABLA = f"{SCHEMA}.migraciones_indices"
+
+# Tipos que MySQL sólo puede indexar con prefijo
+_TIPOS_PREFIJO = {"tinytext", "text", "mediumtext", "longtext", "tinyblob", "blob", "mediumblob", "longblob"}
+PREFIJO = 64
+
+
+@dataclass(frozen=True)
+class Indice:
+    schema: str
+    tabla: str
+    nombre: str
+    columnas: tuple
+
+
+@dataclass(frozen=True)
+class Generada:
+    """Columna generada STORED (se puede indexar y no se recalcula al leer)."""
+    schema: str
+    tabla: str
+    columna: str
+    tipo: str
+    expresion: str
+
+
+MIGRACIONES = [
+    (1, "Índices de join/agrupación en tablas fuente", [
+        Indice("estadistica", "boletas", "ix_boletas_matricula", ("matricula",)),
+        Indice("estadistica", "boletas", "ix_boletas_ciclo", ("ciclo",)),
+        Indice("estadistica", "boletas", "ix_boletas_mat_clave_ciclo", ("matricula", "clave", "ciclo")),
+        Indice("ingenieria", "alumnos", "ix_alumnos_matricula", ("matricula",)),
+        Indice("ingenieria", "alumnos", "ix_alumnos_ciclo_ingreso", ("ciclo_ingreso",)),
+        Indice("ingenieria", "materias", "ix_materias_clave", ("clave",)),
+    ]),
+    (2, "Programa normalizado como columna generada indexada", [
+        Generada("ingenieria", "alumnos", "programa_norm", "VARCHAR(255)",
+                 "UPPER(COALESCE(NULLIF(TRIM(desc_programa),''), ''))"),
+        Indice("ingenieria", "alumnos", "ix_alumnos_programa_norm", ("programa_norm", "ciclo_ingreso")),
+        Generada("estadistica", "boletas", "carrera_norm", "VARCHAR(255)",
+                 "UPPER(COALESCE(TRIM(carrera), ''))"),
+        Indice("estadistica", "boletas", "ix_boletas_carrera_norm", ("carrera_norm", "matricula")),
+    ]),
+]
+
+
+# --- Introspección -------------------------------------------------------------
+def _columnas(conn, schema: str, tabla: str) -> dict:
+    rows = conn.execute(text("""
+        SELECT COLUMN_NAME AS c, DATA_TYPE AS t
+        FROM information_schema.columns
+        WHERE table_schema = :s AND table_name = :t
+    """), {"s": schema, "t": tabla})
+    return {r.c.lower(): r.t.lower() for r in rows}
+
+
+def _indices(conn, schema: str, tabla: str) -> dict:
+    rows = conn.execute(text("""
+        SELECT INDEX_NAME AS i, COLUMN_NAME AS c
+        FROM information_schema.statistics
+        WHERE table_schema = :s AND table_name = :t
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """), {"s": schema, "t": tabla})
+    out: dict = {}
+    for r in rows:
+        out.setdefault(r.i.lower(), []).append((r.c or "").lower())
+    return out
+
+
+def _paso(conn, paso) -> str:
+    cols = _columnas(conn, paso.schema, paso.tabla)
+    if not cols:
+        return "omitido: no existe la tabla"
+
+    if isinstance(paso, Generada):
+        if paso.columna.lower() in cols:
+            return "ya existe"
+        conn.execute(text(
+            f"ALTER TABLE {paso.schema}.{paso.tabla} "
+            f"ADD COLUMN {paso.columna} {paso.tipo} AS ({paso.expresion}) STORED"
+        ))
+        return "aplicado"
+
+    faltan = [c for c in paso.columnas if c.lower() not in cols]
+    if faltan:
+        return f"omitido: faltan columnas {faltan}"
+    existentes = _indices(conn, paso.schema, paso.tabla)
+    buscadas = [c.lower() for c in paso.columnas]
+    if paso.nombre.lower() in existentes or any(
+        cs[:len(buscadas)] == buscadas for cs in existentes.values()
+    ):
+        return "ya existe"
+    partes = [
+        f"{c}({PREFIJO})" if cols[c.lower()] in _TIPOS_PREFIJO else c
+        for c in paso.columnas
+    ]
+    conn.execute(text(
+        f"ALTER TABLE {paso.schema}.{paso.tabla} ADD INDEX {paso.nombre} ({', '.join(partes)})"
+    ))
+    return "aplicado"
+
+
+def aplicar(db) -> dict:
+    """Aplica todas las migraciones pendientes; devuelve el resultado de cada paso."""
+    resultado = []
+    with db.engine.begin() as conn:
+        conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {SCHEMA}"))
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {MIGRACIONES_TABLA} (
+              version     INT NOT NULL PRIMARY KEY,
+              descripcion VARCHAR(255) NOT NULL,
+              aplicado    DATETIME NOT NULL
+            )
+        """))
+    for version, descripcion, pasos in MIGRACIONES:
+        # Cada ALTER hace commit implícito en MySQL; una conexión por versión basta.
+        with db.engine.begin() as conn:
+            for paso in pasos:
+                nombre = getattr(paso, "nombre", None) or paso.columna
+                resultado.append({
+                    "version": version,
+                    "objeto": f"{paso.schema}.{paso.tabla}.{nombre}",
+                    "estado": _paso(conn, paso),
+                })
+            conn.execute(text(f"""
+                REPLACE INTO {MIGRACIONES_TABLA} (version, descripcion, aplicado)
+                VALUES (:v, :d, NOW())
+            """), {"v": version, "d": descripcion})
+    return {"pasos": resultado}
+
+
+# --- EXPLAIN -------------------------------------------------------------------
+def _endpoints(programa_like: str, cohorte: str | None):
+    from .routers import stats
+
+    # llamados directo (sin FastAPI): los parámetros con Query(...) van explícitos
+    comunes = {"programa_like": programa_like, "programas_": None}
+    return [
+        ("meta_programas", stats.meta_programas, {}),
+        ("inscritos_por_ciclo", stats.inscritos_por_ciclo, {**comunes, "motor": "sql"}),
+        ("indice_reprobacion", stats.indice_reprobacion, {**comunes, "motor": "sql"}),
+        ("desercion", stats.desercion, comunes),
+        ("seguimiento_cohorte", stats.seguimiento_cohorte, {**comunes, "ciclo_ingreso": cohorte or ""}),
+        ("cedula_322", stats.cedula_322, comunes),
+        ("reprobacion_detalle", stats.reprobacion_detalle, {**comunes, "motor": "sql"}),
+        ("desercion_escolar", stats.desercion_escolar, comunes),
+        ("meta_cohortes", stats.meta_cohortes, comunes),
+        ("seguimiento_cohorte_resumen", stats.seguimiento_cohorte_resumen, comunes),
+        ("cohortes_matriz", stats.cohortes_matriz, {**comunes, "cohorte": None}),
+        ("cedula_322_detalle", stats.cedula_322_detalle, {**comunes, "motor": "sql"}),
+        ("dashboard", stats.dashboard, {"programa_like": programa_like}),
+    ]
+
+
+def _hallazgos(plan) -> list:
+    """Recorre el plan JSON y junta full scans, filesorts y tablas temporales."""
+    out = []
+
+    def walk(nodo):
+        if isinstance(nodo, dict):
+            if "table_name" in nodo and nodo.get("access_type") == "ALL":
+                out.append({
+                    "tipo": "full_scan",
+                    "tabla": nodo["table_name"],
+                    "filas": nodo.get("rows_examined_per_scan"),
+                    "posibles_indices": nodo.get("possible_keys"),
+                })
+            if nodo.get("using_filesort"):
+                out.append({"tipo": "filesort"})
+            if nodo.get("using_temporary_table"):
+                out.append({"tipo": "temporary_table"})
+            for v in nodo.values():
+                walk(v)
+        elif isinstance(nodo, list):
+            for v in nodo:
+                walk(v)
+
+    walk(plan)
+    return out
+
+
+async def explicar(db, programa_like: str = "AEROESPACIAL", cohorte: str | None = None) -> list:
+    from . import hechos, programas
+
+    await hechos.aasegurar(db)   # fuera del modo captura: construye la tabla si falta
+    await asyncio.to_thread(programas.cargar, db)   # y la dimensión de programas (si no, quedaría vacía)
+    reporte = []
+    for nombre, handler, params in _endpoints(programa_like, cohorte):
+        fn = getattr(handler, "__wrapped__", handler)   # sin pasar por la caché
+        with capturar() as consultas:
+            await fn(**params)
+        for i, (sql, sql_params) in enumerate(consultas):
+            rows = await db.aq("EXPLAIN FORMAT=JSON " + sql.strip().rstrip(";"), **sql_params)
+            plan = json.loads(next(iter(rows[0].values()))) if rows else {}
+            reporte.append({
+                "endpoint": nombre,
+                "consulta": i,
+                "costo": plan.get("query_block", {}).get("cost_info", {}).get("query_cost"),
+                "hallazgos": _hallazgos(plan),
+            })
+    return reporte
+
+
+if __name__ == "__main__":
+    from .db import get_db
+
+    args = sys.argv[1:]
+    db = get_db()
+    if "--aplicar" in args:
+        print(json.dumps(aplicar(db), indent=2, ensure_ascii=False))
+    if "--explain" in args:
+        resto = [a for a in args if not a.startswith("--")]
+        reporte = asyncio.run(explicar(db, *(resto[:1] or ["AEROESPACIAL"])))
+        print(json.dumps(reporte, indent=2, ensure_ascii=False, default=str))
@@ -1,15 +1,36 @@
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .db import DB
-from .routers import stats
+from fastapi.responses import JSONResponse, PlainTextResponse
+from . import admision, metricas, precalculo
+from .compresion import Compresion
+from .condicional import Condicional, rutas_cacheadas
+from .db import get_db
+from .routers import stats, admin, exportacion
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db = get_db()   # único motor/pool del proceso (compartido con los routers)
+    admision.instalar()       # los hilos de DB.stream piden turno por este loop
+    precalculo.iniciar(app.state.db)
+    yield
+    await precalculo.detener()
+    await app.state.db.dispose()
 
-app = FastAPI(title="CACEI MultiDB Stats API", version="0.1.0")
+
+app = FastAPI(title="CACEI MultiDB Stats API", version="0.1.0", lifespan=lifespan)
 
 origins = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
 ]
 
+# El último agregado queda por fuera: CORS → compresión → ETag/304 → cancelación → rutas
+app.add_middleware(admision.CancelarAlDesconectar)
+app.add_middleware(Condicional, rutas=rutas_cacheadas(stats.router, "/api"))
+app.add_middleware(Compresion)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,          # ← lista explícita
@@ -18,6 +39,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-db = DB()  # initialize engine
+@app.exception_handler(admision.Rechazada)
+async def _rechazada(request: Request, exc: admision.Rechazada):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+
+@app.exception_handler(admision.TiempoAgotado)
+async def _tiempo_agotado(request: Request, exc: admision.TiempoAgotado):
+    return JSONResponse({"detail": str(exc)}, status_code=504)
+
 
 app.include_router(stats.router, prefix="/api")
+app.include_router(admin.router, prefix="/api/admin")
+app.include_router(exportacion.router, prefix="/api/export")
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Histogramas de consultas + caché + pool en formato Prometheus."""
+    return PlainTextResponse(metricas.exponer(get_db()), media_type="text/plain; version=0.0.4")
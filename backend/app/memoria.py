@@ -0,0 +1,455 @@
+"""
+Motor en memoria (NumPy) para los KPI que salen de la tabla de hechos.
+
+La tabla de hechos se lee una sola vez, ya reducida al grano
+(programa_id, matrícula, clave, ciclo) con la mejor calificación y el menor semestre,
+y se guarda en arreglos compactos:
+  - códigos enteros para matrícula, clave y ciclo (categorías plegadas como la
+    collation *_ai_ci, igual que en programas.py)
+  - calificación en centésimas int32 (DECIMAL(10,2) exacto; -1 = no numérica)
+  - semestre uint16 (SMALLINT UNSIGNED de la tabla de hechos)
+Con eso la reducción por alumno-materia-ciclo, la detección de escala del umbral y
+los promedios por materia son group-bys vectorizados. Los porcentajes y promedios se
+redondean con la aritmética DECIMAL de MySQL (app/redondeo.py), así que el resultado
+es el mismo que el de la ruta SQL.
+
+Se elige con KPI_MOTOR=sql|memoria (default sql) o por petición con `?motor=`.
+NumPy es opcional: sin él sólo está disponible el motor SQL. La instantánea se
+descarta al refrescar la tabla de hechos y se vuelve a cargar en la siguiente consulta.
+Con COMPARTIDO_DIR (varios workers) se construye una vez por versión de los datos y se
+guarda en disco; cada worker la abre con mmap en vez de tener su propia copia.
+"""
+import asyncio
+import math
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from pathlib import Path
+
+from . import compartido, hechos, version
+from .db import consulta_actual
+from .programas import plegar
+from .redondeo import pct, redondear
+
+MOTORES = ("sql", "memoria")
+MOTOR = os.getenv("KPI_MOTOR", "sql").strip().lower()
+
+SQL_CARGA = f"""
+SELECT h.programa_id, h.matricula, h.clave, h.ciclo, h.ciclo_key,
+       MAX(h.calif_num) AS calif,
+       MIN(COALESCE(h.semestre_n, 0)) AS semestre
+FROM {hechos.HECHOS} h
+GROUP BY h.programa_id, h.matricula, h.clave, h.ciclo_key, h.ciclo
+"""
+
+SQL_MATERIAS = "SELECT clave, materia FROM ingenieria.materias WHERE clave IS NOT NULL"
+
+# arreglos de la instantánea que van a disco (.npy) con COMPARTIDO_DIR
+ARREGLOS = ("prog", "mat", "cla", "cic", "cal", "sem", "rango_ciclo", "clave_ciclo")
+
+_lock = threading.Lock()
+_actual = None
+
+
+def disponible() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def elegir(motor: str | None) -> str:
+    """Motor a usar en una petición (el parámetro manda sobre KPI_MOTOR)."""
+    m = (motor or MOTOR).strip().lower()
+    if m not in MOTORES:
+        raise ValueError(f"motor debe ser uno de: {', '.join(MOTORES)}")
+    if m == "memoria" and not disponible():
+        raise ValueError("el motor 'memoria' requiere numpy")
+    return m
+
+
+class _Codigos:
+    """Asigna un código entero por valor plegado; conserva el primer valor visto."""
+
+    def __init__(self):
+        self.indice: dict = {}
+        self.valores: list = []
+
+    def codigo(self, v) -> int:
+        k = None if v is None else plegar(v)
+        c = self.indice.get(k)
+        if c is None:
+            c = self.indice[k] = len(self.valores)
+            self.valores.append(v)
+        return c
+
+    def buscar(self, v) -> int:
+        return self.indice.get(plegar(v), -1)
+
+
+def _umbral(max_cent: int, aprobatoria: float) -> Decimal:
+    """CTE `params`: normaliza `aprobatoria` a la escala detectada (MAX de calificaciones)."""
+    a = Decimal(repr(float(aprobatoria)))   # pymysql envía el float como literal DECIMAL
+    max_val = Decimal(max_cent).scaleb(-2)
+    if max_val <= 1:
+        return a / 100 if a > 1 else a
+    if max_val <= 10:
+        return a / 10 if a > 10 else a
+    return a
+
+
+def _orden_texto(v) -> tuple:
+    return (0, "") if v is None else (1, plegar(v))
+
+
+class Instantanea:
+    def __init__(self, db):
+        import numpy as np
+
+        self.np = np
+        t0 = time.perf_counter()
+        self.matriculas, self.claves, self.ciclos = _Codigos(), _Codigos(), _Codigos()
+        prog, mat, cla, cic, cal, sem = [], [], [], [], [], []
+        claves_ciclo: dict = {}
+        # carga interna: no ocupa el carril ni el presupuesto del endpoint que la disparó
+        token = consulta_actual.set("sin_endpoint")
+        try:
+            for r in db.stream(SQL_CARGA):
+                c = self.ciclos.codigo(r["ciclo"])
+                claves_ciclo[c] = r["ciclo_key"]
+                prog.append(r["programa_id"])
+                mat.append(self.matriculas.codigo(r["matricula"]))
+                cla.append(self.claves.codigo(r["clave"]))
+                cic.append(c)
+                cal.append(-1 if r["calif"] is None else int(r["calif"] * 100))
+                sem.append(r["semestre"])
+        finally:
+            consulta_actual.reset(token)
+
+        self.prog = np.array(prog, dtype=np.int32)
+        self.mat = np.array(mat, dtype=np.int32)
+        self.cla = np.array(cla, dtype=np.int32)
+        self.cic = np.array(cic, dtype=np.int32)
+        self.cal = np.array(cal, dtype=np.int32)
+        self.sem = np.array(sem, dtype=np.uint16)
+
+        # Rango de cada ciclo en el ORDER BY ciclo_key, ciclo (NULL primero)
+        orden = sorted(
+            range(len(self.ciclos.valores)),
+            key=lambda c: (claves_ciclo[c], _orden_texto(self.ciclos.valores[c])),
+        )
+        self.rango_ciclo = np.empty(len(orden), dtype=np.int32)
+        self.rango_ciclo[orden] = np.arange(len(orden), dtype=np.int32)
+        # ciclo_key de cada código de ciclo (filtros desde/hasta)
+        self.clave_ciclo = np.array(
+            [claves_ciclo[c] for c in range(len(self.ciclos.valores))], dtype=np.int64
+        )
+
+        # LEFT JOIN ingenieria.materias: una clave puede tener varias filas
+        self.materias: dict = {}
+        for r in db.q(SQL_MATERIAS):
+            self.materias.setdefault(plegar(r["clave"]), []).append(r["materia"])
+
+        self.filas = len(self.prog)
+        self.segundos = round(time.perf_counter() - t0, 3)
+        self.archivo = None
+
+    # --- Instantánea compartida (COMPARTIDO_DIR) ----------------------------------
+    def guardar(self, ruta: Path) -> None:
+        ruta.mkdir(parents=True)
+        for nombre in ARREGLOS:
+            self.np.save(ruta / f"{nombre}.npy", getattr(self, nombre))
+        with open(ruta / "codigos.pickle", "wb") as f:
+            pickle.dump(
+                {
+                    "matriculas": self.matriculas,
+                    "claves": self.claves,
+                    "ciclos": self.ciclos,
+                    "materias": self.materias,
+                    "segundos": self.segundos,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def abrir(cls, ruta: Path) -> "Instantanea":
+        """Arreglos con mmap (solo lectura): las páginas las comparten todos los workers."""
+        import numpy as np
+
+        inst = cls.__new__(cls)
+        inst.np = np
+        for nombre in ARREGLOS:
+            setattr(inst, nombre, np.load(ruta / f"{nombre}.npy", mmap_mode="r"))
+        with open(ruta / "codigos.pickle", "rb") as f:
+            meta = pickle.load(f)
+        inst.matriculas, inst.claves, inst.ciclos = meta["matriculas"], meta["claves"], meta["ciclos"]
+        inst.materias = meta["materias"]
+        inst.segundos = meta["segundos"]
+        inst.filas = len(inst.prog)
+        inst.archivo = str(ruta)
+        return inst
+
+    # --- Reducciones comunes ----------------------------------------------------
+    def _filas(self, ids: list, rango=None):
+        """Máscara de filas de los programas pedidos (y del rango de ciclos, si viene)."""
+        np = self.np
+        m = np.isin(self.prog, np.asarray(ids, dtype=np.int32))
+        if rango is not None:
+            clave = self.clave_ciclo[self.cic]
+            m &= (clave >= rango.desde) & (clave <= rango.hasta)
+        return m
+
+    def _final(self, ids: list, ciclo: str | None = None, rango=None):
+        """
+        final_alumno_materia: mejor calificación y menor semestre por
+        (matrícula, clave, ciclo) dentro de los programas pedidos.
+        """
+        np = self.np
+        m = self._filas(ids, rango)
+        if ciclo:
+            m &= self.cic == self.ciclos.buscar(ciclo)
+        mat, cla, cic, cal, sem = self.mat[m], self.cla[m], self.cic[m], self.cal[m], self.sem[m]
+        if len(ids) > 1 and len(mat):
+            # un mismo alumno-materia-ciclo puede venir de varios programa_id
+            nc, nk = len(self.ciclos.valores), len(self.claves.valores)
+            k = (mat.astype(np.int64) * nk + cla) * nc + cic
+            u, inv = np.unique(k, return_inverse=True)
+            cal2 = np.full(len(u), -1, dtype=np.int32)
+            np.maximum.at(cal2, inv, cal)
+            sem2 = np.full(len(u), np.iinfo(np.uint16).max, dtype=np.uint16)
+            np.minimum.at(sem2, inv, sem)
+            cic = (u % nc).astype(np.int32)
+            cla = (u // nc % nk).astype(np.int32)
+            mat = (u // nc // nk).astype(np.int32)
+            cal, sem = cal2, sem2
+        return mat, cla, cic, cal, sem
+
+    def _escala(self, ids: list, ciclo: str | None = None) -> int:
+        """
+        CTE `escala`: MAX de calificaciones (centésimas) de los programas (y el ciclo)
+        pedidos, sin el rango desde/hasta, que sólo acota los ciclos del resultado.
+        """
+        m = self._filas(ids)
+        if ciclo:
+            m &= self.cic == self.ciclos.buscar(ciclo)
+        return max(int(self.cal[m].max(initial=-1)), 0)
+
+    def _ciclos_ordenados(self, cic) -> list:
+        presentes = self.np.unique(cic)
+        return sorted(presentes.tolist(), key=lambda c: self.rango_ciclo[c])
+
+    def _grupos_clave_ciclo(self, cla, cic):
+        np = self.np
+        nc = len(self.ciclos.valores)
+        u, inv = np.unique(cla.astype(np.int64) * nc + cic, return_inverse=True)
+        return (u // nc).astype(np.int32), (u % nc).astype(np.int32), inv
+
+    # --- KPI --------------------------------------------------------------------
+    def inscritos_por_ciclo(self, ids: list, rango=None) -> list:
+        np = self.np
+        m = self._filas(ids, rango)
+        mat, cic = self.mat[m], self.cic[m]
+        nulo = self.matriculas.indice.get(None, -1)
+        nm = len(self.matriculas.valores)
+        pares = np.unique(cic[mat != nulo].astype(np.int64) * nm + mat[mat != nulo])
+        inscritos = np.bincount((pares // nm).astype(np.int64), minlength=len(self.ciclos.valores))
+        return [
+            {"ciclo": self.ciclos.valores[c], "inscritos": int(inscritos[c])}
+            for c in self._ciclos_ordenados(cic)
+        ]
+
+    def indice_reprobacion(self, ids: list, aprobatoria: float, contar_no_numericas: bool, rango=None) -> list:
+        np = self.np
+        _, _, cic, cal, _ = self._final(ids, rango=rango)
+        umbral = _umbral(self._escala(ids), aprobatoria)
+        limite = math.ceil(umbral * 100)   # calif < umbral  <=>  centésimas < ceil(umbral*100)
+        evaluada = cal >= 0
+        reprobada = (evaluada & (cal < limite)) | (~evaluada & bool(contar_no_numericas))
+        n = len(self.ciclos.valores)
+        evaluadas = np.bincount(cic[evaluada], minlength=n)
+        reprobados = np.bincount(cic[reprobada], minlength=n)
+        return [
+            {
+                "ciclo": self.ciclos.valores[c],
+                "evaluadas": int(evaluadas[c]),
+                "reprobados": int(reprobados[c]),
+                "porcentaje_reprobacion": pct(int(reprobados[c]), int(evaluadas[c]), 2),
+                "umbral_usado": umbral,
+            }
+            for c in self._ciclos_ordenados(cic)
+        ]
+
+    def reprobacion_detalle(self, ids: list, aprobatoria: float, ciclo: str | None, rango=None) -> list:
+        np = self.np
+        _, cla, cic, cal, sem = self._final(ids, ciclo, rango)
+        umbral = _umbral(self._escala(ids, ciclo), aprobatoria)
+        limite = math.ceil(umbral * 100)
+        g_cla, g_cic, inv = self._grupos_clave_ciclo(cla, cic)
+        alumnos = np.bincount(inv, minlength=len(g_cla))
+        reprobados = np.bincount(inv[(cal >= 0) & (cal < limite)], minlength=len(g_cla))
+        semestre = np.full(len(g_cla), np.iinfo(np.uint16).max, dtype=np.uint16)
+        np.minimum.at(semestre, inv, sem)
+
+        filas = []
+        for i in range(len(g_cla)):
+            clave = self.claves.valores[g_cla[i]]
+            porcentaje = pct(int(reprobados[i]), int(alumnos[i]), 1)
+            nombres = self.materias.get(plegar(clave), [None]) if clave is not None else [None]
+            for nombre in nombres:
+                nombre = (nombre or "").strip(" ")
+                filas.append((
+                    (self.rango_ciclo[g_cic[i]], -porcentaje, _orden_texto(clave)),
+                    {
+                        "Clave": clave,
+                        "Nombre de la Materia": nombre or "(SIN NOMBRE)",
+                        "Ciclo": self.ciclos.valores[g_cic[i]],
+                        "Semestre": int(semestre[i]),
+                        "No. Alumnos": int(alumnos[i]),
+                        "No. Reprobados": int(reprobados[i]),
+                        "Porcentaje": porcentaje,
+                        "umbral_usado": umbral,
+                    },
+                ))
+        filas.sort(key=lambda f: f[0])
+        return [f for _, f in filas]
+
+    def cedula_322_detalle(self, ids: list, ciclo: str | None, rango=None) -> list:
+        np = self.np
+        _, cla, cic, cal, sem = self._final(ids, ciclo, rango)
+        # JOIN stats ON s.clave = f.clave AND s.ciclo = f.ciclo descarta clave/ciclo NULL
+        validas = np.ones(len(cla), dtype=bool)
+        for codigos, arr in ((self.claves, cla), (self.ciclos, cic)):
+            nulo = codigos.indice.get(None)
+            if nulo is not None:
+                validas &= arr != nulo
+        cla, cic, cal, sem = cla[validas], cic[validas], cal[validas], sem[validas]
+
+        g_cla, g_cic, inv = self._grupos_clave_ciclo(cla, cic)
+        ng = len(g_cla)
+        evaluada = cal >= 0
+        inscritos = np.bincount(inv, minlength=ng)
+        n_eval = np.bincount(inv[evaluada], minlength=ng).astype(np.int64)
+        suma = np.bincount(inv[evaluada], weights=cal[evaluada], minlength=ng).astype(np.int64)
+        # AVG(DECIMAL(10,2)) tiene escala 6: promedio en millonésimas, redondeo half-up
+        promedio_u = np.where(n_eval > 0, (2 * suma * 10_000 + n_eval) // np.maximum(2 * n_eval, 1), 0)
+        arriba = np.bincount(
+            inv[evaluada & (cal.astype(np.int64) * 10_000 >= promedio_u[inv])], minlength=ng
+        )
+        semestre = np.full(ng, np.iinfo(np.uint16).max, dtype=np.uint16)
+        np.minimum.at(semestre, inv, sem)
+
+        filas = []
+        for i in range(ng):
+            clave = self.claves.valores[g_cla[i]]
+            promedio = (
+                redondear(Decimal(int(promedio_u[i])).scaleb(-6), 1) if n_eval[i] else None
+            )
+            # GROUP BY ..., `Materia`: filas repetidas de materias con el mismo nombre se suman
+            nombres = Counter()
+            primero: dict = {}
+            for nombre in self.materias.get(plegar(clave), [None]):
+                k = None if nombre is None else plegar(nombre)
+                primero.setdefault(k, nombre)
+                nombres[k] += 1
+            for k, veces in nombres.items():
+                n_arriba = int(arriba[i]) * veces
+                porcentaje = pct(n_arriba, int(inscritos[i]), 1)
+                filas.append((
+                    (self.rango_ciclo[g_cic[i]], -porcentaje, -int(inscritos[i])),
+                    {
+                        "Clave": clave,
+                        "Materia": "(SIN NOMBRE)" if primero[k] is None else primero[k],
+                        "Ciclo": self.ciclos.valores[g_cic[i]],
+                        "Semestre": int(semestre[i]),
+                        "No. Inscritos": int(inscritos[i]),
+                        "Promedio": promedio,
+                        "Arriba del promedio": n_arriba,
+                        "Porcentaje": porcentaje,
+                    },
+                ))
+        filas.sort(key=lambda f: f[0])
+        return [f for _, f in filas]
+
+
+def invalidar() -> None:
+    """Se llama al refrescar la tabla de hechos."""
+    global _actual
+    with _lock:
+        _actual = None
+
+
+CONSERVAR = 2   # versiones de la instantánea que quedan en disco (la vigente y la anterior)
+
+
+def _numero(ruta: Path) -> int:
+    try:
+        return int(ruta.name.removeprefix("memoria-v"))
+    except ValueError:
+        return -1   # temporal (memoria-vN.pid.tmp)
+
+
+def _compartida(db, numero: int) -> Instantanea:
+    """
+    Instantánea de la versión `numero` de los datos en COMPARTIDO_DIR: el primer worker
+    que la pide la construye (los demás esperan el candado) y todos la abren con mmap.
+    """
+    ruta = compartido.ruta(f"memoria-v{numero}")
+    if not ruta.exists():
+        with compartido.candado("memoria"):
+            if not ruta.exists():
+                temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+                shutil.rmtree(temporal, ignore_errors=True)
+                Instantanea(db).guardar(temporal)
+                os.rename(temporal, ruta)
+                # con el candado tomado, los temporales son de constructores que murieron;
+                # de las versiones se conservan las CONSERVAR más nuevas, porque otro worker
+                # puede estar abriendo la anterior (quien ya la tiene abierta conserva su mmap)
+                viejas = sorted(ruta.parent.glob("memoria-v*"), key=_numero, reverse=True)
+                for vieja in viejas[CONSERVAR:]:
+                    shutil.rmtree(vieja, ignore_errors=True)
+    return Instantanea.abrir(ruta)
+
+
+def cargar(db) -> Instantanea:
+    global _actual
+    for intento in range(2):
+        inst = _actual
+        if inst is not None:
+            return inst
+        # la versión se lee fuera de _lock: si cambió, version llama a invalidar(), que
+        # también toma _lock
+        numero = version.actual(db).numero if compartido.activo() else None
+        try:
+            with _lock:
+                if _actual is None:
+                    _actual = Instantanea(db) if numero is None else _compartida(db, numero)
+                return _actual
+        except FileNotFoundError:
+            # otro worker ya construyó dos versiones más nuevas y borró ésta
+            if intento:
+                raise
+            version.releer()
+
+
+async def acargar(db) -> Instantanea:
+    if _actual is None:
+        return await asyncio.to_thread(cargar, db)
+    return _actual
+
+
+def estado() -> dict:
+    inst = _actual
+    return {
+        "motor_default": MOTOR,
+        "numpy": disponible(),
+        "cargado": inst is not None,
+        "filas": inst.filas if inst else None,
+        "segundos_carga": inst.segundos if inst else None,
+        "archivo": inst.archivo if inst else None,
+    }
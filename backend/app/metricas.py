@@ -0,0 +1,120 @@
+"""
+Métricas de consultas en formato de exposición de Prometheus (text/plain 0.0.4).
+
+DB.q / DB.aq / DB.stream registran, por nombre de consulta (el endpoint que la
+originó, ver db.consulta_actual):
+  - cacei_db_execute_seconds   ejecución en MySQL
+  - cacei_db_fetch_seconds     lectura de filas del cursor
+  - cacei_db_convert_seconds   conversión a dicts (el paso dict(zip(...)))
+  - cacei_db_rows              filas devueltas
+Sin dependencias externas: son pocos histogramas y se exponen en /metrics.
+"""
+import bisect
+import threading
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_FILAS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, buckets: tuple, etiqueta: str = "consulta"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.etiqueta = etiqueta
+        self._series: dict = {}   # valor_etiqueta -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor_etiqueta: str, valor: float) -> None:
+        i = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            s = self._series.get(valor_etiqueta)
+            if s is None:
+                s = self._series[valor_etiqueta] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += valor
+            s[-1] += 1
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for etq, s in sorted(series.items()):
+            lbl = f'{self.etiqueta}="{_escapar(etq)}"'
+            acumulado = 0
+            for b, n in zip(self.buckets, s):
+                acumulado += n
+                lineas.append(f'{self.nombre}_bucket{{{lbl},le="{b}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{lbl},le="+Inf"}} {s[-1]}')
+            lineas.append(f"{self.nombre}_sum{{{lbl}}} {s[-2]}")
+            lineas.append(f"{self.nombre}_count{{{lbl}}} {s[-1]}")
+        return lineas
+
+
+def _escapar(v: str) -> str:
+    return v.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+EJECUCION = Histograma("cacei_db_execute_seconds", "Tiempo de ejecucion de la consulta en MySQL", BUCKETS_SEGUNDOS)
+LECTURA = Histograma("cacei_db_fetch_seconds", "Tiempo leyendo filas del cursor", BUCKETS_SEGUNDOS)
+CONVERSION = Histograma("cacei_db_convert_seconds", "Tiempo convirtiendo filas a dict", BUCKETS_SEGUNDOS)
+FILAS = Histograma("cacei_db_rows", "Filas devueltas por consulta", BUCKETS_FILAS)
+
+HISTOGRAMAS = [EJECUCION, LECTURA, CONVERSION, FILAS]
+
+
+def registrar_consulta(nombre: str, ejecucion: float, lectura: float, conversion: float, filas: int) -> None:
+    EJECUCION.observar(nombre, ejecucion)
+    LECTURA.observar(nombre, lectura)
+    CONVERSION.observar(nombre, conversion)
+    FILAS.observar(nombre, filas)
+
+
+def _gauges(nombre: str, ayuda: str, valores: dict, etiqueta: str) -> list:
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge"]
+    for k, v in valores.items():
+        if v is not None:
+            lineas.append(f'{nombre}{{{etiqueta}="{_escapar(str(k))}"}} {v}')
+    return lineas
+
+
+def exponer(db=None) -> str:
+    """Texto completo para /metrics (histogramas + estado de caché y pool)."""
+    from .cache import resultados, vuelos
+
+    lineas = []
+    for h in HISTOGRAMAS:
+        lineas += h.exponer()
+    c = resultados.stats()
+    lineas += _gauges(
+        "cacei_cache", "Estado de la cache de resultados",
+        {k: c[k] for k in ("entries", "hits", "misses", "evictions", "invalidations")}, "campo",
+    )
+    v = vuelos.stats()
+    lineas += _gauges(
+        "cacei_coalescencia", "Ejecuciones KPI compartidas entre peticiones concurrentes",
+        {k: v[k] for k in ("en_vuelo", "ejecuciones", "coalescidas")}, "campo",
+    )
+    lineas += _gauges(
+        "cacei_coalescidas", "Peticiones que esperaron una ejecución en curso, por endpoint",
+        v["por_endpoint"], "endpoint",
+    )
+    from . import admision
+
+    for nombre, carril in admision.CARRILES.items():
+        lineas += _gauges(
+            f"cacei_admision_{nombre}", f"Carril de admisión ({nombre})",
+            carril.stats(), "campo",
+        )
+    lineas += _gauges(
+        "cacei_admision_canceladas", "Consultas canceladas (tiempo, desconexión) y KILL QUERY enviados",
+        admision.canceladas, "motivo",
+    )
+    if db is not None:
+        for motor, p in db.pool_stats().items():
+            lineas += _gauges(
+                f"cacei_db_pool_{motor}", f"Pool de conexiones ({motor})",
+                {k: p[k] for k in ("size", "checked_out", "overflow", "checkouts", "wait_max_ms")}, "campo",
+            )
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,195 @@
+"""
+Precálculo en segundo plano de los KPI más pedidos.
+
+Al arrancar (y cada vez que cambia la versión de los datos, ver app/version.py) se
+llena la caché de resultados con cada programa de /meta/programas × los endpoints de
+PRECALCULO_ENDPOINTS, con los parámetros por default del handler (p.ej. aprobatoria=6).
+La caché se indexa por el texto de `programa_like`, así que además de los nombres
+completos se precalcula el `programa_like` por default de cada handler (el mismo con el
+que abre el frontend, "AEROESPACIAL") y los de PRECALCULO_PROGRAMAS.
+Las llamadas pasan por @cacheado igual que una petición: una petición que llega a mitad
+de una ronda se une a la ejecución en curso (single-flight) en vez de repetirla.
+
+  - PRECALCULO (default 1; 0 lo desactiva)
+  - PRECALCULO_ENDPOINTS: nombres de handler separados por coma
+  - PRECALCULO_PROGRAMAS: patrones `programa_like` adicionales separados por coma
+  - PRECALCULO_CONCURRENCIA (default 2): consultas a la vez, para no acaparar el pool
+  - PRECALCULO_INTERVALO (default 30 s): cada cuánto se revisa la versión de los datos
+    aunque no lleguen peticiones (refrescos hechos por otro proceso)
+
+Con varios workers (COMPARTIDO_DIR) sólo uno corre las rondas: la caché que llena es
+la compartida. El avance de la ronda en curso y la duración de la última aparecen en
+/api/health.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import time
+
+from pydantic.fields import FieldInfo
+
+from . import compartido, version
+from .db import consulta_actual
+
+ACTIVO = os.getenv("PRECALCULO", "1") == "1"
+ENDPOINTS = [
+    e.strip()
+    for e in os.getenv(
+        "PRECALCULO_ENDPOINTS",
+        "dashboard,inscritos_por_ciclo,indice_reprobacion,desercion,desercion_escolar,"
+        "meta_cohortes,seguimiento_cohorte_resumen,reprobacion_detalle",
+    ).split(",")
+    if e.strip()
+]
+PROGRAMAS = [p.strip() for p in os.getenv("PRECALCULO_PROGRAMAS", "").split(",") if p.strip()]
+CONCURRENCIA = int(os.getenv("PRECALCULO_CONCURRENCIA", "2"))
+INTERVALO = float(os.getenv("PRECALCULO_INTERVALO", "30"))
+
+log = logging.getLogger("app.precalculo")
+
+_loop: asyncio.AbstractEventLoop | None = None
+_pendiente: asyncio.Event | None = None
+_tarea: asyncio.Task | None = None
+_ronda: dict | None = None     # ronda en curso
+_ultima: dict | None = None    # última ronda terminada
+_lider = False                 # este proceso es el que precalcula
+
+
+def _handler(nombre: str):
+    """Función con caché (sin serializar) del handler y sus kwargs por default."""
+    from .routers import stats   # import tardío: stats importa medio paquete
+
+    fn = getattr(stats, nombre)
+    fn = getattr(fn, "resultado", fn)
+    # llamados directo (sin FastAPI): los parámetros con Query(...) van explícitos
+    kwargs = {
+        n: p.default.default
+        for n, p in inspect.signature(fn).parameters.items()
+        if isinstance(p.default, FieldInfo)
+    }
+    return fn, kwargs
+
+
+async def _llamar(nombre: str, params: dict):
+    fn, kwargs = _handler(nombre)
+    consulta_actual.set(nombre)   # etiqueta de las métricas, como en una petición
+    return await fn(**{**kwargs, **params})
+
+
+def _patrones(nombre: str, programas: list) -> list:
+    """programa_like a precalcular para un endpoint (sin repetir lo que la caché iguala)."""
+    default = inspect.signature(_handler(nombre)[0]).parameters.get("programa_like")
+    if default is None:
+        return []
+    vistos: dict = {}
+    for p in [default.default, *PROGRAMAS, *programas]:
+        vistos.setdefault(p.strip().upper(), p)
+    return list(vistos.values())
+
+
+async def _correr(motivo: str, db) -> bool:
+    """Una ronda completa; False si no se pudo ni empezar (p.ej. MySQL aún no responde)."""
+    global _ronda, _ultima
+    t0 = time.perf_counter()
+    _ronda = {"motivo": motivo, "version": None, "total": None, "hechas": 0, "errores": 0, "segundos": None}
+    ok = True
+    try:
+        _ronda["version"] = (await version.aactual(db)).numero
+        programas = [r["programa"] for r in await _llamar("meta_programas", {})]
+        combinaciones = [(e, {"programa_like": p}) for e in ENDPOINTS for p in _patrones(e, programas)]
+        _ronda["total"] = len(combinaciones)
+        sem = asyncio.Semaphore(CONCURRENCIA)
+
+        async def una(nombre: str, params: dict):
+            async with sem:
+                try:
+                    await _llamar(nombre, params)
+                except Exception:   # noqa: BLE001 — una combinación fallida no detiene la ronda
+                    _ronda["errores"] += 1
+                    log.exception("precálculo %s %s", nombre, params)
+                else:
+                    _ronda["hechas"] += 1
+
+        await asyncio.gather(*(una(n, p) for n, p in combinaciones))
+    except Exception:   # noqa: BLE001
+        log.exception("precálculo (%s)", motivo)
+        _ronda["errores"] += 1
+        ok = False
+    finally:
+        _ronda["segundos"] = round(time.perf_counter() - t0, 3)
+        _ultima, _ronda = _ronda, None
+    log.info("precálculo (%s): %s", motivo, _ultima)
+    return ok
+
+
+async def _esperar() -> bool:
+    """True si alguien pidió una ronda antes de INTERVALO segundos."""
+    try:
+        await asyncio.wait_for(_pendiente.wait(), timeout=INTERVALO)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+async def _bucle(db) -> None:
+    global _lider
+    # con varios workers (COMPARTIDO_DIR) precalcula uno solo: la caché es común. Los
+    # demás reintentan el candado cada INTERVALO por si ese worker termina.
+    while not compartido.lider("precalculo"):
+        await asyncio.sleep(INTERVALO)
+    _lider = True
+    motivo = "inicio"
+    while True:
+        _pendiente.clear()
+        if not await _correr(motivo, db):
+            await _esperar()
+            motivo = "reintento"
+            continue
+        motivo = "refresco"
+        # entre rondas se revisa la versión cada INTERVALO: si cambió (refresco en este
+        # u otro proceso), version descarta las cachés y llama a programar()
+        while not await _esperar():
+            try:
+                await version.aactual(db)
+            except Exception:   # noqa: BLE001
+                log.exception("precálculo: no se pudo leer la versión de los datos")
+
+
+def programar() -> None:
+    """Pide una ronda nueva (se puede llamar desde cualquier hilo)."""
+    if _loop is not None and _pendiente is not None:
+        _loop.call_soon_threadsafe(_pendiente.set)
+
+
+def iniciar(db) -> None:
+    """Arranca el precálculo en el event loop actual (lifespan de main.py)."""
+    global _loop, _pendiente, _tarea
+    if not ACTIVO or _tarea is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _pendiente = asyncio.Event()
+    _tarea = asyncio.create_task(_bucle(db), name="precalculo")
+
+
+async def detener() -> None:
+    global _tarea, _loop
+    if _tarea is None:
+        return
+    _tarea.cancel()
+    try:
+        await _tarea
+    except asyncio.CancelledError:
+        pass
+    _tarea = _loop = None
+
+
+def estado() -> dict:
+    return {
+        "activo": _tarea is not None,
+        "lider": _lider,
+        "endpoints": ENDPOINTS,
+        "concurrencia": CONCURRENCIA,
+        "en_curso": dict(_ronda) if _ronda else None,
+        "ultima": _ultima,
+    }
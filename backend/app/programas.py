@@ -0,0 +1,144 @@
+"""
+Dimensión de programas resuelta en Python.
+
+`programa_like` se interpretaba en SQL como `<expr> LIKE '%X%'` sobre cada fila, lo
+que impide usar índices. Aquí se carga una sola vez la tabla `cacei.programas`
+(id, nombre normalizado; unas decenas de filas) y el patrón se evalúa en memoria con
+la misma semántica (LIKE con % y _ y sus escapes con barra invertida, sin distinguir
+mayúsculas ni acentos, como la collation *_ai_ci de MySQL). El patrón viene del
+cliente: se compara por segmentos, sin backtracking. Las consultas filtran luego con
+`programa_id IN (...)` (tabla de hechos) o `<expr> IN (...)` (alumnos), ambos indexables.
+"""
+import asyncio
+import threading
+import unicodedata
+from dataclasses import dataclass
+
+from . import hechos
+
+
+@dataclass(frozen=True)
+class Filtro:
+    ids: list
+    nombres: list
+
+    def params(self) -> dict:
+        return {"programa_ids": self.ids, "programas": self.nombres}
+
+
+_lock = threading.Lock()
+_tabla: list | None = None   # [(id, nombre, nombre_plegado)]
+_resueltos: dict = {}
+
+
+def plegar(s: str) -> str:
+    """Mayúsculas y sin acentos (aprox. de utf8mb4_0900_ai_ci)."""
+    s = unicodedata.normalize("NFD", s)
+    return "".join(c for c in s if not unicodedata.combining(c)).upper()
+
+
+def _segmentos(patron: str) -> list:
+    """Partes de un patrón LIKE entre '%' sin escapar; dentro de cada parte None es '_'."""
+    segmentos: list = [[]]
+    caracteres = iter(patron)
+    for c in caracteres:
+        if c == "\\":   # como MySQL: '\' escapa el siguiente; al final es literal
+            segmentos[-1].append(next(caracteres, "\\"))
+        elif c == "%":
+            segmentos.append([])
+        else:
+            segmentos[-1].append(None if c == "_" else c)
+    return segmentos
+
+
+def _en(texto: str, segmento: list, i: int) -> bool:
+    return i + len(segmento) <= len(texto) and all(
+        c is None or texto[i + j] == c for j, c in enumerate(segmento)
+    )
+
+
+def _buscar(texto: str, segmento: list, desde: int) -> int:
+    if None not in segmento:
+        return texto.find("".join(segmento), desde)
+    for i in range(desde, len(texto) - len(segmento) + 1):
+        if _en(texto, segmento, i):
+            return i
+    return -1
+
+
+def cumple(texto: str, segmentos: list) -> bool:
+    """
+    `texto LIKE patron` con el patrón ya partido por _segmentos(). Cada parte intermedia
+    se toma en su primera aparición posible: con sólo '%' entre ellas, eso nunca deja
+    fuera una coincidencia, así que no hace falta volver atrás.
+    """
+    if len(segmentos) == 1:
+        return len(texto) == len(segmentos[0]) and _en(texto, segmentos[0], 0)
+    primero, *medio, ultimo = segmentos
+    if not _en(texto, primero, 0):
+        return False
+    pos = len(primero)
+    for segmento in medio:
+        i = _buscar(texto, segmento, pos)
+        if i < 0:
+            return False
+        pos = i + len(segmento)
+    return len(texto) - len(ultimo) >= pos and _en(texto, ultimo, len(texto) - len(ultimo))
+
+
+def invalidar() -> None:
+    """Se llama al refrescar la tabla de hechos (pueden aparecer programas nuevos)."""
+    global _tabla
+    with _lock:
+        _tabla = None
+        _resueltos.clear()
+
+
+def cargar(db) -> list:
+    global _tabla
+    if _tabla is None:
+        rows = db.q(f"SELECT id, programa FROM {hechos.PROGRAMAS}")
+        with _lock:
+            _tabla = [(r["id"], r["programa"], plegar(r["programa"])) for r in rows]
+    return _tabla
+
+
+def resolver(db, programa_like: str) -> Filtro:
+    """Programas cuyo nombre cumple `%programa_like%` (misma semántica que el LIKE original)."""
+    tabla = cargar(db)
+    k = programa_like.upper()
+    f = _resueltos.get(k)
+    if f is None:
+        segmentos = _segmentos(plegar(f"%{k}%"))
+        hits = [(i, n) for i, n, plegado in tabla if cumple(plegado, segmentos)]
+        f = Filtro(ids=[i for i, _ in hits], nombres=[n for _, n in hits])
+        with _lock:
+            if len(_resueltos) >= 1024:   # patrones arbitrarios del cliente: acotar memoria
+                _resueltos.clear()
+            _resueltos[k] = f
+    return f
+
+
+def resolver_varios(db, patrones: list) -> Filtro:
+    """Unión de varios patrones (modo lote); '*' selecciona todos los programas con nombre."""
+    if "*" in patrones:
+        hits = [(i, n) for i, n, _ in cargar(db) if n]
+    else:
+        vistos: dict = {}
+        for p in patrones:
+            f = resolver(db, p)
+            vistos.update(zip(f.ids, f.nombres))
+        hits = list(vistos.items())
+    return Filtro(ids=[i for i, _ in hits], nombres=[n for _, n in hits])
+
+
+async def aresolver_varios(db, patrones: list) -> Filtro:
+    if _tabla is None:
+        return await asyncio.to_thread(resolver_varios, db, patrones)
+    return resolver_varios(db, patrones)
+
+
+async def aresolver(db, programa_like: str) -> Filtro:
+    if _tabla is None:
+        return await asyncio.to_thread(resolver, db, programa_like)
+    return resolver(db, programa_like)
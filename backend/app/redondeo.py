@@ -0,0 +1,33 @@
+"""
+Redondeo con la misma aritmética DECIMAL de MySQL, para que los KPI calculados en
+Python coincidan con los de SQL.
+
+MySQL divide DECIMAL con escala = escala del dividendo + div_precision_increment (4)
+redondeando half-up, y ROUND(x, d) vuelve a redondear half-up. Aquí se replica ese
+doble redondeo.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+DIV_PRECISION_INCREMENT = 4
+
+
+def _q(x: Decimal, digitos: int) -> Decimal:
+    return x.quantize(Decimal(1).scaleb(-digitos), ROUND_HALF_UP)
+
+
+def dividir(num, den, escala_num: int = 0):
+    """num/den como lo devuelve MySQL (None si den es 0, como NULLIF)."""
+    if not den:
+        return None
+    return _q(Decimal(num) / Decimal(den), escala_num + DIV_PRECISION_INCREMENT)
+
+
+def pct(parte, total, digitos: int):
+    """ROUND(100.0 * parte / NULLIF(total, 0), digitos)."""
+    d = dividir(Decimal(100) * parte, total, escala_num=1)
+    return None if d is None else _q(d, digitos)
+
+
+def redondear(x, digitos: int):
+    """ROUND(x, digitos) sobre un DECIMAL (None se conserva)."""
+    return None if x is None else _q(Decimal(x), digitos)
@@ -0,0 +1,78 @@
+"""
+Serialización de los resultados KPI con orjson, sin pasar por jsonable_encoder.
+
+FastAPI recorre cada resultado con jsonable_encoder (un dict por fila y cada Decimal
+de ROUND/CAST convertido a mano); con miles de filas eso pesa más que la consulta.
+Las rutas con @serializado (entre @router.get y @cacheado) devuelven ellas mismas la
+respuesta JSON:
+
+  - el handler puede devolver una Tabla (DB.qt/aqt: columnas + tuplas del cursor) o lo
+    que ya devolvía (lista de dicts, dict de listas); la caché guarda ese valor
+  - los valores salen igual que con jsonable_encoder: Decimal → int si no tiene
+    decimales, si no float; fechas en ISO 8601 (mismo `_default` que streaming/exportar)
+  - `?formato=filas` (default) da el mismo JSON de siempre (lista de objetos);
+    `?formato=columnas` da {"columns": [...], "data": [[...], ...]} sin armar un dict
+    por fila, que es lo que consumen las gráficas. En un dict de listas (dashboard)
+    cada lista se convierte por separado.
+"""
+import functools
+import inspect
+
+import orjson
+from fastapi import HTTPException
+from starlette.responses import Response
+
+from .db import Tabla
+from .streaming import _default
+
+FORMATOS = ("filas", "columnas")
+
+
+def _codificar(v):
+    if isinstance(v, Tabla):
+        return list(v)
+    return _default(v)
+
+
+def _columnas(valor):
+    if isinstance(valor, Tabla):
+        return {"columns": valor.columnas, "data": valor.filas}
+    if isinstance(valor, list) and all(isinstance(r, dict) for r in valor):
+        cols = list(valor[0]) if valor else []
+        return {"columns": cols, "data": [[r.get(c) for c in cols] for r in valor]}
+    if isinstance(valor, dict):
+        return {k: _columnas(v) for k, v in valor.items()}
+    return valor
+
+
+def respuesta(valor, formato: str | None = None) -> Response:
+    if formato == "columnas":
+        valor = _columnas(valor)
+    return Response(orjson.dumps(valor, default=_codificar), media_type="application/json")
+
+
+def serializado(func):
+    """
+    Decorador de ruta: agrega el parámetro `formato` a la firma y convierte el resultado
+    en una respuesta orjson. Las respuestas que ya son Response (stream=...) pasan igual.
+    Como con @cacheado, `__wrapped__` apunta a la función original (sin caché): así la
+    llaman exportar e indices.
+    """
+    firma = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, formato: str | None = None, **kwargs):
+        if formato is not None and formato not in FORMATOS:
+            raise HTTPException(400, f"formato debe ser uno de: {', '.join(FORMATOS)}")
+        valor = await func(*args, **kwargs)
+        if isinstance(valor, Response):
+            return valor
+        return respuesta(valor, formato)
+
+    wrapper.__signature__ = firma.replace(parameters=[
+        *firma.parameters.values(),
+        inspect.Parameter("formato", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=str | None),
+    ])
+    wrapper.__wrapped__ = getattr(func, "__wrapped__", func)
+    wrapper.resultado = func   # con caché y sin serializar (lo usa app/precalculo.py)
+    return wrapper
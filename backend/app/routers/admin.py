@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from ..db import get_db
+from .. import hechos, indices
+from ..cache import resultados
+
+router = APIRouter()
+db = get_db()
+
+# --- Tabla de hechos ----------------------------------------------------------
+@router.post("/hechos/refresh")
+def hechos_refresh(completo: bool = False):
+    """
+    Sincroniza la tabla de hechos con estadistica.boletas.
+    Llamar después de importar dumps; con completo=true se reconstruye desde cero.
+    """
+    resumen = hechos.refrescar(db, completo=completo)
+    resumen["cache_invalidated"] = resultados.invalidate()
+    return resumen
+
+@router.get("/hechos/estado")
+def hechos_estado():
+    return hechos.estado(db)
+
+# --- Caché de resultados ------------------------------------------------------
+@router.post("/cache/invalidate")
+def cache_invalidate(endpoint: str | None = None):
+    """
+    Vacía la caché de resultados (o sólo la de un endpoint, p.ej. 'indice_reprobacion').
+    El paso de importación la llama indirectamente al refrescar la tabla de hechos.
+    """
+    return {"invalidated": resultados.invalidate(endpoint), "cache": resultados.stats()}
+
+# --- Índices ------------------------------------------------------------------
+@router.post("/indices/aplicar")
+def indices_aplicar():
+    """Aplica (idempotente) las migraciones de índices; pensado como paso post-importación."""
+    return indices.aplicar(db)
+
+@router.get("/indices/explain")
+async def indices_explain(programa_like: str = "AEROESPACIAL", cohorte: str | None = None):
+    """EXPLAIN FORMAT=JSON de cada consulta de los endpoints: full scans, filesorts, temporales."""
+    return await indices.explicar(db, programa_like, cohorte)
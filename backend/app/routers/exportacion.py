@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from ..db import consulta_actual, get_db
+from .. import exportar
+
+router = APIRouter()
+db = get_db()
+
+_PROPIOS = {"reporte", "formato", "programa_like"}
+
+async def _fuentes(request: Request, reporte: list, formato: str, programa_like: list) -> list:
+    # Los demás query params (aprobatoria, ciclo, cohorte, ...) pasan a cada reporte que los acepte
+    consulta: dict = {}
+    for k, v in request.query_params.multi_items():
+        if k not in _PROPIOS:
+            consulta.setdefault(k, []).append(v)
+    try:
+        exportar.verificar(formato)
+        return await exportar.preparar(db, reporte, programa_like, consulta, formato)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@router.get("")
+async def exportar_reportes(
+    request: Request,
+    reporte: list[str] = Query([]),                 # vacío = libro completo
+    formato: str = "xlsx",                          # csv | parquet | xlsx
+    programa_like: str = "AEROESPACIAL",
+):
+    """
+    Descarga uno o varios reportes KPI (?reporte=indice_reprobacion&reporte=...) en
+    CSV, Parquet o XLSX. El archivo se genera mientras se envía, leyendo del cursor.
+    Para varios programas usar POST /api/export/jobs.
+    """
+    consulta_actual.set("export")   # carril y presupuesto de exportación (app/admision.py)
+    fuentes = await _fuentes(request, reporte, formato, [programa_like])
+    ext, media = exportar.tipo_archivo(formato, fuentes)
+    nombre = f"{reporte[0] if len(reporte) == 1 else 'cacei'}.{ext}"
+    return StreamingResponse(
+        exportar.generar(db, fuentes, formato),
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
+@router.post("/jobs")
+async def crear_trabajo(
+    request: Request,
+    reporte: list[str] = Query([]),
+    formato: str = "xlsx",
+    programa_like: list[str] = Query(["AEROESPACIAL"]),   # repetible: un juego de hojas por programa
+):
+    """
+    Exportación en segundo plano (p.ej. varios programas): devuelve el id del trabajo;
+    el avance se consulta en GET /api/export/jobs/{id}.
+    """
+    fuentes = await _fuentes(request, reporte, formato, programa_like)
+    return exportar.lanzar(db, fuentes, formato).resumen()
+
+@router.get("/jobs/{id_}")
+def estado_trabajo(id_: str):
+    t = exportar.trabajo(id_)
+    if t is None:
+        raise HTTPException(404, "trabajo no encontrado")
+    return t.resumen()
+
+@router.get("/jobs/{id_}/archivo")
+def descargar_trabajo(id_: str):
+    t = exportar.trabajo(id_)
+    if t is None:
+        raise HTTPException(404, "trabajo no encontrado")
+    if t.estado != "listo":
+        raise HTTPException(409, f"el trabajo está en estado '{t.estado}'")
+    ext = t.archivo.rsplit(".", 1)[1]
+    return FileResponse(exportar.EXPORT_DIR / t.archivo, media_type=t.media_type, filename=f"cacei-{t.id[:8]}.{ext}")
@@ -1,8 +1,236 @@
-from fastapi import APIRouter, Query
-from ..db import DB
+import asyncio
+import base64
 
-router = APIRouter()
-db = DB()
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from ..db import Tabla, consulta_actual, get_db
+from .. import admision, compartido, estatus, hechos, memoria, precalculo, programas, version
+from ..cache import cacheado, resultados, vuelos
+from ..respuestas import serializado
+from .. import streaming
+from ..ciclos import Rango, clave_orden
+from ..cohortes import CUBO, INGRESO
+from ..hechos import CICLOS, HECHOS, PROGRAMAS, SQL_PROGRAMA_ALUMNO, _bin
+from ..redondeo import pct
+
+async def _nombrar_consulta(request: Request):
+    # async: corre en la misma tarea que el handler, así el contextvar le llega a DB.aq
+    consulta_actual.set(request.scope["endpoint"].__name__)
+
+router = APIRouter(dependencies=[Depends(_nombrar_consulta)])
+db = get_db()
+
+async def _filtro(programa_like: str, lote: list | None = None) -> dict:
+    """
+    Resuelve programa_like contra la dimensión de programas (en memoria) y devuelve
+    los parámetros `programa_ids` / `programas` para filtrar con IN (...).
+    En modo lote (`?programas=A&programas=B` o `?programas=*`) resuelve la unión.
+    """
+    await hechos.aasegurar(db)
+    if lote:
+        return (await programas.aresolver_varios(db, lote)).params()
+    return (await programas.aresolver(db, programa_like)).params()
+
+def _lote(programas_: list | None) -> list:
+    return [p.strip() for p in programas_ or [] if p.strip()]
+
+# Modo lote: los KPI agregan la columna `programa` (nombre normalizado) y agrupan por
+# ella en la misma pasada; el orden es por programa y luego el orden habitual.
+def _param_lote():
+    return Query(None, alias="programas", description='Modo lote: patrones de programa o "*" (todos)')
+
+_JOIN_PROGRAMA = f"JOIN {PROGRAMAS} p ON p.id = h.programa_id"
+
+class _PorPrograma:
+    """Fragmentos SQL del modo lote; en modo normal todos son cadena vacía (SQL sin cambios)."""
+
+    def __init__(self, activo: bool):
+        self.activo = activo
+        self.join = _JOIN_PROGRAMA if activo else ""                    # tras FROM {HECHOS} h
+        self.base = "p.programa AS programa," if activo else ""         # SELECT sobre hechos
+        self.alumno = f"{SQL_PROGRAMA_ALUMNO} AS programa," if activo else ""   # SELECT sobre alumnos
+        self.grupo_alumno = f"{SQL_PROGRAMA_ALUMNO}," if activo else ""
+        self.escala = "GROUP BY programa" if activo else ""
+
+    def col(self, alias: str = "") -> str:
+        return (f"{alias}." if alias else "") + "programa," if self.activo else ""
+
+    def umbral(self, alias: str) -> str:
+        # params tiene una fila (o una por programa en modo lote)
+        if self.activo:
+            return f"(SELECT aprob_calc FROM params pr WHERE pr.programa = {alias}.programa)"
+        return "(SELECT aprob_calc FROM params)"
+
+# Rango de ciclos (?desde=2019-A&hasta=2023-B): filtra por el ordinal entero del ciclo
+# (ciclo_key en hechos y en la dimensión de ciclos), así es un range scan sobre índice.
+class _PorCiclo:
+    """Fragmentos SQL del filtro desde/hasta; sin rango todos son cadena vacía."""
+
+    def __init__(self, desde: str | None, hasta: str | None):
+        try:
+            self.rango = Rango.de(desde, hasta)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    def filtro(self, col: str) -> str:
+        # col: columna con el ordinal (h.ciclo_key, dc.ciclo_key, ...)
+        return f"AND {col} BETWEEN :desde_key AND :hasta_key" if self.rango else ""
+
+    def donde(self, col: str) -> str:
+        # WHERE sobre final_alumno_materia en los KPI que detectan la escala: el rango va
+        # después de `escala`, así sólo acota los ciclos y no cambia el umbral usado
+        return f"WHERE {col} BETWEEN :desde_key AND :hasta_key" if self.rango else ""
+
+    def en(self, expr: str) -> str:
+        # expr: ciclo en texto; se resuelve contra la dimensión por su índice (ciclo_key, ciclo)
+        if not self.rango:
+            return ""
+        return (
+            f"AND {_bin(expr)} IN "
+            f"(SELECT dc.ciclo FROM {CICLOS} dc WHERE dc.ciclo_key BETWEEN :desde_key AND :hasta_key)"
+        )
+
+    def params(self) -> dict:
+        if not self.rango:
+            return {}
+        return {"desde_key": self.rango.desde, "hasta_key": self.rango.hasta}
+
+    def contiene(self, ciclo: str | None) -> bool:
+        return self.rango is None or self.rango.contiene(ciclo)
+
+def _join_ciclo(expr: str, alias: str = "dc") -> str:
+    """LEFT JOIN a la dimensión de ciclos para ordenar por {alias}.ciclo_key (NULL primero)."""
+    return f"LEFT JOIN {CICLOS} {alias} ON {alias}.ciclo = {_bin(expr)}"
+
+# Detalle por materia (?top_n=&min_alumnos=&clave_prefijo=&limite=&cursor=): los filtros
+# van dentro del SQL y la paginación es por llave (keyset) sobre el orden del endpoint,
+# así cada página es un WHERE (llave) > (última llave) ... LIMIT y no un OFFSET. El
+# cursor es opaco para el cliente: base64 de la llave de la última fila entregada.
+LIMITE_MAX = 5000
+
+def _cursor(llave) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(list(llave), default=streaming._default)).decode()
+
+def _leer_cursor(cursor: str, n: int) -> list:
+    try:
+        llave = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, orjson.JSONDecodeError):
+        llave = None
+    if not isinstance(llave, list) or len(llave) != n or not all(isinstance(v, (int, float, str)) for v in llave):
+        raise HTTPException(400, "cursor inválido")
+    return llave
+
+class _PorMateria:
+    """Fragmentos SQL de filtros y paginación del detalle por materia; sin ellos, cadena vacía."""
+
+    def __init__(
+        self,
+        por: _PorPrograma,
+        llave: list,
+        top_n: int | None = None,
+        min_alumnos: int | None = None,
+        clave_prefijo: str | None = None,
+        limite: int | None = None,
+        cursor: str | None = None,
+    ):
+        # llave: expresiones sobre el SELECT final (alias d) que dan el orden total del
+        # endpoint, todas ascendentes (los DESC van negados); empieza por d._ciclo_key
+        # y el ciclo (en modo lote se antepone d.programa)
+        if top_n is not None and top_n < 1:
+            raise HTTPException(400, "top_n debe ser >= 1")
+        if min_alumnos is not None and min_alumnos < 0:
+            raise HTTPException(400, "min_alumnos debe ser >= 0")
+        if limite is not None and not 1 <= limite <= LIMITE_MAX:
+            raise HTTPException(400, f"limite debe estar entre 1 y {LIMITE_MAX}")
+        if cursor and limite is None:
+            raise HTTPException(400, "cursor requiere limite")
+        self.por = por
+        self.llave = [por.col("d").rstrip(","), *llave] if por.activo else llave
+        self.top_n = top_n
+        self.min_alumnos = min_alumnos or None
+        self.prefijo = (clave_prefijo or "").strip() or None
+        self.limite = limite
+        self.despues = _leer_cursor(cursor, len(self.llave)) if cursor else None
+        self.activo = any(v is not None for v in (top_n, self.min_alumnos, self.prefijo, limite))
+
+    def filtro(self, *extra: str) -> str:
+        # WHERE sobre final_alumno_materia: después de `escala`, así el umbral detectado
+        # es el mismo con o sin filtros. En modo normal la llave empieza por ciclo_key:
+        # los ciclos anteriores al cursor ni se agregan. `extra`: otros "AND ..." (rango).
+        partes = [e for e in extra if e]
+        if self.prefijo:
+            partes.append("AND clave LIKE :clave_prefijo")
+        if self.despues and not self.por.activo:
+            partes.append("AND ciclo_key >= :cursor_ciclo_key")
+        return f"WHERE TRUE {' '.join(partes)}" if partes else ""
+
+    def minimo(self, expr: str) -> str:
+        return f"HAVING {expr} >= :min_alumnos" if self.min_alumnos else ""
+
+    def ciclo_key(self, alias: str) -> str:
+        return f"{alias}.ciclo_key AS _ciclo_key," if self.activo else ""
+
+    def envolver(self, seleccion: str, columnas: list, orden: str) -> str:
+        """SELECT final: tal cual con ORDER BY `orden`, o filtrado/paginado por la llave."""
+        if not self.activo:
+            return f"{seleccion}\nORDER BY {orden}"
+        cols = ", ".join([*(["d.programa"] if self.por.activo else []), *(f"d.`{c}`" for c in columnas)])
+        if self.limite is not None:
+            # la llave sale al final para armar el cursor; pagina() la quita
+            cols += ", " + ", ".join(f"{k} AS _k{i}" for i, k in enumerate(self.llave))
+        fuente = f"({seleccion}) d"
+        where = []
+        if self.top_n is not None:
+            # top N por ciclo: se parte por ([programa,] ciclo_key, ciclo), el resto ordena
+            k = 3 if self.por.activo else 2
+            particion, resto = ", ".join(self.llave[:k]), ", ".join(self.llave[k:])
+            fuente = (
+                f"(SELECT d.*, ROW_NUMBER() OVER (PARTITION BY {particion} ORDER BY {resto}) AS _n "
+                f"FROM {fuente}) d"
+            )
+            where.append("d._n <= :top_n")
+        if self.despues:
+            marcas = ", ".join(f":cursor_{i}" for i in range(len(self.llave)))
+            where.append(f"({', '.join(self.llave)}) > ({marcas})")
+        return (
+            f"SELECT {cols} FROM {fuente}\n"
+            f"{'WHERE ' + ' AND '.join(where) if where else ''}\n"
+            f"ORDER BY {', '.join(self.llave)}\n"
+            f"{'LIMIT :limite_mas_uno' if self.limite is not None else ''}"
+        )
+
+    def params(self) -> dict:
+        p = {}
+        if self.top_n is not None:
+            p["top_n"] = self.top_n
+        if self.min_alumnos:
+            p["min_alumnos"] = self.min_alumnos
+        if self.prefijo:
+            escapado = self.prefijo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            p["clave_prefijo"] = escapado + "%"
+        if self.limite is not None:
+            p["limite_mas_uno"] = self.limite + 1   # una de más: dice si hay otra página
+        if self.despues:
+            p.update({f"cursor_{i}": v for i, v in enumerate(self.despues)})
+            if not self.por.activo:
+                p["cursor_ciclo_key"] = self.despues[0]
+        return p
+
+    def pagina(self, tabla: Tabla):
+        """Con limite: {"filas": ..., "siguiente": cursor | None}; si no, la tabla igual."""
+        if self.limite is None:
+            return tabla
+        n = len(self.llave)
+        filas = tabla.filas[: self.limite]
+        siguiente = _cursor(filas[-1][-n:]) if len(tabla.filas) > self.limite else None
+        return {"filas": Tabla(tabla.columnas[:-n], [f[:-n] for f in filas]), "siguiente": siguiente}
+
+def _en_memoria(motor: str | None) -> bool:
+    """True si la petición se resuelve con el motor en memoria (ver app/memoria.py)."""
+    try:
+        return memoria.elegir(motor) == "memoria"
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 # --- Auxiliares de introspección (opcionales) --------------------------------
 def _table_exists(schema: str, table: str) -> bool:
@@ -23,75 +251,111 @@ def _col_exists(schema: str, table: str, column: str) -> bool:
 
 # --- Debug: columnas relevantes ------------------------------------------------
 @router.get("/debug/cols_boletas")
-def debug_cols_boletas():
+async def debug_cols_boletas():
+    sql = """
+        SELECT COLUMN_NAME
+        FROM information_schema.columns
+        WHERE table_schema=:s AND table_name=:t
+        ORDER BY ORDINAL_POSITION
+    """
+    boletas, alumnos = await asyncio.gather(
+        db.aq(sql, s="estadistica", t="boletas"),
+        db.aq(sql, s="ingenieria", t="alumnos"),
+    )
     return {
-        "estadistica.boletas": [r["COLUMN_NAME"] for r in db.q("""
-            SELECT COLUMN_NAME
-            FROM information_schema.columns
-            WHERE table_schema='estadistica' AND table_name='boletas'
-            ORDER BY ORDINAL_POSITION
-        """)],
-        "ingenieria.alumnos": [r["COLUMN_NAME"] for r in db.q("""
-            SELECT COLUMN_NAME
-            FROM information_schema.columns
-            WHERE table_schema='ingenieria' AND table_name='alumnos'
-            ORDER BY ORDINAL_POSITION
-        """)],
+        "estadistica.boletas": [r["COLUMN_NAME"] for r in boletas],
+        "ingenieria.alumnos": [r["COLUMN_NAME"] for r in alumnos],
     }
 
 # --- Salud --------------------------------------------------------------------
 @router.get("/health")
-def health():
-    rows = db.q("SHOW DATABASES")
-    return {"ok": True, "databases": [r["Database"] for r in rows]}
+async def health():
+    rows = await db.aq("SHOW DATABASES")
+    return {
+        "ok": True,
+        "databases": [r["Database"] for r in rows],
+        "cache": resultados.stats(),
+        "coalescencia": vuelos.stats(),
+        "pool": db.pool_stats(),
+        "motor": memoria.estado(),
+        "version_datos": version.estado(),
+        "precalculo": precalculo.estado(),
+        "admision": admision.estado(),
+        "compartido": compartido.estado(),
+    }
 
 # --- Metadatos ----------------------------------------------------------------
 @router.get("/meta/programas")
-def meta_programas(limit: int = 200):
+@serializado
+@cacheado
+async def meta_programas(limit: int = 200):
     """
     Programas educativos detectados, normalizados:
       - Usa b.carrera si viene con valor (trim != '')
       - En caso contrario usa a.desc_programa
       - Se excluyen vacíos y se devuelve en UPPER()
+    Sale de la dimensión de programas (sólo los que tienen filas en la tabla de hechos).
+    La dimensión es utf8mb4_bin (llave de los joins); la lista agrupa sin distinguir
+    acentos ni mayúsculas, como antes, para no repetir variantes de un mismo nombre.
     """
-    sql = """
-    SELECT DISTINCT
-      UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), 'SIN_PROGRAMA')) AS programa
-    FROM estadistica.boletas b
-    LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
-    WHERE COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), '') <> ''
-    ORDER BY 1
+    await hechos.aasegurar(db)
+    sql = f"""
+    SELECT MIN(p.programa) AS programa
+    FROM {PROGRAMAS} p
+    WHERE p.programa <> ''
+      AND EXISTS (SELECT 1 FROM {HECHOS} h WHERE h.programa_id = p.id)
+    GROUP BY p.programa COLLATE utf8mb4_0900_ai_ci
+    ORDER BY MIN(p.programa) COLLATE utf8mb4_0900_ai_ci
     LIMIT :limit
     """
-    return db.q(sql, limit=limit)
+    return await db.aqt(sql, limit=limit)
 
 # --- Inscritos ----------------------------------------------------------------
 @router.get("/inscritos_por_ciclo")
-def inscritos_por_ciclo(programa_like: str = "AEROESPACIAL"):
+@serializado
+@cacheado
+async def inscritos_por_ciclo(
+    programa_like: str = "AEROESPACIAL",
+    motor: str | None = None,
+    desde: str | None = None,   # p.ej. 2019-A, 2019-SEM-AGO/DIC
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+):
     """
     Inscritos por ciclo; filtro robusto de programa y orden ENE/JUN antes que AGO/DIC.
     """
-    sql = """
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    if not lote and _en_memoria(motor):
+        return (await memoria.acargar(db)).inscritos_por_ciclo(prog["programa_ids"], rango.rango)
+    sql = f"""
     SELECT
-      b.ciclo,
-      COUNT(DISTINCT b.matricula) AS inscritos
-    FROM estadistica.boletas b
-    LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
-    WHERE UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), '')) LIKE :programa
-    GROUP BY b.ciclo
-    ORDER BY
-      CAST(SUBSTRING_INDEX(b.ciclo,'-',1) AS UNSIGNED),                 -- año
-      CASE WHEN b.ciclo LIKE '%ENE/JUN' THEN 1 ELSE 2 END,              -- semestre
-      b.ciclo
-    """
-    return db.q(sql, programa=f"%{programa_like.upper()}%")
+      {por.base}
+      h.ciclo,
+      COUNT(DISTINCT h.matricula) AS inscritos
+    FROM {HECHOS} h
+    {por.join}
+    WHERE h.programa_id IN :programa_ids
+      {rango.filtro("h.ciclo_key")}
+    GROUP BY {por.col("p")} h.ciclo_key, h.ciclo
+    ORDER BY {por.col("p")} h.ciclo_key, h.ciclo                        -- año, ENE/JUN antes que AGO/DIC
+    """
+    return await db.aqt(sql, **prog, **rango.params())
 
 # --- Reprobación (por ciclo) --------------------------------------------------
 @router.get("/reprobacion")
-def indice_reprobacion(
+@serializado
+@cacheado
+async def indice_reprobacion(
     programa_like: str = "AEROESPACIAL",
     aprobatoria: float = 6.0,
     contar_no_numericas: bool = False,   # si TRUE, NP/NA cuentan como reprobadas
+    motor: str | None = None,            # "sql" | "memoria" (default: KPI_MOTOR)
+    desde: str | None = None,
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
 ):
     """
     Índice de reprobación por ciclo usando la MEJOR calificación por (matrícula, clave, ciclo).
@@ -99,26 +363,28 @@ def indice_reprobacion(
       - max<=1.0  -> si aprobatoria>1 => /100; si <=1 => tal cual
       - max<=10.0 -> si aprobatoria>10 => /10; si <=10 => tal cual
       - max>10.0  -> aprobatoria tal cual
+    En modo lote la escala se detecta por programa.
     """
-    sql = r"""
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    if not lote and _en_memoria(motor):
+        return (await memoria.acargar(db)).indice_reprobacion(
+            prog["programa_ids"], aprobatoria, contar_no_numericas, rango.rango
+        )
+    sql = f"""
     WITH base AS (
-      SELECT
-        b.matricula,
-        b.clave,
-        b.ciclo,
-        TRIM(b.calificacion) AS calif_txt,
-        CASE WHEN b.calificacion REGEXP '^[0-9]+(\\.[0-9]+)?$'
-             THEN CAST(b.calificacion AS DECIMAL(10,2))
-             ELSE NULL END AS calif_num
-      FROM estadistica.boletas b
-      LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
-      WHERE UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), '')) LIKE :programa
+      SELECT {por.base} h.matricula, h.clave, h.ciclo, h.ciclo_key, h.calif_num
+      FROM {HECHOS} h
+      {por.join}
+      WHERE h.programa_id IN :programa_ids
     ),
     escala AS (
-      SELECT COALESCE(MAX(calif_num), 0) AS max_val FROM base
+      SELECT {por.col()} COALESCE(MAX(calif_num), 0) AS max_val FROM base {por.escala}
     ),
     params AS (
-      SELECT CASE
+      SELECT {por.col()} CASE
                WHEN max_val <= 1.0 THEN CASE WHEN :aprobatoria > 1.0 THEN :aprobatoria/100.0 ELSE :aprobatoria END
                WHEN max_val <= 10.0 THEN CASE WHEN :aprobatoria > 10.0 THEN :aprobatoria/10.0 ELSE :aprobatoria END
                ELSE :aprobatoria
@@ -127,243 +393,327 @@ def indice_reprobacion(
     ),
     final_alumno_materia AS (  -- mejor intento por alumno-materia-ciclo
       SELECT
-        matricula, clave, ciclo,
-        MAX(calif_num) AS calif_final
+        {por.col()} matricula, clave, ciclo, ciclo_key,
+        MAX(calif_num) AS calif_final,
+        MAX(calif_num IS NOT NULL) AS evaluada
       FROM base
-      GROUP BY matricula, clave, ciclo
+      {rango.donde("ciclo_key")}
+      GROUP BY {por.col()} matricula, clave, ciclo_key, ciclo
     )
     SELECT
+      {por.col("f")}
       f.ciclo AS ciclo,
-      SUM(CASE WHEN f.calif_final IS NOT NULL THEN 1 ELSE 0 END) AS evaluadas,
+      SUM(f.evaluada) AS evaluadas,
       SUM(CASE
-            WHEN f.calif_final IS NOT NULL AND f.calif_final < (SELECT aprob_calc FROM params) THEN 1
+            WHEN f.calif_final IS NOT NULL AND f.calif_final < {por.umbral("f")} THEN 1
             WHEN f.calif_final IS NULL AND :inc_non_num = 1 THEN 1
             ELSE 0
           END) AS reprobados,
       ROUND(
         100.0 * SUM(CASE
-                      WHEN f.calif_final IS NOT NULL AND f.calif_final < (SELECT aprob_calc FROM params) THEN 1
+                      WHEN f.calif_final IS NOT NULL AND f.calif_final < {por.umbral("f")} THEN 1
                       WHEN f.calif_final IS NULL AND :inc_non_num = 1 THEN 1
                       ELSE 0
                     END)
-        / NULLIF(SUM(CASE WHEN f.calif_final IS NOT NULL THEN 1 ELSE 0 END), 0), 2
+        / NULLIF(SUM(f.evaluada), 0), 2
       ) AS porcentaje_reprobacion,
-      (SELECT aprob_calc FROM params) AS umbral_usado
+      {por.umbral("f")} AS umbral_usado
     FROM final_alumno_materia f
-    GROUP BY f.ciclo
-    ORDER BY
-      CAST(SUBSTRING_INDEX(f.ciclo,'-',1) AS UNSIGNED),
-      CASE WHEN f.ciclo LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      f.ciclo;
+    GROUP BY {por.col("f")} f.ciclo_key, f.ciclo
+    ORDER BY {por.col("f")} f.ciclo_key, f.ciclo;
     """
     inc_non_num = 1 if contar_no_numericas else 0
-    return db.q(
+    return await db.aqt(
         sql,
-        programa=f"%{programa_like.upper()}%",
+        **prog,
+        **rango.params(),
         aprobatoria=aprobatoria,
         inc_non_num=inc_non_num,
     )
 
 # --- Deserción (aprox) --------------------------------------------------------
 @router.get("/desercion")
-def desercion(programa_like: str = "AEROESPACIAL"):
+@serializado
+@cacheado
+async def desercion(
+    programa_like: str = "AEROESPACIAL",
+    desde: str | None = None,
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+):
     """
     Deserción (aproximada) por ciclo usando ingenieria.alumnos.estatus.
-    Se asume que estatus que contienen 'BAJA' o 'INACT' son desertores.
-    Resultado por ultimo_ciclo_kardex.
+    Se asume que estatus que contienen 'BAJA' o 'INACT' son desertores
+    (categoría DESERTOR de app/estatus.py). Resultado por ultimo_ciclo_kardex.
     """
-    sql = """
-    SELECT COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso) AS ciclo,
-           SUM(CASE WHEN UPPER(COALESCE(a.estatus,'')) REGEXP 'BAJA|INACT' THEN 1 ELSE 0 END) AS desertores,
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    sql = f"""
+    SELECT {por.alumno}
+           COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso) AS ciclo,
+           SUM(CASE WHEN {estatus.es("DESERTOR")} THEN 1 ELSE 0 END) AS desertores,
            COUNT(*) AS total,
-           ROUND(100.0*SUM(CASE WHEN UPPER(COALESCE(a.estatus,'')) REGEXP 'BAJA|INACT' THEN 1 ELSE 0 END)/NULLIF(COUNT(*),0),2) AS porcentaje
+           ROUND(100.0*SUM(CASE WHEN {estatus.es("DESERTOR")} THEN 1 ELSE 0 END)/NULLIF(COUNT(*),0),2) AS porcentaje
     FROM ingenieria.alumnos a
-    WHERE UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), '')) LIKE :programa
-    GROUP BY COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso)
-    ORDER BY
-      CAST(SUBSTRING_INDEX(COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso),'-',1) AS UNSIGNED),
-      CASE WHEN COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso) LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso)
+    {estatus.join()}
+    {_join_ciclo("COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso)")}
+    WHERE {SQL_PROGRAMA_ALUMNO} IN :programas
+      {rango.filtro("dc.ciclo_key")}
+    GROUP BY {por.grupo_alumno} dc.ciclo_key, COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso)
+    ORDER BY {por.grupo_alumno} dc.ciclo_key, COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso)
     """
-    return db.q(sql, programa=f"%{programa_like.upper()}%")
+    return await db.aqt(sql, **prog, **rango.params())
 
 # --- Cohorte ------------------------------------------------------------------
 @router.get("/cohorte")
-def seguimiento_cohorte(ciclo_ingreso: str, programa_like: str = "AEROESPACIAL"):
+@serializado
+@cacheado
+async def seguimiento_cohorte(
+    ciclo_ingreso: str,
+    programa_like: str = "AEROESPACIAL",
+    desde: str | None = None,
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+):
     """
     Seguimiento de una cohorte (alumnos con ciclo_ingreso X) y su permanencia por ciclo en boletas.
     """
-    sql = """
-    SELECT b.ciclo, COUNT(DISTINCT b.matricula) AS activos
-    FROM estadistica.boletas b
-    JOIN ingenieria.alumnos a ON a.matricula=b.matricula
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    sql = f"""
+    SELECT {por.alumno} h.ciclo, COUNT(DISTINCT h.matricula) AS activos
+    FROM {HECHOS} h
+    JOIN ingenieria.alumnos a ON a.matricula=h.matricula
     WHERE a.ciclo_ingreso = :ciclo_ingreso
-      AND UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), '')) LIKE :programa
-    GROUP BY b.ciclo
-    ORDER BY
-      CAST(SUBSTRING_INDEX(b.ciclo,'-',1) AS UNSIGNED),
-      CASE WHEN b.ciclo LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      b.ciclo
+      AND {SQL_PROGRAMA_ALUMNO} IN :programas
+      {rango.filtro("h.ciclo_key")}
+    GROUP BY {por.grupo_alumno} h.ciclo_key, h.ciclo
+    ORDER BY {por.grupo_alumno} h.ciclo_key, h.ciclo
     """
-    return db.q(sql, ciclo_ingreso=ciclo_ingreso, programa=f"%{programa_like.upper()}%")
+    return await db.aqt(sql, ciclo_ingreso=ciclo_ingreso, **prog, **rango.params())
 
 # --- Cédula 322 (placeholder) -------------------------------------------------
 @router.get("/cedula_322")
-def cedula_322(programa_like: str = "AEROESPACIAL"):
+@serializado
+@cacheado
+async def cedula_322(programa_like: str = "AEROESPACIAL", programas_: list[str] | None = _param_lote()):
     """
     Placeholder de Cédula 322 (estructura depende de fuente externa no incluida).
     Conteos básicos por género y estatus.
     """
-    sql = """
-    SELECT UPPER(COALESCE(a.genero,'N/D')) AS genero,
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    prog = await _filtro(programa_like, lote)
+    sql = f"""
+    SELECT {por.alumno}
+           UPPER(COALESCE(a.genero,'N/D')) AS genero,
            UPPER(COALESCE(a.estatus,'N/D')) AS estatus,
            COUNT(*) AS total
     FROM ingenieria.alumnos a
-    WHERE UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), '')) LIKE :programa
-    GROUP BY UPPER(COALESCE(a.genero,'N/D')), UPPER(COALESCE(a.estatus,'N/D'))
-    ORDER BY genero, estatus
+    WHERE {SQL_PROGRAMA_ALUMNO} IN :programas
+    GROUP BY {por.grupo_alumno} UPPER(COALESCE(a.genero,'N/D')), UPPER(COALESCE(a.estatus,'N/D'))
+    ORDER BY {por.grupo_alumno} genero, estatus
     """
-    return db.q(sql, programa=f"%{programa_like.upper()}%")
+    return await db.aqt(sql, **prog)
+
+_COLUMNAS_REPROBACION = [
+    "Clave", "Nombre de la Materia", "Ciclo", "Semestre", "No. Alumnos", "No. Reprobados", "Porcentaje",
+    "umbral_usado",
+]
 
 @router.get("/reprobacion_detalle")
-def reprobacion_detalle(
+@serializado
+@cacheado
+async def reprobacion_detalle(
     programa_like: str = "AEROESPACIAL",
     aprobatoria: float = 6.0,
     ciclo: str | None = None,   # p.ej. "2022-SEM-AGO/DIC"
+    stream: str | None = None,  # "ndjson" | "array": respuesta en streaming
+    motor: str | None = None,   # "sql" | "memoria" (default: KPI_MOTOR)
+    desde: str | None = None,
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+    top_n: int | None = None,          # las N materias con más reprobación por ciclo
+    min_alumnos: int | None = None,    # sólo materias con al menos N alumnos
+    clave_prefijo: str | None = None,  # sólo claves que empiezan así
+    limite: int | None = None,         # filas por página (paginación por llave)
+    cursor: str | None = None,         # `siguiente` de la página anterior
 ):
     """
     Detalle por materia consolidado por (clave, ciclo).
     Usa la MEJOR calificación por (matrícula, clave, ciclo),
     suma alumnos/reprobados y recalcula porcentaje.
+    Con stream=ndjson|array las filas se envían conforme salen del cursor.
+    Con limite=N responde {"filas": [...], "siguiente": cursor | null} en el orden
+    (ciclo, porcentaje desc, clave); top_n/min_alumnos/clave_prefijo filtran en SQL
+    (y se resuelven siempre con el motor SQL).
+    """
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    pag = _PorMateria(
+        por,
+        [
+            "d._ciclo_key",
+            "COALESCE(d.`Ciclo`, '')",
+            "-d.`Porcentaje`",
+            "COALESCE(d.`Clave`, '')",
+            "d.`Nombre de la Materia`",
+        ],
+        top_n, min_alumnos, clave_prefijo, limite, cursor,
+    )
+    if stream and limite is not None:
+        raise HTTPException(400, "stream y limite no se combinan")
+    prog = await _filtro(programa_like, lote)
+    if not lote and _en_memoria(motor) and not pag.activo:
+        filas = (await memoria.acargar(db)).reprobacion_detalle(
+            prog["programa_ids"], aprobatoria, ciclo, rango.rango
+        )
+        return streaming.respuesta_filas(filas, stream) if stream else filas
+    seleccion = f"""
+    SELECT
+      {por.col("c")}
+      {pag.ciclo_key("c")}
+      c.clave                                              AS `Clave`,
+      COALESCE(NULLIF(TRIM(m.materia),''), '(SIN NOMBRE)') AS `Nombre de la Materia`,
+      c.ciclo                                              AS `Ciclo`,
+      c.semestre                                           AS `Semestre`,
+      c.alumnos                                            AS `No. Alumnos`,
+      c.reprobados                                         AS `No. Reprobados`,
+      ROUND(100.0 * c.reprobados / NULLIF(c.alumnos, 0), 1) AS `Porcentaje`,
+      {por.umbral("c")}                      AS `umbral_usado`
+    FROM consolidados c
+    LEFT JOIN ingenieria.materias m ON m.clave = c.clave
     """
-    sql = r"""
+    orden = f"""
+      {por.col("c")}
+      c.ciclo_key,
+      c.ciclo,
+      `Porcentaje` DESC,
+      c.clave"""
+    sql = f"""
     WITH base AS (
-      SELECT
-        b.matricula,
-        b.clave,
-        b.ciclo,
-        TRIM(b.grado) AS grado_txt,
-        CASE WHEN b.calificacion REGEXP '^[0-9]+(\\.[0-9]+)?$'
-             THEN CAST(b.calificacion AS DECIMAL(10,2))
-             ELSE NULL END AS calif_num
-      FROM estadistica.boletas b
-      LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
-      WHERE UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), '')) LIKE :programa
-        AND ( :ciclo IS NULL OR :ciclo = '' OR b.ciclo = :ciclo )
+      SELECT {por.base} h.matricula, h.clave, h.ciclo, h.ciclo_key, h.semestre_n, h.calif_num
+      FROM {HECHOS} h
+      {por.join}
+      WHERE h.programa_id IN :programa_ids
+        AND ( :ciclo IS NULL OR :ciclo = '' OR h.ciclo = :ciclo )
     ),
     escala AS (
-      SELECT COALESCE(MAX(calif_num), 0) AS max_val FROM base
+      SELECT {por.col()} COALESCE(MAX(calif_num), 0) AS max_val FROM base {por.escala}
     ),
     params AS (
-      SELECT CASE
+      SELECT {por.col()} CASE
                WHEN max_val <= 1.0 THEN CASE WHEN :aprobatoria > 1.0 THEN :aprobatoria/100.0 ELSE :aprobatoria END
                WHEN max_val <= 10.0 THEN CASE WHEN :aprobatoria > 10.0 THEN :aprobatoria/10.0 ELSE :aprobatoria END
                ELSE :aprobatoria
              END AS aprob_calc
       FROM escala
     ),
-    base_con_sem AS (
-      SELECT
-        matricula, clave, ciclo,
-        CASE
-          WHEN grado_txt REGEXP '^[0-9]+' THEN CAST(REGEXP_SUBSTR(grado_txt, '^[0-9]+') AS UNSIGNED)
-          ELSE 0
-        END AS semestre_n,
-        calif_num
-      FROM base
-    ),
     final_alumno_materia AS (  -- mejor intento por alumno-materia-ciclo
       SELECT
-        matricula, clave, ciclo,
-        MIN(semestre_n) AS semestre,      -- si varía, tomamos el menor
+        {por.col()} matricula, clave, ciclo, ciclo_key,
+        MIN(COALESCE(semestre_n, 0)) AS semestre,      -- si varía, tomamos el menor
         MAX(calif_num)  AS calif_final
-      FROM base_con_sem
-      GROUP BY matricula, clave, ciclo
+      FROM base
+      {pag.filtro(rango.filtro("ciclo_key"))}
+      GROUP BY {por.col()} matricula, clave, ciclo_key, ciclo
     ),
     totales AS (  -- 1ª agregación por (clave,ciclo,semestre)
       SELECT
-        f.clave, f.ciclo, f.semestre,
+        {por.col("f")} f.clave, f.ciclo, f.ciclo_key, f.semestre,
         COUNT(*) AS alumnos,
-        SUM(CASE WHEN f.calif_final IS NOT NULL AND f.calif_final < (SELECT aprob_calc FROM params) THEN 1 ELSE 0 END) AS reprobados
+        SUM(CASE WHEN f.calif_final IS NOT NULL AND f.calif_final < {por.umbral("f")} THEN 1 ELSE 0 END) AS reprobados
       FROM final_alumno_materia f
-      GROUP BY f.clave, f.ciclo, f.semestre
+      GROUP BY {por.col("f")} f.clave, f.ciclo_key, f.ciclo, f.semestre
     ),
     consolidados AS (  -- 2ª agregación: colapsa por (clave,ciclo)
       SELECT
-        t.clave, t.ciclo,
+        {por.col("t")} t.clave, t.ciclo, t.ciclo_key,
         MIN(t.semestre) AS semestre,
         SUM(t.alumnos) AS alumnos,
         SUM(t.reprobados) AS reprobados
       FROM totales t
-      GROUP BY t.clave, t.ciclo
+      GROUP BY {por.col("t")} t.clave, t.ciclo_key, t.ciclo
+      {pag.minimo("SUM(t.alumnos)")}
     )
-    SELECT
-      c.clave                                              AS `Clave`,
-      COALESCE(NULLIF(TRIM(m.materia),''), '(SIN NOMBRE)') AS `Nombre de la Materia`,
-      c.ciclo                                              AS `Ciclo`,
-      c.semestre                                           AS `Semestre`,
-      c.alumnos                                            AS `No. Alumnos`,
-      c.reprobados                                         AS `No. Reprobados`,
-      ROUND(100.0 * c.reprobados / NULLIF(c.alumnos, 0), 1) AS `Porcentaje`,
-      (SELECT aprob_calc FROM params)                      AS `umbral_usado`
-    FROM consolidados c
-    LEFT JOIN ingenieria.materias m ON m.clave = c.clave
-    ORDER BY
-      CAST(SUBSTRING_INDEX(c.ciclo,'-',1) AS UNSIGNED),
-      CASE WHEN c.ciclo LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      c.ciclo,
-      `Porcentaje` DESC,
-      c.clave;
+    {pag.envolver(seleccion, _COLUMNAS_REPROBACION, orden)};
     """
-    return db.q(
-        sql,
-        programa=f"%{programa_like.upper()}%",
+    params = dict(
+        **prog,
+        **rango.params(),
+        **pag.params(),
         aprobatoria=aprobatoria,
         ciclo=ciclo,
     )
+    if stream:
+        return await streaming.respuesta(db, sql, params, stream)
+    return pag.pagina(await db.aqt(sql, **params))
 
 @router.get("/desercion_escolar")
-def desercion_escolar(
+@serializado
+@cacheado
+async def desercion_escolar(
     programa_like: str = "AEROESPACIAL",
     restar_ri: int = 1,  # 1 = restar RI del total de deserción; 0 = no restar
+    desde: str | None = None,   # rango de cohortes
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
 ):
     """
     Deserción Escolar por cohorte (ciclo_ingreso) con desglose:
       BD, BCPED, BCPES, BCM, BT, RI, Desercion, Porcentaje.
-    Mapea a.estatus usando patrones robustos (abreviado o texto completo).
+    Mapea a.estatus usando patrones robustos (abreviado o texto completo), clasificados
+    una vez por estatus distinto en app/estatus.py.
 
     Fórmula por defecto:
       Desercion = BD + BCPED + BCPES + BCM + BT - (RI si restar_ri=1)
       Porcentaje = 100 * Desercion / COUNT(*)
     """
-    sql = r"""
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    sql = f"""
     WITH base AS (
       SELECT
+        {por.alumno}
         COALESCE(a.ciclo_ingreso, a.ultimo_ciclo_kardex) AS cohorte,
-        UPPER(COALESCE(TRIM(a.estatus), '')) AS estatus
+        dc.ciclo_key AS cohorte_key,
+        e.mascara
       FROM ingenieria.alumnos a
-      WHERE UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), '')) LIKE :programa
+      {estatus.join()}
+      {_join_ciclo("COALESCE(a.ciclo_ingreso, a.ultimo_ciclo_kardex)")}
+      WHERE {SQL_PROGRAMA_ALUMNO} IN :programas
+        {rango.filtro("dc.ciclo_key")}
     ),
     buckets AS (
       SELECT
+        {por.col()}
         cohorte,
+        cohorte_key,
         -- BD: BAJA DEFINITIVA o ' BD ' literal
-        SUM(CASE WHEN estatus REGEXP '(^|[^A-Z0-9])BD($|[^A-Z0-9])|BAJA[ ]+DEFINITIVA' THEN 1 ELSE 0 END) AS BD,
+        SUM(CASE WHEN {estatus.es("BD", "base")} THEN 1 ELSE 0 END) AS BD,
         -- BCPED: BAJA POR CAMBIO DE PROGRAMA
-        SUM(CASE WHEN estatus REGEXP 'BCPED|CAMBIO[ ]+DE[ ]+PROGRAMA' THEN 1 ELSE 0 END) AS BCPED,
+        SUM(CASE WHEN {estatus.es("BCPED", "base")} THEN 1 ELSE 0 END) AS BCPED,
         -- BCPES: BAJA POR CAMBIO DE PLAN
-        SUM(CASE WHEN estatus REGEXP 'BCPES|CAMBIO[ ]+DE[ ]+PLAN' THEN 1 ELSE 0 END) AS BCPES,
+        SUM(CASE WHEN {estatus.es("BCPES", "base")} THEN 1 ELSE 0 END) AS BCPES,
         -- BCM: BAJA POR CAMBIO DE MODALIDAD
-        SUM(CASE WHEN estatus REGEXP '(^|[^A-Z0-9])BCM($|[^A-Z0-9])|CAMBIO[ ]+DE[ ]+MODALIDAD' THEN 1 ELSE 0 END) AS BCM,
+        SUM(CASE WHEN {estatus.es("BCM", "base")} THEN 1 ELSE 0 END) AS BCM,
         -- BT: BAJA TEMPORAL
-        SUM(CASE WHEN estatus REGEXP '(^|[^A-Z0-9])BT($|[^A-Z0-9])|BAJA[ ]+TEMPORAL' THEN 1 ELSE 0 END) AS BT,
+        SUM(CASE WHEN {estatus.es("BT", "base")} THEN 1 ELSE 0 END) AS BT,
         -- RI: REINGRESO INSCRITO
-        SUM(CASE WHEN estatus REGEXP '(^|[^A-Z0-9])RI($|[^A-Z0-9])|REINGRESO[ ]+INSCRITO' THEN 1 ELSE 0 END) AS RI,
+        SUM(CASE WHEN {estatus.es("RI", "base")} THEN 1 ELSE 0 END) AS RI,
         COUNT(*) AS total_alumnos
       FROM base
-      GROUP BY cohorte
+      GROUP BY {por.col()} cohorte_key, cohorte
     )
     SELECT
+      {por.col()}
       cohorte AS Cohorte,
       BD, BCPED, BCPES, BCM, BT, RI,
       GREATEST(
@@ -378,43 +728,58 @@ def desercion_escolar(
       ) AS Porcentaje
     FROM buckets
     WHERE cohorte IS NOT NULL AND cohorte <> ''
-    ORDER BY
-      CAST(SUBSTRING_INDEX(cohorte,'-',1) AS UNSIGNED),
-      CASE WHEN cohorte LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      cohorte;
+    ORDER BY {por.col()} cohorte_key, cohorte;
     """
-    return db.q(
+    return await db.aqt(
         sql,
-        programa=f"%{programa_like.upper()}%",
+        **prog,
+        **rango.params(),
         restar_ri=restar_ri,
     )
 
 # ----------------- NUEVO: lista de cohortes para el selector -----------------
 @router.get("/meta/cohortes")
-def meta_cohortes(programa_like: str = "AEROESPACIAL"):
+@serializado
+@cacheado
+async def meta_cohortes(
+    programa_like: str = "AEROESPACIAL",
+    desde: str | None = None,
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+):
     """
     Cohortes (ciclo_ingreso) detectadas para el programa.
     """
-    sql = """
-    SELECT DISTINCT a.ciclo_ingreso AS cohorte
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    # GROUP BY en lugar de DISTINCT: el ORDER BY usa dc.ciclo_key, que no se devuelve
+    sql = f"""
+    SELECT {por.alumno} a.ciclo_ingreso AS cohorte
     FROM ingenieria.alumnos a
-    WHERE UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), '')) LIKE :programa
+    {_join_ciclo("a.ciclo_ingreso")}
+    WHERE {SQL_PROGRAMA_ALUMNO} IN :programas
       AND COALESCE(NULLIF(TRIM(a.ciclo_ingreso),''), '') <> ''
-    ORDER BY
-      CAST(SUBSTRING_INDEX(a.ciclo_ingreso,'-',1) AS UNSIGNED),
-      CASE WHEN a.ciclo_ingreso LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      a.ciclo_ingreso
+      {rango.filtro("dc.ciclo_key")}
+    GROUP BY {por.grupo_alumno} dc.ciclo_key, a.ciclo_ingreso
+    ORDER BY {por.grupo_alumno} dc.ciclo_key, a.ciclo_ingreso
     """
-    return db.q(sql, programa=f"%{programa_like.upper()}%")
+    return await db.aqt(sql, **prog, **rango.params())
 
 @router.get("/seguimiento_cohorte_resumen")
-def seguimiento_cohorte_resumen(
+@serializado
+@cacheado
+async def seguimiento_cohorte_resumen(
     programa_like: str = "AEROESPACIAL",
     cohorte: str | None = None,
     max_semestres: int = 9,
     re_pasantes: str = r"PASAN|PASANTE",
     re_titulados: str = r"TITUL",
     re_egresados: str = r"EGRES",
+    desde: str | None = None,   # rango de cohortes
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
 ):
     """
     Egresados = alumnos que son PASANTES o TITULADOS (o tienen estatus que matchea 'EGRES').
@@ -423,32 +788,62 @@ def seguimiento_cohorte_resumen(
       - pasantes, titulados = SUM flags
       - egresados = COUNT alumnos con (is_pasante OR is_titulado OR is_egres_flag)
       - s1..s9 = COUNT DISTINCT (alumno, semestre) con datos en boletas
+    En modo lote un alumno cuenta en su programa y en cada carrera de sus boletas.
     """
-    sql = r"""
-    WITH alumnos_programa AS (
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    # los patrones se evalúan contra el diccionario de estatus, no contra cada alumno
+    try:
+        est_pas, est_tit, est_egr = [
+            await estatus.aresolver(db, p) for p in (re_pasantes, re_titulados, re_egresados)
+        ]
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    filtro_cohorte = f"""
+        AND COALESCE(NULLIF(TRIM(a.ciclo_ingreso),''), '') <> ''
+        AND ( :cohorte IS NULL OR a.ciclo_ingreso = :cohorte )
+        {rango.en("a.ciclo_ingreso")}"""
+    if lote:
+        alumnos_programa = f"""
+      SELECT {_bin(SQL_PROGRAMA_ALUMNO)} AS programa, a.matricula, a.ciclo_ingreso
+      FROM ingenieria.alumnos a
+      WHERE {SQL_PROGRAMA_ALUMNO} IN :programas {filtro_cohorte}
+      UNION
+      SELECT pc.programa, a.matricula, a.ciclo_ingreso
+      FROM ingenieria.alumnos a
+      JOIN {HECHOS} h ON h.matricula = a.matricula
+      JOIN {PROGRAMAS} pc ON pc.id = h.carrera_id
+      WHERE h.carrera_id IN :programa_ids {filtro_cohorte}"""
+    else:
+        alumnos_programa = f"""
       SELECT DISTINCT a.matricula, a.ciclo_ingreso
       FROM ingenieria.alumnos a
-      LEFT JOIN estadistica.boletas b ON b.matricula = a.matricula
+      LEFT JOIN {HECHOS} h ON h.matricula = a.matricula
       WHERE (
-              UPPER(COALESCE(NULLIF(TRIM(a.desc_programa),''), '')) LIKE :programa
-           OR UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), ''))      LIKE :programa
-            )
-        AND COALESCE(NULLIF(TRIM(a.ciclo_ingreso),''), '') <> ''
-        AND ( :cohorte IS NULL OR a.ciclo_ingreso = :cohorte )
+              {SQL_PROGRAMA_ALUMNO} IN :programas
+           OR h.carrera_id IN :programa_ids
+            ) {filtro_cohorte}"""
+    sql = f"""
+    WITH alumnos_programa AS ({alumnos_programa}
     ),
     estatus_por_alumno AS (
       SELECT
+        {por.col("ap")}
         ap.ciclo_ingreso AS cohorte,
         ap.matricula,
-        MAX(UPPER(COALESCE(a.estatus,'')) REGEXP :re_pas) AS is_pasante,
-        MAX(UPPER(COALESCE(a.estatus,'')) REGEXP :re_tit) AS is_titulado,
-        MAX(UPPER(COALESCE(a.estatus,'')) REGEXP :re_egr) AS is_egres_flag
+        MAX(COALESCE(e.id, 0) IN :est_pas) AS is_pasante,
+        MAX(COALESCE(e.id, 0) IN :est_tit) AS is_titulado,
+        MAX(COALESCE(e.id, 0) IN :est_egr) AS is_egres_flag
       FROM alumnos_programa ap
       JOIN ingenieria.alumnos a ON a.matricula = ap.matricula
-      GROUP BY ap.ciclo_ingreso, ap.matricula
+      {estatus.join()}
+      GROUP BY {por.col("ap")} ap.ciclo_ingreso, ap.matricula
     ),
     kpis AS (
       SELECT
+        {por.col()}
         cohorte,
         COUNT(*) AS ingreso,
         SUM(is_pasante)  AS pasantes,
@@ -456,30 +851,29 @@ def seguimiento_cohorte_resumen(
         -- egresados como UNION lógica (no suma aritmética) para no duplicar:
         SUM(CASE WHEN (is_pasante = 1 OR is_titulado = 1 OR is_egres_flag = 1) THEN 1 ELSE 0 END) AS egresados
       FROM estatus_por_alumno
-      GROUP BY cohorte
+      GROUP BY {por.col()} cohorte
     ),
     sem_map AS (
       SELECT DISTINCT
         ap.matricula,
-        CASE
-          WHEN TRIM(b.grado) REGEXP '^[0-9]+' THEN CAST(REGEXP_SUBSTR(TRIM(b.grado),'^[0-9]+') AS UNSIGNED)
-          ELSE NULL
-        END AS sem
+        h.semestre_n AS sem
       FROM alumnos_programa ap
-      JOIN estadistica.boletas b ON b.matricula = ap.matricula
-      WHERE COALESCE(TRIM(b.grado),'') <> ''
+      JOIN {HECHOS} h ON h.matricula = ap.matricula
+      WHERE h.semestre_n IS NOT NULL
     ),
     sem_agg AS (
       SELECT
+        {por.col("ap")}
         ap.ciclo_ingreso AS cohorte,
         sm.sem,
         COUNT(*) AS n_alumnos_sem
       FROM alumnos_programa ap
       JOIN sem_map sm ON sm.matricula = ap.matricula
       WHERE sm.sem IS NOT NULL AND sm.sem BETWEEN 1 AND 12
-      GROUP BY ap.ciclo_ingreso, sm.sem
+      GROUP BY {por.col("ap")} ap.ciclo_ingreso, sm.sem
     )
     SELECT
+      {por.col("k")}
       k.cohorte,
       k.ingreso,
       COALESCE(SUM(CASE WHEN sa.sem = 1 THEN sa.n_alumnos_sem END),0) AS s1,
@@ -497,27 +891,99 @@ def seguimiento_cohorte_resumen(
       ROUND(100.0 * k.titulados / NULLIF(k.ingreso,0), 1) AS pct_titulados,
       ROUND(100.0 * k.egresados / NULLIF(k.ingreso,0), 1) AS pct_egresados
     FROM kpis k
-    LEFT JOIN sem_agg sa ON sa.cohorte = k.cohorte
+    LEFT JOIN sem_agg sa ON sa.cohorte = k.cohorte {"AND sa.programa = k.programa" if lote else ""}
+    {_join_ciclo("k.cohorte")}
     GROUP BY
-      k.cohorte, k.ingreso, k.pasantes, k.titulados, k.egresados
-    ORDER BY
-      CAST(SUBSTRING_INDEX(k.cohorte,'-',1) AS UNSIGNED),
-      CASE WHEN k.cohorte LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      k.cohorte
+      {por.col("k")} dc.ciclo_key, k.cohorte, k.ingreso, k.pasantes, k.titulados, k.egresados
+    ORDER BY {por.col("k")} dc.ciclo_key, k.cohorte
     """
-    return db.q(
+    return await db.aqt(
       sql,
-      programa=f"%{programa_like.upper()}%",
+      **prog,
+      **rango.params(),
       cohorte=cohorte,
-      re_pas=re_pasantes.upper(),
-      re_tit=re_titulados.upper(),
-      re_egr=re_egresados.upper(),
+      est_pas=est_pas,
+      est_tit=est_tit,
+      est_egr=est_egr,
     )
 
+@router.get("/cohortes/matriz")
+@serializado
+@cacheado
+async def cohortes_matriz(
+    programa_like: str = "AEROESPACIAL",
+    cohorte: list[str] | None = Query(None),   # ?cohorte=2019-SEM-AGO/DIC&cohorte=... (vacío = todas)
+    por_semestre: bool = False,
+    desde: str | None = None,   # rango de ciclos (columnas de la matriz)
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+):
+    """
+    Matriz de retención cohorte × ciclo (× semestre con por_semestre=true), leída del
+    cubo precalculado (app/cohortes.py) sin tocar boletas ni alumnos:
+      - ingreso   = alumnos de la cohorte
+      - activos   = alumnos de la cohorte con boletas en el ciclo (en ese semestre)
+      - retencion = 100 * activos / ingreso
+    """
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like, lote)
+    cohortes = [c.strip() for c in cohorte or [] if c.strip()]
+    semestre = "c.semestre," if por_semestre else ""
+    ingreso_por = "programa_id," if lote else ""
+    sql = f"""
+    SELECT
+      {por.col("p")}
+      c.cohorte,
+      i.ingreso,
+      c.ciclo,
+      {semestre}
+      SUM(c.activos) AS activos,
+      ROUND(100.0 * SUM(c.activos) / NULLIF(i.ingreso, 0), 1) AS retencion
+    FROM {CUBO} c
+    JOIN (
+      SELECT {ingreso_por} cohorte, SUM(ingreso) AS ingreso
+      FROM {INGRESO}
+      WHERE programa_id IN :programa_ids
+      GROUP BY {ingreso_por} cohorte
+    ) i ON i.cohorte = c.cohorte {"AND i.programa_id = c.programa_id" if lote else ""}
+    {"JOIN " + PROGRAMAS + " p ON p.id = c.programa_id" if lote else ""}
+    WHERE c.programa_id IN :programa_ids
+      {"AND c.cohorte IN :cohortes" if cohortes else ""}
+      {rango.filtro("c.ciclo_key")}
+    GROUP BY {por.col("p")} c.cohorte, i.ingreso, c.ciclo_key, c.ciclo {", c.semestre" if por_semestre else ""}
+    ORDER BY c.ciclo_key, c.ciclo {", c.semestre" if por_semestre else ""}
+    """
+    params = {"programa_ids": prog["programa_ids"], **rango.params()}
+    if cohortes:
+        params["cohortes"] = cohortes
+    rows = await db.aq(sql, **params)
+    # cohortes en orden cronológico; dentro de cada una se conserva el orden por ciclo
+    if lote:
+        return sorted(rows, key=lambda r: (r["programa"], clave_orden(r["cohorte"])))
+    return sorted(rows, key=lambda r: clave_orden(r["cohorte"]))
+
+_COLUMNAS_CEDULA = [
+    "Clave", "Materia", "Ciclo", "Semestre", "No. Inscritos", "Promedio", "Arriba del promedio", "Porcentaje",
+]
+
 @router.get("/cedula_322_detalle")
-def cedula_322_detalle(
+@serializado
+@cacheado
+async def cedula_322_detalle(
     programa_like: str = "AEROESPACIAL",
     ciclo: str | None = None,   # ej: "2022-SEM-AGO/DIC" (opcional)
+    stream: str | None = None,  # "ndjson" | "array": respuesta en streaming
+    motor: str | None = None,   # "sql" | "memoria" (default: KPI_MOTOR)
+    desde: str | None = None,
+    hasta: str | None = None,
+    programas_: list[str] | None = _param_lote(),
+    top_n: int | None = None,          # las N primeras materias por ciclo
+    min_inscritos: int | None = None,  # sólo materias con al menos N inscritos
+    clave_prefijo: str | None = None,  # sólo claves que empiezan así
+    limite: int | None = None,         # filas por página (paginación por llave)
+    cursor: str | None = None,         # `siguiente` de la página anterior
 ):
     """
     Cédula 322-like por materia y ciclo:
@@ -525,83 +991,211 @@ def cedula_322_detalle(
       - Calcula promedio por materia/ciclo (AVG calif_final)
       - Cuenta alumnos con calif_final >= promedio
       - Devuelve: Clave, Materia, Ciclo, Semestre, No. Inscritos, Promedio, ArribaProm, Porcentaje
+    Paginación y filtros como en /reprobacion_detalle; el orden es (ciclo, porcentaje
+    desc, inscritos desc, clave).
     """
-    sql = r"""
+    lote = _lote(programas_)
+    por = _PorPrograma(bool(lote))
+    rango = _PorCiclo(desde, hasta)
+    pag = _PorMateria(
+        por,
+        [
+            "d._ciclo_key",
+            "COALESCE(d.`Ciclo`, '')",
+            "-d.`Porcentaje`",
+            "-d.`No. Inscritos`",
+            "COALESCE(d.`Clave`, '')",
+            "COALESCE(d.`Materia`, '')",
+        ],
+        top_n, min_inscritos, clave_prefijo, limite, cursor,
+    )
+    if stream and limite is not None:
+        raise HTTPException(400, "stream y limite no se combinan")
+    prog = await _filtro(programa_like, lote)
+    if not lote and _en_memoria(motor) and not pag.activo:
+        filas = (await memoria.acargar(db)).cedula_322_detalle(prog["programa_ids"], ciclo, rango.rango)
+        return streaming.respuesta_filas(filas, stream) if stream else filas
+    seleccion = f"""
+    SELECT
+      {por.col("f")}
+      {pag.ciclo_key("f")}
+      f.clave                                        AS `Clave`,
+      COALESCE(m.materia, '(SIN NOMBRE)')            AS `Materia`,
+      f.ciclo                                        AS `Ciclo`,
+      s.semestre                                     AS `Semestre`,
+      s.inscritos                                    AS `No. Inscritos`,
+      ROUND(s.promedio, 1)                           AS `Promedio`,
+      SUM(CASE WHEN f.calif_final >= s.promedio THEN 1 ELSE 0 END)
+                                                    AS `Arriba del promedio`,
+      ROUND(100.0 * SUM(CASE WHEN f.calif_final >= s.promedio THEN 1 ELSE 0 END) / NULLIF(s.inscritos,0), 1)
+                                                    AS `Porcentaje`
+    FROM final_alumno_materia f
+    JOIN stats s ON s.clave = f.clave AND s.ciclo = f.ciclo {"AND s.programa = f.programa" if lote else ""}
+    LEFT JOIN ingenieria.materias m ON m.clave = f.clave
+    GROUP BY {por.col("f")} f.clave, `Materia`, f.ciclo_key, f.ciclo, s.semestre, s.inscritos, s.promedio
+    """
+    orden = f"""
+      {por.col("f")}
+      f.ciclo_key,
+      f.ciclo,
+      `Porcentaje` DESC,
+      `No. Inscritos` DESC"""
+    sql = f"""
     WITH base AS (
-      SELECT
-        b.matricula,
-        b.clave,
-        b.ciclo,
-        TRIM(b.grado) AS grado_txt,
-        CASE
-          WHEN b.calificacion REGEXP '^[0-9]+(\.[0-9]+)?$'
-          THEN CAST(b.calificacion AS DECIMAL(10,2))
-          ELSE NULL
-        END AS calif_num
-      FROM estadistica.boletas b
-      LEFT JOIN ingenieria.alumnos a ON a.matricula = b.matricula
-      WHERE UPPER(COALESCE(NULLIF(TRIM(b.carrera),''), TRIM(a.desc_programa), '')) LIKE :programa
-        AND ( :ciclo IS NULL OR :ciclo = '' OR b.ciclo = :ciclo )
-    ),
-    base_sem AS (
-      SELECT
-        matricula,
-        clave,
-        ciclo,
-        CASE
-          WHEN grado_txt REGEXP '^[0-9]+'
-          THEN CAST(REGEXP_SUBSTR(grado_txt, '^[0-9]+') AS UNSIGNED)
-          ELSE 0
-        END AS semestre_n,
-        calif_num
-      FROM base
+      SELECT {por.base} h.matricula, h.clave, h.ciclo, h.ciclo_key, h.semestre_n, h.calif_num
+      FROM {HECHOS} h
+      {por.join}
+      WHERE h.programa_id IN :programa_ids
+        AND ( :ciclo IS NULL OR :ciclo = '' OR h.ciclo = :ciclo )
+        {rango.filtro("h.ciclo_key")}
     ),
     final_alumno_materia AS (
       -- Mejor calificación por alumno-materia-ciclo y el semestre "más bajo" observado
       SELECT
+        {por.col()}
         matricula,
         clave,
         ciclo,
-        MIN(semestre_n) AS semestre,
+        ciclo_key,
+        MIN(COALESCE(semestre_n, 0)) AS semestre,
         MAX(calif_num)  AS calif_final
-      FROM base_sem
-      GROUP BY matricula, clave, ciclo
+      FROM base
+      {pag.filtro()}
+      GROUP BY {por.col()} matricula, clave, ciclo_key, ciclo
     ),
     stats AS (
       -- Promedio y conteos por materia-ciclo
       SELECT
+        {por.col("f")}
         f.clave,
         f.ciclo,
         MIN(f.semestre)           AS semestre,
         COUNT(*)                  AS inscritos,
         AVG(f.calif_final)        AS promedio
       FROM final_alumno_materia f
-      GROUP BY f.clave, f.ciclo
+      GROUP BY {por.col("f")} f.clave, f.ciclo
+      {pag.minimo("COUNT(*)")}
     )
-    SELECT
-      f.clave                                        AS `Clave`,
-      COALESCE(m.materia, '(SIN NOMBRE)')            AS `Materia`,
-      f.ciclo                                        AS `Ciclo`,
-      s.semestre                                     AS `Semestre`,
-      s.inscritos                                    AS `No. Inscritos`,
-      ROUND(s.promedio, 1)                           AS `Promedio`,
-      SUM(CASE WHEN f.calif_final >= s.promedio THEN 1 ELSE 0 END)
-                                                    AS `Arriba del promedio`,
-      ROUND(100.0 * SUM(CASE WHEN f.calif_final >= s.promedio THEN 1 ELSE 0 END) / NULLIF(s.inscritos,0), 1)
-                                                    AS `Porcentaje`
-    FROM final_alumno_materia f
-    JOIN stats s ON s.clave = f.clave AND s.ciclo = f.ciclo
-    LEFT JOIN ingenieria.materias m ON m.clave = f.clave
-    GROUP BY f.clave, `Materia`, f.ciclo, s.semestre, s.inscritos, s.promedio
-    ORDER BY
-      CAST(SUBSTRING_INDEX(f.ciclo,'-',1) AS UNSIGNED),
-      CASE WHEN f.ciclo LIKE '%ENE/JUN' THEN 1 ELSE 2 END,
-      f.ciclo,
-      `Porcentaje` DESC,
-      `No. Inscritos` DESC;
+    {pag.envolver(seleccion, _COLUMNAS_CEDULA, orden)};
     """
-    return db.q(
-        sql,
-        programa=f"%{programa_like.upper()}%",
+    params = dict(
+        **prog,
+        **rango.params(),
+        **pag.params(),
         ciclo=ciclo,
     )
+    if stream:
+        return await streaming.respuesta(db, sql, params, stream)
+    return pag.pagina(await db.aqt(sql, **params))
+
+# --- Dashboard (bundle) -------------------------------------------------------
+@router.get("/dashboard")
+@serializado
+@cacheado
+async def dashboard(
+    programa_like: str = "AEROESPACIAL",
+    aprobatoria: float = 6.0,
+    contar_no_numericas: bool = False,
+    desde: str | None = None,
+    hasta: str | None = None,
+):
+    """
+    Series del dashboard en una sola llamada:
+      - inscritos_por_ciclo y reprobacion salen de UNA pasada sobre la tabla de hechos;
+        final_alumno_materia (mejor calificación por matrícula-clave-ciclo) se calcula una
+        sola vez y alimenta ambos conteos.
+      - desercion y cohortes salen de UNA pasada sobre ingenieria.alumnos.
+    Las dos consultas corren en paralelo. Mismos valores que /inscritos_por_ciclo,
+    /reprobacion, /desercion y /meta/cohortes (también con desde/hasta).
+    """
+    rango = _PorCiclo(desde, hasta)
+    prog = await _filtro(programa_like)
+    sql_boletas = f"""
+    WITH base AS (
+      SELECT h.matricula, h.clave, h.ciclo, h.ciclo_key, h.calif_num
+      FROM {HECHOS} h
+      WHERE h.programa_id IN :programa_ids
+    ),
+    escala AS (
+      SELECT COALESCE(MAX(calif_num), 0) AS max_val FROM base
+    ),
+    params AS (
+      SELECT CASE
+               WHEN max_val <= 1.0 THEN CASE WHEN :aprobatoria > 1.0 THEN :aprobatoria/100.0 ELSE :aprobatoria END
+               WHEN max_val <= 10.0 THEN CASE WHEN :aprobatoria > 10.0 THEN :aprobatoria/10.0 ELSE :aprobatoria END
+               ELSE :aprobatoria
+             END AS aprob_calc
+      FROM escala
+    ),
+    final_alumno_materia AS (
+      SELECT matricula, clave, ciclo, ciclo_key, MAX(calif_num) AS calif_final,
+             MAX(calif_num IS NOT NULL) AS evaluada
+      FROM base
+      {rango.donde("ciclo_key")}
+      GROUP BY matricula, clave, ciclo_key, ciclo
+    ),
+    por_ciclo AS (
+      SELECT
+        f.ciclo, f.ciclo_key,
+        COUNT(DISTINCT f.matricula) AS inscritos,
+        SUM(f.evaluada) AS evaluadas,
+        SUM(CASE
+              WHEN f.calif_final IS NOT NULL AND f.calif_final < (SELECT aprob_calc FROM params) THEN 1
+              WHEN f.calif_final IS NULL AND :inc_non_num = 1 THEN 1
+              ELSE 0
+            END) AS reprobados
+      FROM final_alumno_materia f
+      GROUP BY f.ciclo_key, f.ciclo
+    )
+    SELECT
+      p.ciclo, p.inscritos, p.evaluadas, p.reprobados,
+      ROUND(100.0 * p.reprobados / NULLIF(p.evaluadas, 0), 2) AS porcentaje_reprobacion,
+      (SELECT aprob_calc FROM params) AS umbral_usado
+    FROM por_ciclo p
+    ORDER BY p.ciclo_key, p.ciclo
+    """
+    sql_alumnos = f"""
+    SELECT COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso) AS ciclo,
+           a.ciclo_ingreso AS cohorte,
+           SUM(CASE WHEN {estatus.es("DESERTOR")} THEN 1 ELSE 0 END) AS desertores,
+           COUNT(*) AS total
+    FROM ingenieria.alumnos a
+    {estatus.join()}
+    WHERE {SQL_PROGRAMA_ALUMNO} IN :programas
+    GROUP BY COALESCE(a.ultimo_ciclo_kardex, a.ciclo_ingreso), a.ciclo_ingreso
+    """
+    por_ciclo, por_alumno = await asyncio.gather(
+        db.aq(
+            sql_boletas,
+            **prog,
+            **rango.params(),
+            aprobatoria=aprobatoria,
+            inc_non_num=1 if contar_no_numericas else 0,
+        ),
+        db.aq(sql_alumnos, **prog),
+    )
+
+    # el rango se aplica aquí (mismo ordinal que la dimensión): desercion por ciclo y
+    # cohortes por ciclo de ingreso, como en /desercion y /meta/cohortes
+    desercion: dict = {}
+    cohortes = set()
+    for r in por_alumno:
+        if rango.contiene(r["ciclo"]):
+            d = desercion.setdefault(r["ciclo"], [0, 0])
+            d[0] += int(r["desertores"])
+            d[1] += int(r["total"])
+        if r["cohorte"] is not None and r["cohorte"].strip() != "" and rango.contiene(r["cohorte"]):
+            cohortes.add(r["cohorte"])
+
+    return {
+        "inscritos_por_ciclo": [{"ciclo": r["ciclo"], "inscritos": r["inscritos"]} for r in por_ciclo],
+        "reprobacion": [
+            {k: r[k] for k in ("ciclo", "evaluadas", "reprobados", "porcentaje_reprobacion", "umbral_usado")}
+            for r in por_ciclo
+        ],
+        "desercion": [
+            {"ciclo": c, "desertores": d, "total": t, "porcentaje": pct(d, t, 2)}
+            for c, (d, t) in sorted(desercion.items(), key=lambda kv: clave_orden(kv[0]))
+        ],
+        "cohortes": [{"cohorte": c} for c in sorted(cohortes, key=clave_orden)],
+    }
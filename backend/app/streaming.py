@@ -0,0 +1,89 @@
+"""
+Respuestas en streaming para resultados grandes.
+
+Formatos:
+  - ndjson : un objeto JSON por línea (application/x-ndjson)
+  - array  : un arreglo JSON enviado por partes (application/json)
+
+Los valores se codifican igual que jsonable_encoder de FastAPI (Decimal -> int/float,
+fechas -> ISO 8601) para que el resultado sea idéntico al de la ruta normal.
+"""
+import asyncio
+import datetime
+import decimal
+import itertools
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "array": "application/json",
+}
+
+# filas por escritura al socket
+LOTE = 500
+
+_FIN = object()
+
+
+def _default(v):
+    if isinstance(v, decimal.Decimal):
+        return int(v) if v.as_tuple().exponent >= 0 else float(v)
+    if isinstance(v, (datetime.date, datetime.datetime, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, bytes):
+        return v.decode()
+    raise TypeError(f"Tipo no serializable: {type(v).__name__}")
+
+
+def _dumps(row: dict) -> str:
+    return json.dumps(row, default=_default, ensure_ascii=False)
+
+
+def _ndjson(filas):
+    buf = []
+    for row in filas:
+        buf.append(_dumps(row))
+        if len(buf) >= LOTE:
+            yield "\n".join(buf) + "\n"
+            buf.clear()
+    if buf:
+        yield "\n".join(buf) + "\n"
+
+
+def _array(filas):
+    yield "["
+    buf = []
+    primero = True
+    for row in filas:
+        buf.append(_dumps(row))
+        if len(buf) >= LOTE:
+            yield ("" if primero else ",") + ",".join(buf)
+            primero = False
+            buf.clear()
+    if buf:
+        yield ("" if primero else ",") + ",".join(buf)
+    yield "]"
+
+
+def respuesta_filas(filas, formato: str) -> StreamingResponse:
+    """StreamingResponse sobre cualquier iterable de dicts (p.ej. el motor en memoria)."""
+    if formato not in FORMATOS:
+        raise HTTPException(400, f"stream debe ser uno de: {', '.join(FORMATOS)}")
+    cuerpo = _ndjson(filas) if formato == "ndjson" else _array(filas)
+    return StreamingResponse(cuerpo, media_type=FORMATOS[formato])
+
+
+async def respuesta(db, sql: str, params: dict, formato: str) -> StreamingResponse:
+    """
+    Ejecuta `sql` con cursor de servidor y devuelve un StreamingResponse. La primera fila
+    se lee antes de responder (en un hilo): así el turno de admisión y los errores de la
+    consulta (503/504) llegan como respuesta normal y no como un cuerpo cortado.
+    """
+    if formato not in FORMATOS:
+        raise HTTPException(400, f"stream debe ser uno de: {', '.join(FORMATOS)}")
+    filas = db.stream(sql, **params)
+    primera = await asyncio.to_thread(next, filas, _FIN)
+    return respuesta_filas(filas if primera is _FIN else itertools.chain([primera], filas), formato)
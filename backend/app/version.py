@@ -0,0 +1,116 @@
+"""
+Versión de los datos: un contador en `cacei.version_datos` (una sola fila) que
+hechos.refrescar() incrementa en la misma transacción del refresco. Como la importación
+siempre termina refrescando la tabla de hechos, la versión cambia con cada importación
+y con cada refresco de derivados, lo haga el proceso que sea.
+
+Cada proceso la relee como mucho cada DATA_VERSION_TTL segundos (default 2; una lectura
+por llave primaria). Si cambió —refresco hecho desde otro worker o desde
+`python -m app.importador`— descarta sus cachés en memoria (resultados, programas,
+estatus, motor en memoria) y pide una ronda de precálculo (app/precalculo.py): así la
+invalidación alcanza a todos los procesos y no sólo al que refrescó.
+
+Con la versión se arman los ETag de las respuestas KPI (app/condicional.py).
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from . import hechos
+
+VERSION = f"{hechos.SCHEMA}.version_datos"
+TTL = float(os.getenv("DATA_VERSION_TTL", "2"))
+
+DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {VERSION} (
+      id           TINYINT UNSIGNED NOT NULL PRIMARY KEY,
+      numero       BIGINT UNSIGNED NOT NULL,
+      actualizado  DATETIME(6) NOT NULL
+    )
+    """,
+]
+
+SQL_INCREMENTAR = f"""
+INSERT INTO {VERSION} (id, numero, actualizado) VALUES (1, 1, UTC_TIMESTAMP(6))
+ON DUPLICATE KEY UPDATE numero = numero + 1, actualizado = UTC_TIMESTAMP(6)
+"""
+
+
+@dataclass(frozen=True)
+class Version:
+    numero: int
+    actualizado: datetime   # UTC
+
+
+CERO = Version(0, datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+_lock = threading.Lock()
+_actual: Version | None = None
+_leida = 0.0   # time.monotonic() de la última lectura
+
+
+def incrementar(conn) -> None:
+    """Se llama dentro de la transacción de hechos.refrescar()."""
+    conn.execute(text(SQL_INCREMENTAR))
+
+
+def releer() -> None:
+    """Fuerza a que la siguiente consulta de la versión vaya a la base."""
+    global _leida
+    _leida = 0.0
+
+
+def _vigente() -> bool:
+    return _actual is not None and time.monotonic() - _leida < TTL
+
+
+def _descartar(numero: int) -> None:
+    # imports tardíos: estos módulos importan hechos (y hechos importa éste)
+    from . import estatus, memoria, precalculo, programas
+    from .cache import resultados
+
+    resultados.nueva_version(numero)
+    programas.invalidar()
+    estatus.invalidar()
+    memoria.invalidar()
+    precalculo.programar()
+
+
+def actual(db) -> Version:
+    """Versión vigente de los datos (releída de la base si pasó más de TTL segundos)."""
+    global _actual, _leida
+    if _vigente():
+        return _actual
+    hechos.asegurar(db)
+    rows = db.q(f"SELECT numero, actualizado FROM {VERSION} WHERE id = 1")
+    v = Version(int(rows[0]["numero"]), rows[0]["actualizado"].replace(tzinfo=timezone.utc)) if rows else CERO
+    with _lock:
+        previa, _actual, _leida = _actual, v, time.monotonic()
+    if previa is None:
+        from .cache import resultados
+
+        resultados.nueva_version(v.numero)   # la caché compartida puede venir de otra versión
+    elif previa.numero != v.numero:
+        _descartar(v.numero)
+    return v
+
+
+async def aactual(db) -> Version:
+    if _vigente():
+        return _actual
+    return await asyncio.to_thread(actual, db)
+
+
+def estado() -> dict:
+    v = _actual
+    return {
+        "numero": v.numero if v else None,
+        "actualizado": v.actualizado.isoformat() if v else None,
+        "ttl": TTL,
+    }
@@ -0,0 +1,20 @@
+"""
+Banco de pruebas de rendimiento de la API de estadísticas.
+
+  - bench.generar : llena estadistica.boletas, ingenieria.alumnos e ingenieria.materias
+                    con datos sintéticos (10k → 10M boletas) y refresca los derivados.
+  - bench.medir   : latencia p50/p95/p99 y filas/s por endpoint, reporte JSON.
+  - bench.carga   : N clientes concurrentes durante T segundos: throughput y latencias.
+  - bench.comparar: compara dos reportes y sale con error si algún endpoint empeoró.
+  - bench.equivalencia: mismas respuestas con motor=sql y motor=memoria.
+
+Corre contra el MySQL del docker-compose (el SQL de la API es de MySQL 8: CTEs,
+REGEXP_SUBSTR, collations), desde backend/ y con la API levantada:
+    python -m bench.generar --escala 1m --reemplazar
+    python -m bench.medir --salida base.json
+    python -m bench.carga --clientes 16 --duracion 60 --salida carga.json
+    python -m bench.comparar base.json nuevo.json
+    python -m bench.equivalencia
+Sólo usa la biblioteca estándar (más app.db para el generador y la cobertura de
+bench.equivalencia).
+"""
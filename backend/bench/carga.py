@@ -0,0 +1,115 @@
+"""
+Carga concurrente: N clientes durante T segundos, cada uno pide endpoints al azar
+(de la lista de bench.comun o los elegidos con --endpoint) sin pausa entre peticiones.
+
+Reporta peticiones/s, errores y latencias globales y por endpoint. Con --variar la
+`aprobatoria` cambia en cada petición para que la caché de resultados no las absorba.
+
+Uso (desde backend/, con la API levantada):
+    python -m bench.carga [--clientes 8] [--duracion 30] [--endpoint NOMBRE ...]
+                          [--variar] [--param k=v ...] [--salida carga.json]
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from . import comun
+
+
+def carga(
+    base: str,
+    programa_like: str,
+    clientes: int = 8,
+    duracion: float = 30.0,
+    endpoints: list | None = None,
+    extra: dict | None = None,
+    variar: bool = False,
+    semilla: int = 1,
+) -> dict:
+    cohorte = comun.cohorte_de_prueba(base, programa_like)
+    elegidos = [
+        (nombre, ruta, comun.preparar_params(params, programa_like, cohorte, extra or {}, ruta))
+        for nombre, ruta, params in comun.elegir(endpoints)
+    ]
+    tiempos: dict = defaultdict(list)
+    errores: dict = defaultdict(int)
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def cliente(i: int):
+        rnd = random.Random(semilla + i)
+        while time.perf_counter() < fin:
+            nombre, ruta, params = rnd.choice(elegidos)
+            if variar and "aprobatoria" in params:
+                params = {**params, "aprobatoria": round(rnd.uniform(5.0, 7.0), 2)}
+            estado, _, segundos = comun.pedir(comun.url_de(base, ruta, params))
+            with lock:
+                if estado == 200:
+                    tiempos[nombre].append(segundos)
+                else:
+                    errores[nombre] += 1
+
+    t0 = time.perf_counter()
+    hilos = [threading.Thread(target=cliente, args=(i,), daemon=True) for i in range(clientes)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    transcurrido = time.perf_counter() - t0
+
+    todos = [s for lista in tiempos.values() for s in lista]
+    total = len(todos) + sum(errores.values())
+    return {
+        "global": {
+            **comun.resumen(todos),
+            "peticiones": total,
+            "errores": sum(errores.values()),
+            "peticiones_por_s": round(total / transcurrido, 2) if transcurrido else 0.0,
+            "segundos": round(transcurrido, 2),
+        },
+        "endpoints": {
+            nombre: {**comun.resumen(tiempos[nombre]), "errores": errores[nombre]}
+            for nombre, _, _ in elegidos
+        },
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Throughput de la API con N clientes concurrentes")
+    ap.add_argument("--url", default=comun.URL)
+    ap.add_argument("--programa-like", default="AEROESPACIAL")
+    ap.add_argument("--clientes", type=int, default=8)
+    ap.add_argument("--duracion", type=float, default=30.0, help="segundos")
+    ap.add_argument("--endpoint", action="append", help="sólo estos endpoints (repetible)")
+    ap.add_argument("--param", action="append", help="parámetro extra llave=valor")
+    ap.add_argument("--variar", action="store_true", help="aprobatoria al azar para esquivar la caché")
+    ap.add_argument("--semilla", type=int, default=1)
+    ap.add_argument("--salida", help="archivo JSON (default: stdout)")
+    args = ap.parse_args()
+
+    extra = comun.parametros_extra(args.param)
+    reporte = {
+        "tipo": "carga",
+        **comun.entorno(args.url),
+        "parametros": {
+            "programa_like": args.programa_like,
+            "clientes": args.clientes,
+            "duracion": args.duracion,
+            "variar": args.variar,
+            "extra": extra,
+        },
+    }
+    reporte.update(carga(
+        args.url, args.programa_like, args.clientes, args.duracion,
+        args.endpoint, extra, args.variar, args.semilla,
+    ))
+    g = reporte["global"]
+    print(
+        f"{g['peticiones']} peticiones en {g['segundos']} s: {g['peticiones_por_s']} req/s, "
+        f"p50 {g['p50_ms']} ms, p99 {g['p99_ms']} ms, errores {g['errores']}",
+        file=sys.stderr,
+    )
+    comun.guardar(reporte, args.salida)
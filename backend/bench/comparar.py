@@ -0,0 +1,71 @@
+"""
+Compara dos reportes de bench.medir o bench.carga (base y nuevo).
+
+Un endpoint es regresión si su métrica (p95 por default) empeora más que --umbral
+(relativo) y más que --minimo-ms (absoluto, para no marcar ruido en consultas de pocos
+ms). En reportes de carga también cuenta una caída de peticiones/s mayor al umbral.
+Sale con código 1 si hay regresiones (para CI).
+
+Uso:
+    python -m bench.comparar base.json nuevo.json [--metrica p95_ms] [--umbral 0.10] [--minimo-ms 5]
+"""
+import argparse
+import json
+import sys
+
+
+def comparar(base: dict, nuevo: dict, metrica: str = "p95_ms", umbral: float = 0.10, minimo_ms: float = 5.0) -> dict:
+    avisos = []
+    if base.get("tipo") != nuevo.get("tipo"):
+        avisos.append(f"tipos distintos: {base.get('tipo')} vs {nuevo.get('tipo')}")
+    filas_base, filas_nuevo = ((r.get("datos") or {}).get("filas") for r in (base, nuevo))
+    if filas_base != filas_nuevo:
+        avisos.append(f"datos distintos: {filas_base} vs {filas_nuevo} filas de hechos")
+
+    filas_tabla, regresiones = [], []
+    for nombre, b in base.get("endpoints", {}).items():
+        n = nuevo.get("endpoints", {}).get(nombre)
+        if n is None or not b.get("n") or not n.get("n"):
+            continue
+        antes, ahora = b[metrica], n[metrica]
+        cambio = (ahora - antes) / antes if antes else 0.0
+        regresion = cambio > umbral and ahora - antes > minimo_ms
+        filas_tabla.append({"endpoint": nombre, "base": antes, "nuevo": ahora, "cambio": round(cambio, 3)})
+        if regresion:
+            regresiones.append(nombre)
+
+    if "global" in base and "global" in nuevo:
+        antes, ahora = base["global"]["peticiones_por_s"], nuevo["global"]["peticiones_por_s"]
+        cambio = (ahora - antes) / antes if antes else 0.0
+        filas_tabla.append({"endpoint": "(peticiones/s)", "base": antes, "nuevo": ahora, "cambio": round(cambio, 3)})
+        if -cambio > umbral:
+            regresiones.append("(peticiones/s)")
+
+    return {"metrica": metrica, "umbral": umbral, "avisos": avisos, "filas": filas_tabla, "regresiones": regresiones}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compara dos reportes de bench y detecta regresiones")
+    ap.add_argument("base")
+    ap.add_argument("nuevo")
+    ap.add_argument("--metrica", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms", "media_ms"])
+    ap.add_argument("--umbral", type=float, default=0.10, help="empeoramiento relativo tolerado (0.10 = 10%%)")
+    ap.add_argument("--minimo-ms", type=float, default=5.0)
+    ap.add_argument("--json", action="store_true", help="imprime el resultado como JSON")
+    args = ap.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding="utf-8") as f:
+        nuevo = json.load(f)
+    r = comparar(base, nuevo, args.metrica, args.umbral, args.minimo_ms)
+    if args.json:
+        print(json.dumps(r, indent=2, ensure_ascii=False))
+    else:
+        for a in r["avisos"]:
+            print(f"AVISO: {a}")
+        print(f"{'endpoint':32s} {'base':>10s} {'nuevo':>10s} {'cambio':>8s}  ({args.metrica})")
+        for fila in r["filas"]:
+            marca = "  <-- regresión" if fila["endpoint"] in r["regresiones"] else ""
+            print(f"{fila['endpoint']:32s} {fila['base']:10.1f} {fila['nuevo']:10.1f} {fila['cambio']:+8.1%}{marca}")
+    sys.exit(1 if r["regresiones"] else 0)
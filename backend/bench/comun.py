@@ -0,0 +1,152 @@
+"""Cliente HTTP, catálogo de endpoints y estadísticas compartidas por medir/carga/comparar."""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+URL = os.getenv("BENCH_URL", "http://localhost:8000")
+VERSION_REPORTE = 1
+
+# (nombre, ruta, parámetros). `nombre` es el del handler: el que acepta
+# /api/admin/cache/invalidate?endpoint=... y el que etiqueta /metrics.
+# "{cohorte}" se reemplaza por una cohorte real del programa (ver cohorte_de_prueba).
+ENDPOINTS = [
+    ("meta_programas", "/api/meta/programas", {}),
+    ("inscritos_por_ciclo", "/api/inscritos_por_ciclo", {}),
+    ("indice_reprobacion", "/api/reprobacion", {"aprobatoria": 6}),
+    ("desercion", "/api/desercion", {}),
+    ("seguimiento_cohorte", "/api/cohorte", {"ciclo_ingreso": "{cohorte}"}),
+    ("cedula_322", "/api/cedula_322", {}),
+    ("reprobacion_detalle", "/api/reprobacion_detalle", {"aprobatoria": 6}),
+    ("desercion_escolar", "/api/desercion_escolar", {}),
+    ("meta_cohortes", "/api/meta/cohortes", {}),
+    ("seguimiento_cohorte_resumen", "/api/seguimiento_cohorte_resumen", {}),
+    ("cohortes_matriz", "/api/cohortes/matriz", {}),
+    ("cedula_322_detalle", "/api/cedula_322_detalle", {}),
+    ("dashboard", "/api/dashboard", {"aprobatoria": 6}),
+]
+
+
+def pedir(url: str, metodo: str = "GET", timeout: float = 300) -> tuple:
+    """(status, cuerpo, segundos). Status 0 = error de conexión o timeout."""
+    req = urllib.request.Request(url, method=metodo, headers={"Accept-Encoding": "identity"})
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            estado, cuerpo = r.status, r.read()
+    except urllib.error.HTTPError as e:
+        estado, cuerpo = e.code, e.read()
+    except OSError as e:
+        estado, cuerpo = 0, str(e).encode()
+    return estado, cuerpo, time.perf_counter() - t0
+
+
+def url_de(base: str, ruta: str, params: dict) -> str:
+    q = urllib.parse.urlencode({k: v for k, v in params.items() if v is not None}, doseq=True)
+    return f"{base.rstrip('/')}{ruta}" + (f"?{q}" if q else "")
+
+
+def parametros_extra(pares: list) -> dict:
+    """--param k=v (repetible; la misma llave varias veces se manda como lista)."""
+    extra: dict = {}
+    for p in pares or []:
+        k, sep, v = p.partition("=")
+        if not sep:
+            sys.exit(f"--param espera llave=valor: {p!r}")
+        extra.setdefault(k, []).append(v)
+    return {k: v[0] if len(v) == 1 else v for k, v in extra.items()}
+
+
+def cohorte_de_prueba(base: str, programa_like: str) -> str:
+    """Una cohorte intermedia del programa (para /cohorte)."""
+    estado, cuerpo, _ = pedir(url_de(base, "/api/meta/cohortes", {"programa_like": programa_like}))
+    cohortes = [r["cohorte"] for r in json.loads(cuerpo)] if estado == 200 else []
+    return cohortes[len(cohortes) // 2] if cohortes else ""
+
+
+def elegir(nombres: list | None) -> list:
+    if not nombres:
+        return ENDPOINTS
+    desconocidos = set(nombres) - {n for n, _, _ in ENDPOINTS}
+    if desconocidos:
+        sys.exit(f"endpoints desconocidos: {sorted(desconocidos)}; disponibles: {[n for n, _, _ in ENDPOINTS]}")
+    return [e for e in ENDPOINTS if e[0] in nombres]
+
+
+def preparar_params(params: dict, programa_like: str, cohorte: str, extra: dict, ruta: str) -> dict:
+    p = {k: cohorte if v == "{cohorte}" else v for k, v in params.items()}
+    if ruta != "/api/meta/programas":
+        p["programa_like"] = programa_like
+    return {**p, **extra}
+
+
+def contar_filas(cuerpo: bytes) -> int:
+    """Filas de la respuesta: largo de la lista (o suma de las listas del dashboard)."""
+    try:
+        datos = json.loads(cuerpo)
+    except ValueError:
+        return 0
+    if isinstance(datos, list):
+        return len(datos)
+    if isinstance(datos, dict):
+        return sum(len(v) for v in datos.values() if isinstance(v, list)) or 1
+    return 1
+
+
+def percentil(ordenados: list, p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return 0.0
+    k = max(math.ceil(p / 100 * len(ordenados)) - 1, 0)
+    return ordenados[k]
+
+
+def resumen(segundos: list) -> dict:
+    s = sorted(segundos)
+
+    def ms(x: float) -> float:
+        return round(x * 1000, 2)
+
+    return {
+        "n": len(s),
+        "p50_ms": ms(percentil(s, 50)),
+        "p95_ms": ms(percentil(s, 95)),
+        "p99_ms": ms(percentil(s, 99)),
+        "media_ms": ms(sum(s) / len(s)) if s else 0.0,
+        "max_ms": ms(s[-1]) if s else 0.0,
+    }
+
+
+def entorno(base: str) -> dict:
+    """Datos para que dos reportes sean comparables: versión, commit y tamaño de los datos."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    estado, cuerpo, _ = pedir(url_de(base, "/api/admin/hechos/estado", {}))
+    return {
+        "version": VERSION_REPORTE,
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "host": platform.node(),
+        "url": base,
+        "datos": json.loads(cuerpo) if estado == 200 else None,
+    }
+
+
+def guardar(reporte: dict, ruta: str | None) -> None:
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False, default=str)
+    if ruta:
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
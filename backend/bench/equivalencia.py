@@ -0,0 +1,139 @@
+"""
+Equivalencia de motores: cada endpoint que acepta `motor` se pide con motor=sql y con
+motor=memoria sobre los mismos datos y las respuestas deben ser iguales (mismo orden,
+números con tolerancia --tolerancia).
+
+Casos por endpoint: sin filtros, rango de ciclos (desde+hasta, sólo desde, sólo hasta),
+un ciclo (detalles), contar_no_numericas y aprobatoria en otra escala (reprobación), con
+el programa de prueba y con un patrón que abarca varios programas. Antes verifica que
+esos programas tengan calificaciones no numéricas y boletas con carrera vacía (el
+programa sale de alumnos), que es lo que más fácilmente se desalinea entre motores;
+los datos de bench.generar traen ambas cosas.
+
+Uso (desde backend/, con la API levantada):
+    python -m bench.equivalencia [--url URL] [--programa-like X] [--patron-amplio INGENIERIA]
+                                 [--endpoint NOMBRE ...] [--tolerancia 1e-6] [--sin-cobertura]
+Sale con código 1 si algún caso difiere (para CI).
+"""
+import argparse
+import json
+import math
+import sys
+
+from . import comun
+
+# endpoints con motor en memoria (app/memoria.py) y sus casos propios
+ENDPOINTS = {
+    "inscritos_por_ciclo": ("/api/inscritos_por_ciclo", [{}]),
+    "indice_reprobacion": ("/api/reprobacion", [
+        {"aprobatoria": 6},
+        {"aprobatoria": 6, "contar_no_numericas": "true"},
+        {"aprobatoria": 60},
+    ]),
+    "reprobacion_detalle": ("/api/reprobacion_detalle", [{"aprobatoria": 6}, {"aprobatoria": 6, "ciclo": "{ciclo}"}]),
+    "cedula_322_detalle": ("/api/cedula_322_detalle", [{}, {"ciclo": "{ciclo}"}]),
+}
+
+
+def cobertura(patrones: list) -> dict:
+    """Boletas no numéricas y con carrera vacía en los programas comparados (lee MySQL)."""
+    from sqlalchemy import text
+
+    from app import hechos, programas
+    from app.db import get_db
+
+    db = get_db()
+    hechos.asegurar(db)
+    ids = sorted({i for p in patrones for i in programas.resolver(db, p).params()["programa_ids"]})
+    if not ids:
+        return {"no_numericas": 0, "carrera_vacia": 0}
+    with db.engine.connect() as conn:
+        fila = conn.execute(text(f"""
+            SELECT COALESCE(SUM(h.calif_num IS NULL), 0) AS no_numericas,
+                   COALESCE(SUM(c.programa = ''), 0) AS carrera_vacia
+            FROM {hechos.HECHOS} h
+            JOIN {hechos.PROGRAMAS} c ON c.id = h.carrera_id
+            WHERE h.programa_id IN ({", ".join(str(int(i)) for i in ids)})
+        """)).one()
+    return {"no_numericas": int(fila.no_numericas), "carrera_vacia": int(fila.carrera_vacia)}
+
+
+def diferencia(a, b, tolerancia: float, ruta: str = "") -> str | None:
+    """Primera diferencia entre dos respuestas JSON (None si son iguales)."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        if list(a) != list(b):
+            return f"{ruta or '/'}: columnas {list(a)} vs {list(b)}"
+        return next((d for k in a if (d := diferencia(a[k], b[k], tolerancia, f"{ruta}/{k}"))), None)
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return f"{ruta or '/'}: {len(a)} vs {len(b)} filas"
+        return next((d for i, (x, y) in enumerate(zip(a, b)) if (d := diferencia(x, y, tolerancia, f"{ruta}/{i}"))), None)
+    numeros = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (a, b))
+    if numeros and math.isclose(a, b, rel_tol=tolerancia, abs_tol=tolerancia):
+        return None
+    return None if a == b else f"{ruta}: {a!r} vs {b!r}"
+
+
+def _pedir_json(base: str, ruta: str, params: dict):
+    estado, cuerpo, _ = comun.pedir(comun.url_de(base, ruta, params))
+    if estado != 200:
+        raise RuntimeError(f"{ruta} {params}: HTTP {estado} {cuerpo[:200]!r}")
+    return json.loads(cuerpo)
+
+
+def casos(base: str, programa_like: str, amplio: str, endpoints: list | None) -> list:
+    """(nombre, ruta, params) de todos los casos, con ciclos reales del programa."""
+    ciclos = [r["ciclo"] for r in _pedir_json(base, "/api/inscritos_por_ciclo", {"programa_like": programa_like, "motor": "sql"})]
+    if len(ciclos) < 3:
+        sys.exit(f"'{programa_like}' tiene {len(ciclos)} ciclos; genera datos con bench.generar")
+    n = len(ciclos)
+    rangos = [{}, {"desde": ciclos[n // 3], "hasta": ciclos[2 * n // 3]}, {"desde": ciclos[n // 2]}, {"hasta": ciclos[n // 2]}]
+    desconocidos = set(endpoints or []) - set(ENDPOINTS)
+    if desconocidos:
+        sys.exit(f"endpoints sin motor en memoria: {sorted(desconocidos)}; disponibles: {list(ENDPOINTS)}")
+    lista = []
+    for nombre, (ruta, propios) in ENDPOINTS.items():
+        if endpoints and nombre not in endpoints:
+            continue
+        for patron in (programa_like, amplio):
+            for propio in propios:
+                for rango in rangos:
+                    if "ciclo" in propio and rango:
+                        continue   # ciclo fijo: el rango no agrega nada
+                    p = {k: ciclos[n // 2] if v == "{ciclo}" else v for k, v in propio.items()}
+                    lista.append((nombre, ruta, {"programa_like": patron, **p, **rango}))
+    return lista
+
+
+def equivalencia(base: str, programa_like: str, amplio: str, endpoints: list | None, tolerancia: float) -> dict:
+    fallas, n = [], 0
+    for nombre, ruta, params in casos(base, programa_like, amplio, endpoints):
+        sql = _pedir_json(base, ruta, {**params, "motor": "sql"})
+        mem = _pedir_json(base, ruta, {**params, "motor": "memoria"})
+        n += 1
+        d = diferencia(sql, mem, tolerancia)
+        if d:
+            fallas.append({"endpoint": nombre, "params": params, "diferencia": d})
+        print(f"{'DIFIERE' if d else 'igual  '} {nombre:22s} {params}" + (f"\n        {d}" if d else ""), file=sys.stderr)
+    return {"casos": n, "fallas": fallas}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compara motor=sql contra motor=memoria")
+    ap.add_argument("--url", default=comun.URL)
+    ap.add_argument("--programa-like", default="AEROESPACIAL")
+    ap.add_argument("--patron-amplio", default="INGENIERIA", help="patrón que abarca varios programas")
+    ap.add_argument("--endpoint", action="append", help="sólo estos endpoints (repetible)")
+    ap.add_argument("--tolerancia", type=float, default=1e-6)
+    ap.add_argument("--sin-cobertura", action="store_true", help="no consulta MySQL para verificar los datos")
+    args = ap.parse_args()
+
+    if not args.sin_cobertura:
+        cob = cobertura([args.programa_like, args.patron_amplio])
+        print(f"cobertura: {cob}", file=sys.stderr)
+        if not all(cob.values()):
+            sys.exit("los datos no tienen calificaciones no numéricas o boletas con carrera vacía; "
+                     "genera datos con bench.generar")
+    r = equivalencia(args.url, args.programa_like, args.patron_amplio, args.endpoint, args.tolerancia)
+    print(f"{r['casos']} casos, {len(r['fallas'])} con diferencias", file=sys.stderr)
+    sys.exit(1 if r["fallas"] else 0)
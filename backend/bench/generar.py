@@ -0,0 +1,249 @@
+"""
+Generador de datos sintéticos para estadistica.boletas, ingenieria.alumnos e
+ingenieria.materias, con distribuciones parecidas a las reales:
+
+  - programas con pesos desiguales; en boletas la carrera a veces viene vacía o con otra
+    escritura (minúsculas, espacios), como en los dumps
+  - cohortes 2012–2024, más ingreso en AGO/DIC que en ENE/JUN
+  - trayectoria por semestre con deserción (más alta en los primeros), materias
+    reprobadas que se recursan, extraordinarios en el mismo ciclo y ~3% de
+    calificaciones no numéricas (NP, NA, vacío)
+  - estatus final coherente con la trayectoria (bajas, inscritos, pasantes, titulados)
+  - grado con varias escrituras ("3", "03", "3o SEMESTRE")
+
+La escala es el número de boletas (10k → 10M); los alumnos salen de ahí (~30 boletas por
+alumno). Es determinista con --semilla. Las tablas se crean si no existen; si ya tienen
+filas hace falta --reemplazar (se vacían). Al terminar aplica índices, refresca la
+tabla de hechos y sus derivados (app.importador.refrescar_derivados).
+
+Uso (desde backend/):
+    python -m bench.generar --escala 100k|1m|10m|<n> [--reemplazar] [--semilla 1] [--sin-refresco]
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+LOTE = 5000
+
+ESCALAS = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# (nombre en alumnos.desc_programa, prefijo de claves, peso)
+PROGRAMAS = [
+    ("INGENIERIA AEROESPACIAL", "AER", 0.10),
+    ("INGENIERIA MECANICA", "MEC", 0.18),
+    ("INGENIERIA CIVIL", "CIV", 0.16),
+    ("INGENIERIA EN SISTEMAS COMPUTACIONALES", "ISC", 0.22),
+    ("INGENIERIA INDUSTRIAL", "IND", 0.14),
+    ("INGENIERIA ELECTRICA", "ELE", 0.08),
+    ("INGENIERIA QUIMICA", "QUI", 0.07),
+    ("INGENIERIA EN MECATRONICA", "MCT", 0.05),
+]
+SEMESTRES = 9
+MATERIAS_POR_SEMESTRE = 6
+ANIOS = range(2012, 2025)
+ULTIMO = (2024, 2)   # último ciclo con boletas
+
+BAJAS = ["BAJA DEFINITIVA", "BD", "BAJA TEMPORAL", "BT", "INACTIVO",
+         "BAJA POR CAMBIO DE PROGRAMA BCPED", "BAJA POR CAMBIO DE PLAN BCPES", "BCM"]
+TERMINADOS = [("PASANTE", 0.5), ("TITULADO", 0.35), ("EGRESADO", 0.15)]
+NO_NUMERICAS = ["NP", "NA", ""]
+
+DDL = [
+    "CREATE DATABASE IF NOT EXISTS estadistica",
+    "CREATE DATABASE IF NOT EXISTS ingenieria",
+    """
+    CREATE TABLE IF NOT EXISTS estadistica.boletas (
+      id            BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+      matricula     VARCHAR(32)  NULL,
+      clave         VARCHAR(32)  NULL,
+      ciclo         VARCHAR(64)  NULL,
+      calificacion  VARCHAR(16)  NULL,
+      grado         VARCHAR(32)  NULL,
+      carrera       VARCHAR(255) NULL,
+      KEY ix_matricula (matricula),
+      KEY ix_ciclo (ciclo)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingenieria.alumnos (
+      matricula           VARCHAR(32)  NOT NULL PRIMARY KEY,
+      desc_programa       VARCHAR(255) NULL,
+      ciclo_ingreso       VARCHAR(64)  NULL,
+      ultimo_ciclo_kardex VARCHAR(64)  NULL,
+      estatus             VARCHAR(128) NULL,
+      genero              VARCHAR(16)  NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingenieria.materias (
+      clave    VARCHAR(32)  NOT NULL,
+      materia  VARCHAR(255) NULL,
+      KEY ix_clave (clave)
+    )
+    """,
+]
+TABLAS = ["estadistica.boletas", "ingenieria.alumnos", "ingenieria.materias"]
+
+SQL_BOLETA = text("""
+    INSERT INTO estadistica.boletas (matricula, clave, ciclo, calificacion, grado, carrera)
+    VALUES (:matricula, :clave, :ciclo, :calificacion, :grado, :carrera)
+""")
+SQL_ALUMNO = text("""
+    INSERT INTO ingenieria.alumnos (matricula, desc_programa, ciclo_ingreso, ultimo_ciclo_kardex, estatus, genero)
+    VALUES (:matricula, :desc_programa, :ciclo_ingreso, :ultimo_ciclo_kardex, :estatus, :genero)
+""")
+SQL_MATERIA = text("INSERT INTO ingenieria.materias (clave, materia) VALUES (:clave, :materia)")
+
+
+def _ciclo(anio: int, periodo: int) -> str:
+    return f"{anio}-SEM-{'ENE/JUN' if periodo == 1 else 'AGO/DIC'}"
+
+
+def _siguiente(anio: int, periodo: int) -> tuple:
+    return (anio, 2) if periodo == 1 else (anio + 1, 1)
+
+
+def _clave(prefijo: str, semestre: int, k: int) -> str:
+    return f"{prefijo}{semestre}{k:02d}"
+
+
+def _materias(rnd: random.Random) -> list:
+    filas = []
+    for nombre, prefijo, _ in PROGRAMAS:
+        for s in range(1, SEMESTRES + 1):
+            for k in range(1, MATERIAS_POR_SEMESTRE + 1):
+                clave = _clave(prefijo, s, k)
+                filas.append({"clave": clave, "materia": f"{nombre.title()} {s}.{k}"})
+                if rnd.random() < 0.01:   # claves repetidas en el catálogo, como en los dumps
+                    filas.append({"clave": clave, "materia": f"{nombre.title()} {s}.{k} (plan anterior)"})
+    return filas
+
+
+def _calificacion(rnd: random.Random) -> str:
+    if rnd.random() < 0.03:
+        return rnd.choice(NO_NUMERICAS)
+    c = min(max(rnd.gauss(7.6, 1.6), 0.0), 10.0)
+    return str(int(round(c))) if rnd.random() < 0.6 else f"{c:.1f}"
+
+
+def _grado(rnd: random.Random, s: int) -> str:
+    return rnd.choice([str(s), f"{s:02d}", f"{s}o SEMESTRE"])
+
+
+def _carrera(rnd: random.Random, programa: str) -> str:
+    x = rnd.random()
+    if x < 0.07:
+        return ""
+    if x < 0.10:
+        return f" {programa.title()} "
+    return programa
+
+
+def _alumno(rnd: random.Random, n: int) -> tuple:
+    """(fila de alumno, filas de boletas) de un alumno sintético."""
+    programa, prefijo, _ = rnd.choices(PROGRAMAS, weights=[p[2] for p in PROGRAMAS])[0]
+    anio, periodo = rnd.choice(ANIOS), 2 if rnd.random() < 0.7 else 1
+    matricula = f"{anio % 100:02d}{n:08d}"
+    ingreso = _ciclo(anio, periodo)
+    boletas, pendientes = [], []
+    ciclo, estatus, s = (anio, periodo), None, 1
+    while s <= SEMESTRES:
+        if ciclo > ULTIMO:
+            estatus = "REINGRESO INSCRITO" if rnd.random() < 0.1 else "INSCRITO"
+            break
+        if rnd.random() < (0.12 if s <= 2 else 0.05):
+            estatus = rnd.choice(BAJAS)
+            break
+        texto = _ciclo(*ciclo)
+        claves = [_clave(prefijo, s, k) for k in range(1, MATERIAS_POR_SEMESTRE + 1)]
+        claves = rnd.sample(claves, rnd.randint(4, MATERIAS_POR_SEMESTRE)) + pendientes
+        pendientes = []
+        for clave in claves:
+            cal = _calificacion(rnd)
+            fila = {"matricula": matricula, "clave": clave, "ciclo": texto, "calificacion": cal,
+                    "grado": _grado(rnd, s), "carrera": _carrera(rnd, programa)}
+            boletas.append(fila)
+            reprobada = not cal.replace(".", "", 1).isdigit() or float(cal) < 6
+            if reprobada and rnd.random() < 0.25:   # extraordinario en el mismo ciclo
+                boletas.append({**fila, "calificacion": _calificacion(rnd)})
+            elif reprobada:
+                pendientes.append(clave)
+        ultimo = texto
+        ciclo, s = _siguiente(*ciclo), s + 1
+    else:
+        estatus = rnd.choices([t for t, _ in TERMINADOS], weights=[w for _, w in TERMINADOS])[0]
+    alumno = {
+        "matricula": matricula,
+        "desc_programa": programa,
+        "ciclo_ingreso": ingreso if rnd.random() > 0.01 else None,
+        "ultimo_ciclo_kardex": ultimo if boletas else None,
+        "estatus": estatus,
+        "genero": None if rnd.random() < 0.01 else ("M" if rnd.random() < 0.6 else "F"),
+    }
+    return alumno, boletas
+
+
+def generar(db, boletas: int, semilla: int = 1, reemplazar: bool = False, salida=sys.stderr) -> dict:
+    rnd = random.Random(semilla)
+    t0 = time.perf_counter()
+    with db.engine.begin() as conn:
+        for ddl in DDL:
+            conn.execute(text(ddl))
+        ocupadas = [t for t in TABLAS if conn.execute(text(f"SELECT 1 FROM {t} LIMIT 1")).first()]
+        if ocupadas and not reemplazar:
+            raise SystemExit(f"{ocupadas} ya tienen filas; use --reemplazar para vaciarlas")
+        for t in TABLAS:
+            conn.execute(text(f"TRUNCATE TABLE {t}"))   # 10M filas: DELETE sería muy lento
+        conn.execute(SQL_MATERIA, _materias(rnd))
+
+    n_alumnos = n_boletas = 0
+    lote_a, lote_b = [], []
+    while n_boletas < boletas:
+        alumno, filas = _alumno(rnd, n_alumnos)
+        n_alumnos += 1
+        filas = filas[: boletas - n_boletas]
+        n_boletas += len(filas)
+        lote_a.append(alumno)
+        lote_b.extend(filas)
+        if len(lote_b) >= LOTE or n_boletas >= boletas:
+            with db.engine.begin() as conn:
+                conn.execute(SQL_ALUMNO, lote_a)
+                if lote_b:
+                    conn.execute(SQL_BOLETA, lote_b)
+            lote_a, lote_b = [], []
+            seg = time.perf_counter() - t0
+            print(f"\r{n_boletas:>11,} boletas  {n_alumnos:>9,} alumnos  {n_boletas / seg:>9,.0f} filas/s",
+                  end="", file=salida, flush=True)
+    print(file=salida)
+    return {
+        "boletas": n_boletas,
+        "alumnos": n_alumnos,
+        "semilla": semilla,
+        "segundos": round(time.perf_counter() - t0, 1),
+    }
+
+
+def _escala(valor: str) -> int:
+    v = valor.lower().replace("_", "")
+    return ESCALAS[v] if v in ESCALAS else int(v)
+
+
+if __name__ == "__main__":
+    from app.db import get_db
+    from app.importador import refrescar_derivados
+
+    ap = argparse.ArgumentParser(description="Datos sintéticos para el banco de pruebas")
+    ap.add_argument("--escala", type=_escala, default="100k", help="boletas: 10k, 100k, 1m, 10m o un número")
+    ap.add_argument("--semilla", type=int, default=1)
+    ap.add_argument("--reemplazar", action="store_true", help="vacía las tablas si ya tienen filas")
+    ap.add_argument("--sin-refresco", action="store_true", help="no refresca índices/hechos al terminar")
+    args = ap.parse_args()
+
+    r = generar(get_db(), args.escala, args.semilla, args.reemplazar)
+    if not args.sin_refresco:
+        r["derivados"] = refrescar_derivados()
+    print(json.dumps(r, indent=2, ensure_ascii=False, default=str))
@@ -0,0 +1,87 @@
+"""
+Latencia por endpoint: p50/p95/p99, filas y filas/s.
+
+Cada repetición vacía antes la caché de resultados del endpoint (fuera del tiempo
+medido), así se mide la consulta y no la caché; con --con-cache se mide la ruta en caché.
+
+Uso (desde backend/, con la API levantada):
+    python -m bench.medir [--url URL] [--programa-like X] [--repeticiones 20]
+                          [--endpoint NOMBRE ...] [--param k=v ...] [--con-cache] [--salida r.json]
+"""
+import argparse
+import sys
+
+from . import comun
+
+
+def medir(
+    base: str,
+    programa_like: str,
+    repeticiones: int = 20,
+    calentamiento: int = 2,
+    endpoints: list | None = None,
+    extra: dict | None = None,
+    con_cache: bool = False,
+) -> dict:
+    cohorte = comun.cohorte_de_prueba(base, programa_like)
+    resultado = {}
+    for nombre, ruta, params in comun.elegir(endpoints):
+        url = comun.url_de(base, ruta, comun.preparar_params(params, programa_like, cohorte, extra or {}, ruta))
+        invalidar = comun.url_de(base, "/api/admin/cache/invalidate", {"endpoint": nombre})
+        tiempos, errores, filas, bytes_ = [], 0, 0, 0
+        for i in range(calentamiento + repeticiones):
+            if not con_cache:
+                comun.pedir(invalidar, "POST")
+            estado, cuerpo, segundos = comun.pedir(url)
+            if i < calentamiento:
+                continue
+            if estado != 200:
+                errores += 1
+                continue
+            tiempos.append(segundos)
+            filas, bytes_ = comun.contar_filas(cuerpo), len(cuerpo)
+        r = comun.resumen(tiempos)
+        r.update(
+            errores=errores,
+            filas=filas,
+            bytes=bytes_,
+            filas_por_s=round(filas / (r["p50_ms"] / 1000), 1) if r["p50_ms"] else 0.0,
+        )
+        resultado[nombre] = r
+        print(
+            f"{nombre:30s} p50 {r['p50_ms']:9.1f} ms  p95 {r['p95_ms']:9.1f} ms  "
+            f"p99 {r['p99_ms']:9.1f} ms  filas {filas:7d}  errores {errores}",
+            file=sys.stderr,
+        )
+    return resultado
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Latencia p50/p95/p99 por endpoint")
+    ap.add_argument("--url", default=comun.URL)
+    ap.add_argument("--programa-like", default="AEROESPACIAL")
+    ap.add_argument("--repeticiones", type=int, default=20)
+    ap.add_argument("--calentamiento", type=int, default=2)
+    ap.add_argument("--endpoint", action="append", help="sólo estos endpoints (repetible)")
+    ap.add_argument("--param", action="append", help="parámetro extra llave=valor (p.ej. motor=memoria)")
+    ap.add_argument("--con-cache", action="store_true", help="no vacía la caché entre repeticiones")
+    ap.add_argument("--salida", help="archivo JSON (default: stdout)")
+    args = ap.parse_args()
+
+    extra = comun.parametros_extra(args.param)
+    reporte = {
+        "tipo": "medir",
+        **comun.entorno(args.url),
+        "parametros": {
+            "programa_like": args.programa_like,
+            "repeticiones": args.repeticiones,
+            "con_cache": args.con_cache,
+            "extra": extra,
+        },
+    }
+    reporte["endpoints"] = medir(
+        args.url, args.programa_like, args.repeticiones, args.calentamiento,
+        args.endpoint, extra, args.con_cache,
+    )
+    comun.guardar(reporte, args.salida)
+    sys.exit(1 if any(r["errores"] for r in reporte["endpoints"].values()) else 0)
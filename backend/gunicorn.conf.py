@@ -0,0 +1,38 @@
+"""
+Servidor de producción (CMD del Dockerfile): gunicorn con workers de uvicorn.
+
+  - WEB_CONCURRENCY: número de workers (default: los núcleos disponibles)
+  - PORT (8000), GUNICORN_TIMEOUT (60 s)
+  - COMPARTIDO_DIR (default /tmp/cacei): caché de resultados, instantánea del motor en
+    memoria y candados comunes a todos los workers (ver app/compartido.py)
+
+La app se importa una vez en el proceso maestro (preload_app) y los workers nacen con
+fork, así que arrancan sin volver a importar FastAPI, SQLAlchemy, etc.; lo opcional y
+pesado (numpy, pyarrow, xlsxwriter, brotli) se importa hasta que se usa. Cada worker
+abre su propio pool y corre su lifespan (el precálculo sólo lo hace uno).
+
+Desarrollo: `uvicorn app.main:app --reload` (docker-compose.yml) sigue siendo un proceso.
+"""
+import os
+
+os.environ.setdefault("COMPARTIDO_DIR", "/tmp/cacei")   # antes de importar la app
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or len(os.sched_getaffinity(0))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # los motores se crearon en el maestro (sin conectar); cada worker arma su pool
+    # sin tocar las conexiones que pudiera tener el padre
+    from app.db import get_db
+
+    db = get_db()
+    db.engine.dispose(close=False)
+    if db.async_engine is not None:
+        db.async_engine.sync_engine.dispose(close=False)
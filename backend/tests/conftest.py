@@ -0,0 +1,5 @@
+"""Permite correr las pruebas desde cualquier directorio (`pytest backend/tests`)."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
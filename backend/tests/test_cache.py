@@ -0,0 +1,98 @@
+"""Caché LRU con vigencia e invalidación (cache.TTLCache) y su llave normalizada."""
+import pytest
+
+from app import cache
+from app.cache import TTLCache
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    r = Reloj()
+    monkeypatch.setattr(cache.time, "monotonic", r)
+    return r
+
+
+def test_acierto_y_fallo(reloj):
+    c = TTLCache(max_entries=4, ttl=10)
+    assert c.get(("a", ())) == (False, None)
+    c.set(("a", ()), 1)
+    assert c.get(("a", ())) == (True, 1)
+    s = c.stats()
+    assert (s["hits"], s["misses"], s["hit_ratio"], s["entries"]) == (1, 1, 0.5, 1)
+
+
+def test_vence_por_ttl(reloj):
+    c = TTLCache(max_entries=4, ttl=10)
+    c.set(("a", ()), 1)
+    reloj.t += 9.9
+    assert c.get(("a", ())) == (True, 1)
+    reloj.t += 0.1
+    assert c.get(("a", ())) == (False, None)
+    assert c.stats()["entries"] == 0
+
+
+def test_ttl_cero_desactiva(reloj):
+    c = TTLCache(max_entries=4, ttl=0)
+    c.set(("a", ()), 1)
+    assert c.get(("a", ())) == (False, None)
+
+
+def test_expulsa_el_menos_usado(reloj):
+    c = TTLCache(max_entries=2, ttl=10)
+    c.set(("a", ()), 1)
+    c.set(("b", ()), 2)
+    c.get(("a", ()))          # "b" queda como el menos usado
+    c.set(("c", ()), 3)
+    assert c.get(("b", ())) == (False, None)
+    assert c.get(("a", ())) == (True, 1)
+    assert c.get(("c", ())) == (True, 3)
+    assert c.stats()["evictions"] == 1
+
+
+def test_no_guarda_tras_invalidacion(reloj):
+    c = TTLCache(max_entries=4, ttl=10)
+    generacion = c.invalidations
+    c.invalidate()
+    c.set(("a", ()), "viejo", generacion)
+    assert c.get(("a", ())) == (False, None)
+    c.set(("a", ()), "nuevo", c.invalidations)
+    assert c.get(("a", ())) == (True, "nuevo")
+
+
+def test_invalida_por_endpoint(reloj):
+    c = TTLCache(max_entries=8, ttl=10)
+    c.set(("kpis", (("x", 1),)), 1)
+    c.set(("kpis", (("x", 2),)), 2)
+    c.set(("cohortes", ()), 3)
+    assert c.invalidate("kpis") == 2
+    assert c.get(("cohortes", ())) == (True, 3)
+    assert c.invalidate() == 1
+    assert c.stats()["invalidations"] == 2
+
+
+def test_nueva_version(reloj):
+    c = TTLCache(max_entries=4, ttl=10)
+    c.nueva_version(1)          # la primera versión leída no invalida
+    c.set(("a", ()), 1)
+    c.nueva_version(1)
+    assert c.get(("a", ())) == (True, 1)
+    c.nueva_version(2)
+    assert c.get(("a", ())) == (False, None)
+    assert c.version == 2
+
+
+def test_clave_normaliza_parametros():
+    assert cache.clave("kpis", {"programa_like": " aero ", "top_n": 5}) == cache.clave(
+        "kpis", {"top_n": 5, "programa_like": "AERO"}
+    )
+    assert cache.clave("kpis", {"re_baja": "baja"}) == cache.clave("kpis", {"re_baja": "BAJA"})
+    assert cache.clave("kpis", {"clave_prefijo": "iq"}) != cache.clave("kpis", {"clave_prefijo": "IQ"})
+    assert cache.clave("x", {"cohorte": ["a ", "b"]}) == ("x", (("cohorte", ("a", "b")),))
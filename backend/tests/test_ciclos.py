@@ -0,0 +1,102 @@
+"""Ordinales y rangos de ciclos (app/ciclos.py) y su equivalente SQL en hechos.sql_ciclo_key."""
+import re
+
+import pytest
+
+from app import programas
+from app.ciclos import MAX_ORDINAL, Ciclo, Rango, clave_orden, limite, ordinal
+from app.hechos import sql_ciclo_key
+
+CICLOS = [
+    "2022-SEM-AGO/DIC",
+    "2019-SEM-ENE/JUN",
+    "2019-sem-ene/jun",
+    "2020-VERANO",
+    "2021",
+    "0999-SEM-ENE/JUN",
+    "VERANO 2020",
+    "SIN-AÑO-ENE/JUN",
+    "2019-SEM-ENE/JUN ",
+    "",
+    None,
+]
+
+
+def _sql(ciclo: str | None) -> int:
+    """Evalúa la expresión de sql_ciclo_key como lo haría MySQL (collation *_ci)."""
+    sql = sql_ciclo_key("c")
+    regex = re.search(r"c REGEXP '([^']+)'", sql).group(1)
+    assert f"REGEXP_SUBSTR(c, '{regex}')" in sql
+    multiplo = int(re.search(r"END\) \* (\d+)", sql).group(1))
+    like, si, no = re.search(r"c LIKE '([^']+)' THEN (\d+) ELSE (\d+)", sql).groups()
+    if ciclo is None:   # NULL REGEXP / NULL LIKE no son verdaderos: ramas ELSE
+        return int(no)
+    m = re.search(regex, ciclo)
+    anio = int(m.group(0)) if m else 0
+    cumple = programas.cumple(ciclo.upper(), programas._segmentos(like.upper()))
+    return anio * multiplo + int(si if cumple else no)
+
+
+@pytest.mark.parametrize("ciclo", CICLOS)
+def test_ordinal_igual_que_sql_ciclo_key(ciclo):
+    assert ordinal(ciclo) == _sql(ciclo)
+
+
+@pytest.mark.parametrize("ciclo, esperado", [
+    ("2022-SEM-AGO/DIC", 20222),
+    ("2019-SEM-ENE/JUN", 20191),
+    ("2019-sem-ene/jun", 20191),
+    ("2021", 20212),
+    ("VERANO 2020", 2),
+    (None, 2),
+])
+def test_ordinal(ciclo, esperado):
+    assert ordinal(ciclo) == esperado
+
+
+def test_orden_de_ciclos():
+    textos = ["2020-SEM-AGO/DIC", "2019-SEM-AGO/DIC", "2020-SEM-ENE/JUN", "2019-SEM-ENE/JUN"]
+    assert [str(c) for c in sorted(map(Ciclo.de, textos))] == [
+        "2019-SEM-ENE/JUN", "2019-SEM-AGO/DIC", "2020-SEM-ENE/JUN", "2020-SEM-AGO/DIC",
+    ]
+    c = Ciclo.de("2020-SEM-ENE/JUN")
+    assert (c.anio, c.periodo) == (2020, 1)
+    assert sorted([None, "2019-SEM-AGO/DIC", "2019-SEM-ENE/JUN"], key=clave_orden)[0] is None
+
+
+@pytest.mark.parametrize("texto, final, esperado", [
+    ("2019-A", False, 20191),
+    ("2019-b", False, 20192),
+    ("2019-1", False, 20191),
+    ("2019 - 2", False, 20192),
+    ("2019", False, 20191),
+    ("2019", True, 20192),
+    ("2019-SEM-AGO/DIC", False, 20192),
+    (" 2019-SEM-ENE/JUN ", True, 20191),
+])
+def test_limite(texto, final, esperado):
+    assert limite(texto, final) == esperado
+
+
+@pytest.mark.parametrize("texto", ["", "A-2019", "SEM-AGO/DIC"])
+def test_limite_invalido(texto):
+    with pytest.raises(ValueError):
+        limite(texto)
+
+
+def test_rango():
+    assert Rango.de(None, " ") is None
+    assert Rango.de("2019", None) == Rango(20191, MAX_ORDINAL)
+    assert Rango.de(None, "2019") == Rango(0, 20192)
+    r = Rango.de("2019-B", "2020-A")
+    assert (r.desde, r.hasta) == (20192, 20201)
+    assert r.contiene("2019-SEM-AGO/DIC")
+    assert r.contiene("2020-SEM-ENE/JUN")
+    assert not r.contiene("2019-SEM-ENE/JUN")
+    assert not r.contiene("2020-SEM-AGO/DIC")
+    assert not r.contiene(None)
+
+
+def test_rango_vacio():
+    with pytest.raises(ValueError):
+        Rango.de("2020", "2019")
@@ -0,0 +1,30 @@
+"""Negociación de Accept-Encoding (app/compresion.py)."""
+import pytest
+
+from app import compresion
+
+
+@pytest.fixture(params=[["br", "gzip"], ["gzip"]], ids=["con_brotli", "sin_brotli"])
+def disponibles(request, monkeypatch):
+    monkeypatch.setattr(compresion, "disponibles", lambda: list(request.param))
+    return request.param
+
+
+@pytest.mark.parametrize("cabecera, con_br, sin_br", [
+    ("", None, None),
+    ("identity", None, None),
+    ("gzip", "gzip", "gzip"),
+    ("br", "br", None),
+    ("gzip, deflate, br", "br", "gzip"),
+    ("GZIP , BR", "br", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip", "gzip"),
+    ("br;q=0.8, gzip;q=0.8", "br", "gzip"),
+    ("*", "br", "gzip"),
+    ("*;q=0", None, None),
+    ("*, br;q=0", "gzip", "gzip"),
+    ("gzip;q=0", None, None),
+    ("gzip;q=abc", None, None),
+    ("deflate;q=1, *;q=0.1", "br", "gzip"),
+])
+def test_negociar(disponibles, cabecera, con_br, sin_br):
+    assert compresion.negociar(cabecera) == (con_br if "br" in disponibles else sin_br)
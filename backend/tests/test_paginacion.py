@@ -0,0 +1,188 @@
+"""Paginación por llave, top-N y cursores del detalle por materia (routers/stats.py)."""
+import base64
+from decimal import Decimal
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.db import Tabla
+from app.routers.stats import LIMITE_MAX, _cursor, _leer_cursor, _PorMateria, _PorPrograma
+
+# la llave de /reprobacion_detalle: ciclo, porcentaje descendente (negado), clave, nombre
+LLAVE = [
+    "d._ciclo_key",
+    "COALESCE(d.`Ciclo`, '')",
+    "-d.`Porcentaje`",
+    "COALESCE(d.`Clave`, '')",
+    "d.`Nombre de la Materia`",
+]
+COLUMNAS = ["Clave", "Nombre de la Materia", "Ciclo", "Porcentaje"]
+
+
+def _pag(lote: bool = False, **kw) -> _PorMateria:
+    return _PorMateria(_PorPrograma(lote), LLAVE, **kw)
+
+
+def _filas() -> list:
+    """Filas tal como las devuelve envolver() con limite: columnas y luego la llave."""
+    filas = []
+    for ciclo_key, ciclo in ((20191, "2019-SEM-ENE/JUN"), (20192, "2019-SEM-AGO/DIC")):
+        for i, pct in enumerate(["33.3", "33.3", "12.5", "0.0", "100.0", "33.3", "7"]):
+            clave = f"M{i % 3}"        # claves repetidas: desempata el nombre
+            nombre = f"MATERIA {i}"
+            p = Decimal(pct)
+            filas.append((clave, nombre, ciclo, p, ciclo_key, ciclo, -p, clave, nombre))
+    return filas
+
+
+def _mysql(v):
+    # pymysql manda los float como literal (repr) y MySQL lee un literal decimal exacto
+    return Decimal(repr(v)) if isinstance(v, float) else v
+
+
+def _recorrer(filas: list, limite: int) -> list:
+    """Pide páginas como lo haría MySQL con el WHERE (llave) > (cursor) ... LIMIT n+1."""
+    n = len(LLAVE)
+    vistas, cursor, paginas = [], None, 0
+    while True:
+        pag = _pag(limite=limite, cursor=cursor)
+        despues = tuple(_mysql(v) for v in pag.despues) if pag.despues else None
+        resto = sorted(
+            (f for f in filas if despues is None or tuple(f[-n:]) > despues),
+            key=lambda f: tuple(f[-n:]),
+        )
+        tabla = Tabla(COLUMNAS + [f"_k{i}" for i in range(n)], resto[: limite + 1])
+        r = pag.pagina(tabla)
+        assert r["filas"].columnas == tuple(COLUMNAS)
+        assert len(r["filas"]) <= limite
+        vistas += r["filas"].filas
+        paginas += 1
+        cursor = r["siguiente"]
+        if cursor is None:
+            return vistas, paginas
+
+
+@pytest.mark.parametrize("limite", [1, 2, 3, 5, 14, 50])
+def test_paginas_recorren_todo_en_orden_sin_repetir(limite):
+    filas = _filas()
+    esperado = [f[: len(COLUMNAS)] for f in sorted(filas, key=lambda f: tuple(f[len(COLUMNAS):]))]
+    vistas, paginas = _recorrer(filas, limite)
+    assert vistas == esperado
+    assert paginas == max(1, -(-len(filas) // limite))
+
+
+def test_orden_por_porcentaje_descendente_y_desempate():
+    vistas, _ = _recorrer(_filas(), 4)
+    primer_ciclo = [f for f in vistas if f[2] == "2019-SEM-ENE/JUN"]
+    assert [f[3] for f in primer_ciclo] == sorted((f[3] for f in primer_ciclo), reverse=True)
+    empatadas = [(f[0], f[1]) for f in primer_ciclo if f[3] == Decimal("33.3")]
+    assert empatadas == sorted(empatadas)
+
+
+def test_envolver_compara_y_ordena_por_la_llave_completa():
+    pag = _pag(limite=10, cursor=_cursor([20191, "2019-SEM-ENE/JUN", -33.3, "M0", "MATERIA 0"]))
+    sql = pag.envolver("SELECT 1", COLUMNAS, "no se usa")
+    llave = ", ".join(LLAVE)
+    assert f"WHERE ({llave}) > (:cursor_0, :cursor_1, :cursor_2, :cursor_3, :cursor_4)" in sql
+    assert f"ORDER BY {llave}" in sql
+    assert "LIMIT :limite_mas_uno" in sql
+    p = pag.params()
+    assert p["limite_mas_uno"] == 11
+    assert p["cursor_2"] == -33.3
+    assert p["cursor_ciclo_key"] == 20191   # recorta los ciclos anteriores antes de agregar
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (Decimal("-33.3"), -33.3),
+    (Decimal("12.50"), 12.5),
+    (Decimal("7"), 7),
+    (Decimal("-0.1"), -0.1),
+    (Decimal("100.0"), 100.0),
+])
+def test_cursor_decimal_ida_y_vuelta(valor, esperado):
+    (leido,) = _leer_cursor(_cursor([valor]), 1)
+    assert leido == esperado
+    assert type(leido) is type(esperado)
+    assert _mysql(leido) == valor   # lo que compara MySQL es el mismo valor exacto
+
+
+def test_cursor_conserva_texto_y_enteros():
+    llave = [20192, "2019-SEM-AGO/DIC", Decimal("-12.5"), "M1", "ÁLGEBRA LINEAL"]
+    assert _leer_cursor(_cursor(llave), 5) == [20192, "2019-SEM-AGO/DIC", -12.5, "M1", "ÁLGEBRA LINEAL"]
+
+
+def test_top_n_parte_por_ciclo():
+    sql = _pag(top_n=3).envolver("SELECT 1", COLUMNAS, "no se usa")
+    assert (
+        "PARTITION BY d._ciclo_key, COALESCE(d.`Ciclo`, '') "
+        "ORDER BY -d.`Porcentaje`, COALESCE(d.`Clave`, ''), d.`Nombre de la Materia`"
+    ) in sql
+    assert "d._n <= :top_n" in sql
+
+
+def test_top_n_en_lote_parte_por_programa_y_ciclo():
+    pag = _pag(lote=True, top_n=2, limite=10)
+    assert pag.llave[0] == "d.programa"
+    sql = pag.envolver("SELECT 1", COLUMNAS, "no se usa")
+    assert (
+        "PARTITION BY d.programa, d._ciclo_key, COALESCE(d.`Ciclo`, '') "
+        "ORDER BY -d.`Porcentaje`, COALESCE(d.`Clave`, ''), d.`Nombre de la Materia`"
+    ) in sql
+    assert sql.startswith("SELECT d.programa, ")
+    assert pag.params()["top_n"] == 2
+
+
+def test_cursor_en_lote_no_recorta_por_ciclo():
+    cursor = _cursor(["AEROESPACIAL", 20191, "2019-SEM-ENE/JUN", -33.3, "M0", "MATERIA 0"])
+    pag = _pag(lote=True, limite=5, cursor=cursor)
+    assert "cursor_ciclo_key" not in pag.params()
+    assert "ciclo_key >=" not in pag.filtro()
+
+
+def _b64(obj) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(obj)).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "no es base64!!",
+    base64.urlsafe_b64encode(b"{no es json").decode(),
+    _b64({"ciclo": 20191}),
+    _b64([20191, "2019-SEM-ENE/JUN"]),                      # largo distinto a la llave
+    _b64([20191, "2019-SEM-ENE/JUN", None, "M0", "X"]),     # NULL
+    _b64([20191, "2019-SEM-ENE/JUN", [1], "M0", "X"]),      # anidado
+    _b64([20191, "2019-SEM-ENE/JUN", {"a": 1}, "M0", "X"]),
+])
+def test_cursor_invalido_responde_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        _pag(limite=10, cursor=cursor)
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("kw", [
+    {"cursor": _b64([20191, "x", -1.0, "M0", "X"])},   # cursor sin limite
+    {"limite": 0},
+    {"limite": LIMITE_MAX + 1},
+    {"top_n": 0},
+    {"min_alumnos": -1},
+])
+def test_parametros_fuera_de_rango_responden_400(kw):
+    with pytest.raises(HTTPException) as e:
+        _pag(**kw)
+    assert e.value.status_code == 400
+
+
+def test_sin_filtros_no_cambia_el_sql():
+    pag = _pag()
+    assert not pag.activo
+    assert pag.envolver("SELECT 1", COLUMNAS, "x, y") == "SELECT 1\nORDER BY x, y"
+    assert pag.filtro() == ""
+    assert pag.params() == {}
+
+
+def test_prefijo_escapa_comodines_de_like():
+    pag = _pag(clave_prefijo=" I_Q%\\ ")
+    assert pag.params()["clave_prefijo"] == "I\\_Q\\%\\\\%"
+    assert pag.filtro("AND ciclo_key BETWEEN :desde_key AND :hasta_key") == (
+        "WHERE TRUE AND ciclo_key BETWEEN :desde_key AND :hasta_key AND clave LIKE :clave_prefijo"
+    )
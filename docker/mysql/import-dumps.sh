@@ -1,15 +1,22 @@
 #!/usr/bin/env bash
+# Re-importa los dumps con app.importador: paralelo por esquema, omite los que no cambiaron
+# (checksums en cacei.importaciones) y al terminar aplica índices, refresca la tabla de hechos
+# y vacía la caché. Los argumentos después del directorio pasan al importador (p.ej. --force).
 set -euo pipefail
-DUMPS_DIR="${1:-./docker/mysql/dumps}"
-MYSQL_HOST="${MYSQL_HOST:-127.0.0.1}"
-MYSQL_PORT="${MYSQL_PORT:-13306}"
-MYSQL_USER="${MYSQL_USER:-root}"
-MYSQL_PASS="${MYSQL_PASS:-rootpass}"
+RAIZ="$(cd "$(dirname "$0")/../.." && pwd)"
+DUMPS_DIR="${1:-$RAIZ/docker/mysql/dumps}"
+shift || true
 
-echo "Importando .sql desde $DUMPS_DIR hacia $MYSQL_HOST:$MYSQL_PORT..."
-for f in "$DUMPS_DIR"/*.sql; do
-  [ -e "$f" ] || continue
-  echo "-> $f"
-  mysql -h"$MYSQL_HOST" -P"$MYSQL_PORT" -u"$MYSQL_USER" -p"$MYSQL_PASS" < "$f"
-done
-echo "Listo."
+if docker compose -f "$RAIZ/docker-compose.yml" ps --status running -q backend 2>/dev/null | grep -q .; then
+  echo "Importando desde el contenedor backend (/dumps)..."
+  exec docker compose -f "$RAIZ/docker-compose.yml" exec -T backend \
+    python -m app.importador --dir /dumps "$@"
+fi
+
+echo "Importando .sql desde $DUMPS_DIR hacia ${MYSQL_HOST:-127.0.0.1}:${MYSQL_PORT:-13306}..."
+cd "$RAIZ/backend"
+DB_HOST="${MYSQL_HOST:-127.0.0.1}" \
+DB_PORT="${MYSQL_PORT:-13306}" \
+DB_USER="${MYSQL_USER:-root}" \
+DB_PASS="${MYSQL_PASS:-rootpass}" \
+  exec python -m app.importador --dir "$DUMPS_DIR" "$@"
@@ -1,6 +1,7 @@
 // src/components/ReprobacionMaterias.jsx
 import React, { useEffect, useMemo, useState } from 'react'
 import axios from 'axios'
+import { cargarPaginas } from '../paginado'
 
 const API = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
@@ -20,6 +21,33 @@ function normalizeName(s) {
     .toUpperCase()
 }
 
+const normalizar = aprobatoria => x => ({
+  clave: x['Clave'] ?? x.clave,
+  nombre: x['Nombre de la Materia'] ?? x.nombre,
+  ciclo: x['Ciclo'] ?? x.ciclo,
+  semestre: x['Semestre'] ?? x.semestre,
+  alumnos: Number(x['No. Alumnos'] ?? x.alumnos) || 0,
+  reprobados: Number(x['No. Reprobados'] ?? x.reprobados) || 0,
+  porcentaje: Number(x['Porcentaje'] ?? x.porcentaje) || 0,
+  umbral_usado: Number(x['umbral_usado'] ?? x.umbral_usado ?? aprobatoria)
+})
+
+// Consolidar duplicados por (clave, nombre, ciclo, semestre)
+function consolidarPorCiclo(norm) {
+  const map = new Map()
+  for (const r of norm) {
+    const key = [r.clave, r.nombre, r.ciclo, r.semestre].join('|')
+    const prev = map.get(key) || { ...r, alumnos: 0, reprobados: 0 }
+    prev.alumnos += Number(r.alumnos) || 0
+    prev.reprobados += Number(r.reprobados) || 0
+    map.set(key, prev)
+  }
+  return Array.from(map.values()).map(r => ({
+    ...r,
+    porcentaje: r.alumnos ? (100 * r.reprobados / r.alumnos) : 0
+  }))
+}
+
 export default function ReprobacionMaterias({
   programa = 'AEROESPACIAL',
   aprobatoria = 6.0,
@@ -31,6 +59,7 @@ export default function ReprobacionMaterias({
   const [ciclo, setCiclo]   = useState(cicloDefault || '')
   const [rows, setRows]     = useState([])
   const [loading, setLoading] = useState(false)
+  const [cargandoMas, setCargandoMas] = useState(false)
   const [error, setError]     = useState('')
   const [soloConReprob, setSoloConReprob] = useState(false)
 
@@ -62,54 +91,37 @@ export default function ReprobacionMaterias({
     return () => { cancel = true }
   }, [programa, cicloDefault])
 
-  // Cargar detalle por materia
+  // Cargar detalle por materia: por páginas, la tabla se llena conforme llegan
   useEffect(() => {
     if (!ciclo) return
-    let cancel = false
+    const ctrl = new AbortController()
+    let acumuladas = []
+    setRows([])
     setLoading(true)
+    setCargandoMas(false)
     setError('')
     ;(async () => {
       try {
-        const r = await axios.get(`${API}/api/reprobacion_detalle`, {
-          params: { programa_like: programa, ciclo, aprobatoria }
-        })
-        if (cancel) return
-        const norm = (r.data || []).map(x => ({
-          clave: x['Clave'] ?? x.clave,
-          nombre: x['Nombre de la Materia'] ?? x.nombre,
-          ciclo: x['Ciclo'] ?? x.ciclo,
-          semestre: x['Semestre'] ?? x.semestre,
-          alumnos: Number(x['No. Alumnos'] ?? x.alumnos) || 0,
-          reprobados: Number(x['No. Reprobados'] ?? x.reprobados) || 0,
-          porcentaje: Number(x['Porcentaje'] ?? x.porcentaje) || 0,
-          umbral_usado: Number(x['umbral_usado'] ?? x.umbral_usado ?? aprobatoria)
-        }))
-        setRows(norm)
-        // Consolidar duplicados por (clave, nombre, ciclo, semestre)
-        const map = new Map()
-        for (const r of norm) {
-          const key = [r.clave, r.nombre, r.ciclo, r.semestre].join('|')
-          const prev = map.get(key) || { ...r, alumnos: 0, reprobados: 0 }
-          prev.alumnos += Number(r.alumnos) || 0
-          prev.reprobados += Number(r.reprobados) || 0
-          map.set(key, prev)
-        }
-        const consolidados = Array.from(map.values()).map(r => ({
-          ...r,
-          porcentaje: r.alumnos ? (100 * r.reprobados / r.alumnos) : 0
-        }))
-
-        // Entregar los consolidados al padre (para gráficas)
-        if (typeof onRowsChange === 'function') {
-          onRowsChange(consolidados)
-        }
+        await cargarPaginas(`${API}/api/reprobacion_detalle`, { programa_like: programa, ciclo, aprobatoria }, pagina => {
+          acumuladas = acumuladas.concat(pagina.map(normalizar(aprobatoria)))
+          setRows(acumuladas)
+          setLoading(false)
+          setCargandoMas(true)
+          // Entregar los consolidados al padre (para gráficas)
+          if (typeof onRowsChange === 'function') {
+            onRowsChange(consolidarPorCiclo(acumuladas))
+          }
+        }, { signal: ctrl.signal })
       } catch {
-        setError('No se pudo cargar la reprobación por materia')
+        if (!ctrl.signal.aborted) setError('No se pudo cargar la reprobación por materia')
       } finally {
-        if (!cancel) setLoading(false)
+        if (!ctrl.signal.aborted) {
+          setLoading(false)
+          setCargandoMas(false)
+        }
       }
     })()
-    return () => { cancel = true }
+    return () => ctrl.abort()
   }, [programa, ciclo, aprobatoria])
 
   // Umbral (si el backend lo devuelve por fila, tomamos el primero)
@@ -231,6 +243,7 @@ export default function ReprobacionMaterias({
           </table>
           <div style={{marginTop:8, opacity:.7}}>
             Mostrando {shown.length} materias {soloConReprob ? '(solo con % > 0)' : ''}.
+            {cargandoMas && ' Cargando más…'}
           </div>
         </div>
       )}
@@ -2,6 +2,7 @@
 import React, { useEffect, useMemo, useState } from 'react'
 import axios from 'axios'
 import { Link } from 'react-router-dom'
+import { cargarPaginas } from '../paginado'
 import {
   ResponsiveContainer, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend,
 } from 'recharts'
@@ -29,6 +30,7 @@ export default function Cedula322Page() {
 
   const [rows, setRows] = useState([])
   const [loading, setLoading] = useState(true)
+  const [cargandoMas, setCargandoMas] = useState(false)
   const [error, setError] = useState(null)
 
   const [topN, setTopN] = useState(15)
@@ -77,19 +79,29 @@ export default function Cedula322Page() {
     window.history.replaceState({}, '', newUrl)
   }, [programaSel])
 
-  // carga datos de cédula 322
+  // carga datos de cédula 322 por páginas: la tabla se llena conforme llegan
   useEffect(() => {
     if (!programaSel || !cicloSel) return
-    let cancel = false
+    const ctrl = new AbortController()
+    let acumuladas = []
+    setRows([])
     setLoading(true)
+    setCargandoMas(false)
     setError(null)
-    axios.get(`${API}/api/cedula_322_detalle`, {
-      params: { programa_like: programaSel, ciclo: cicloSel }
-    })
-      .then(res => { if (!cancel) setRows(res.data || []) })
-      .catch(err => { if (!cancel) setError(err?.message || 'Error cargando Cédula 322') })
-      .finally(() => { if (!cancel) setLoading(false) })
-    return () => { cancel = true }
+    cargarPaginas(`${API}/api/cedula_322_detalle`, { programa_like: programaSel, ciclo: cicloSel }, pagina => {
+      acumuladas = acumuladas.concat(pagina)
+      setRows(acumuladas)
+      setLoading(false)
+      setCargandoMas(true)
+    }, { signal: ctrl.signal })
+      .catch(err => { if (!ctrl.signal.aborted) setError(err?.message || 'Error cargando Cédula 322') })
+      .finally(() => {
+        if (!ctrl.signal.aborted) {
+          setLoading(false)
+          setCargandoMas(false)
+        }
+      })
+    return () => ctrl.abort()
   }, [programaSel, cicloSel])
 
   // datos ordenados por % desc
@@ -210,6 +222,7 @@ export default function Cedula322Page() {
             </table>
             <div style={{marginTop:8, opacity:.7}}>
               {rows.length} materias en {cicloSel} ({programaSel}).
+              {cargandoMas && ' Cargando más…'}
             </div>
           </div>
         </>
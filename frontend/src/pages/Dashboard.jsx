@@ -26,6 +26,7 @@ function Divider() {
 export default function Dashboard() {
   const [programas, setProgramas] = useState([])
   const [programaSel, setProgramaSel] = useState('AEROESPACIAL')
+  const [bundle, setBundle] = useState(null)
 
   useEffect(() => {
     axios.get(`${API}/api/meta/programas`).then(res => {
@@ -35,6 +36,16 @@ export default function Dashboard() {
     })
   }, [])
 
+  // Inscritos + reprobación en una sola llamada (una pasada sobre boletas)
+  useEffect(() => {
+    let cancel = false
+    setBundle(null)
+    axios.get(`${API}/api/dashboard`, {
+      params: { programa_like: programaSel, aprobatoria: 6 }
+    }).then(res => { if (!cancel) setBundle(res.data) })
+    return () => { cancel = true }
+  }, [programaSel])
+
   return (
     <div style={{ padding: 16, fontFamily: 'sans-serif' }}>
       <h1>Dashboard CACEI</h1>
@@ -52,12 +63,12 @@ export default function Dashboard() {
       <Divider />
 
       {/* Inscritos */}
-      <Inscritos programa={programaSel} />
+      <Inscritos programa={programaSel} serie={bundle ? bundle.inscritos_por_ciclo : null} />
 
       <Divider />
 
       {/* Índice de reprobación */}
-      <Reprobacion programa={programaSel} aprobatoria={6} />
+      <Reprobacion programa={programaSel} aprobatoria={6} serie={bundle ? bundle.reprobacion : null} />
       <div style={{ textAlign:'right', marginTop: 8 }}>
         <Link
           to={`/reprobacion-materias?programa=${encodeURIComponent(programaSel)}`}
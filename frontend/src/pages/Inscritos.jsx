@@ -11,17 +11,22 @@ function cicloKey(c) {
   return year * 10 + sem
 }
 
-export default function Inscritos({ programa = 'AEROESPACIAL' }) {
+// `serie` (opcional): datos ya cargados por /api/dashboard; si se pasa (aunque sea null), no se consulta la API
+export default function Inscritos({ programa = 'AEROESPACIAL', serie }) {
   const [data, setData] = useState([])
 
   useEffect(() => {
+    if (serie !== undefined) {   // null = el padre aún está cargando
+      setData([...(serie || [])].sort((a,b)=> cicloKey(a.ciclo) - cicloKey(b.ciclo)))
+      return
+    }
     axios.get(`${API}/api/inscritos_por_ciclo`, {
       params: { programa_like: programa }
     }).then(r => {
       const ordered = [...r.data].sort((a,b)=> cicloKey(a.ciclo) - cicloKey(b.ciclo))
       setData(ordered)
     })
-  }, [programa])
+  }, [programa, serie])
 
   return (
     <div style={{ marginTop: 20 }}>
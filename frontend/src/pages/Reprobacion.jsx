@@ -4,14 +4,19 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContaine
 
 const API = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
-export default function Reprobacion({ programa = 'AEROESPACIAL', aprobatoria = 6 }) {
+// `serie` (opcional): datos ya cargados por /api/dashboard; si se pasa (aunque sea null), no se consulta la API
+export default function Reprobacion({ programa = 'AEROESPACIAL', aprobatoria = 6, serie }) {
   const [data, setData] = useState([])
 
   useEffect(() => {
+    if (serie !== undefined) {   // null = el padre aún está cargando
+      setData(serie || [])
+      return
+    }
     axios.get(`${API}/api/reprobacion`, {
       params: { programa_like: programa, aprobatoria }
     }).then(r => setData(r.data))
-  }, [programa, aprobatoria])
+  }, [programa, aprobatoria, serie])
 
   return (
     <div style={{ marginTop: 20 }}>
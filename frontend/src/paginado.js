@@ -0,0 +1,17 @@
+// src/paginado.js
+import axios from 'axios'
+
+// Recorre un endpoint con paginación por llave (?limite=&cursor=) y entrega cada página
+// a onPagina(filas) en cuanto llega, hasta que `siguiente` viene null. Con `signal`
+// (AbortController) se corta la petición en curso y ya no se piden más páginas.
+export async function cargarPaginas(url, params, onPagina, { limite = 200, signal } = {}) {
+  let cursor = null
+  do {
+    const r = await axios.get(url, {
+      params: { ...params, limite, ...(cursor ? { cursor } : {}) },
+      signal,
+    })
+    onPagina(r.data?.filas || [])
+    cursor = r.data?.siguiente || null
+  } while (cursor && !signal?.aborted)
+}